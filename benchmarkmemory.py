@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Measures the memory held by hydrated steps.
+
+Usage: benchmarkmemory.py [count]
+Builds count steps (100000 by default) from synthetic records shaped like the datafiles,
+with most relations empty, and prints the traced memory per step.
+"""
+import json
+import sys
+import tracemalloc
+
+from model import Step
+
+
+def make_record(i: int) -> dict:
+    record = {'pk': f'STEP-{i:06d}', 'key': f'STEP-{i:06d}', 'name': f'Step {i}',
+              'description': 'Assemble the parts', 'category': 'assembly', 'location': 'LOC-1',
+              'inputparts': {f'DS-001-{i % 500:04d}(STEP-{max(i - 1, 0):06d})': 1},
+              'outputparts': {f'DS-001-{i % 500:04d}': 1},
+              'unit_time_hours': 0.5}
+    if i % 4 == 0:
+        record['tools'] = {'DS-TOL-1': 1}
+    if i % 10 == 0:
+        record['start_after'] = {f'STEP-{max(i - 10, 0):06d}': 0}
+    return record
+
+
+def main(argv: list[str]) -> int:
+    if len(argv) > 2 or (len(argv) == 2 and not argv[1].isdigit()):
+        print(__doc__)
+        return 1
+    count = int(argv[1]) if len(argv) == 2 else 100000
+    # hydrated from the json text, like the datafiles, so the relation dicts are traced too
+    records = [json.dumps(make_record(i)) for i in range(count)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    steps = {}
+    for record in records:
+        step = Step()
+        step.from_dict(json.loads(record))
+        steps[step.pk] = step
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f'{count} steps: {used / 1024 / 1024:.1f} MiB, {used / count:.0f} bytes per step')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
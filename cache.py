@@ -2,38 +2,123 @@
 In-memory caching of key-value pairs with extra keys.
 
 """
+import bisect
+from collections.abc import Mapping
+
+from fuzzykeys import FuzzyKeyIndex
 
 
 class Cache:
     """
     Implements a flexible generic storage mechanism with multiple indexes to access data.
 
+    Besides the extra keys given to add(), a cache maintains the indexes declared at creation.
+    An index is named after an attribute of the stored values, or after a method returning the indexed value.
+    If the value is a mapping, list, set or tuple, every member (the keys of a mapping) is indexed,
+    so relations can be queried in reverse.
+    Values equal to None are not indexed.
     """
 
-    def __init__(self, name):
+    def __init__(self, name, indexes=None):
         self.name = name
+        self.indexes = tuple(indexes or ())
         self.data = {}
         self.index = {}
+        self.indexed = {}
+        self.sorted_values = {}
+        self.fuzzy = None
+        self.dirty = set()
 
     def clear(self):
         self.index = {}
         self.data = {}
+        self.indexed = {}
+        self.sorted_values = {}
+        self.fuzzy = None
+        self.dirty = set()
+
+    def mark_dirty(self, pk):
+        """Flags an entity as changed since the last save."""
+        self.dirty.add(pk)
+
+    def is_dirty(self) -> bool:
+        """Returns true if any entity changed since the last save."""
+        return len(self.dirty) > 0
+
+    def clear_dirty(self):
+        self.dirty = set()
+
+    def index_values(self, value, extrakeys=None) -> dict:
+        """Returns the values to index for an entity, by index name."""
+        keys = {}
+        for name in self.indexes:
+            v = getattr(value, name, None)
+            if callable(v):
+                v = v()
+            if v is None:
+                continue
+            if isinstance(v, (Mapping, list, set, tuple)):
+                keys[name] = tuple(v)
+            else:
+                keys[name] = (v,)
+        if extrakeys is not None:
+            for k, v in extrakeys.items():
+                keys[k] = (v,) if k not in keys else keys[k] + (v,)
+        return keys
 
     def add(self, pk, value, extrakeys=None):
+        """Adds or replaces an entity, updating every index."""
         try:
+            if pk in self.indexed:
+                self.unindex(pk)
             self.data[pk] = value
-            if extrakeys is not None:
-                for k in extrakeys.keys():
-                    if k not in self.index:
-                        self.index[k] = {}
-                    v = extrakeys[k]
+            keys = self.index_values(value, extrakeys)
+            for k, values in keys.items():
+                if k not in self.index:
+                    self.index[k] = {}
+                for v in values:
                     if v not in self.index[k]:
-                        self.index[k][v] = [pk]
+                        self.index[k][v] = {pk: None}
+                        self.sorted_values.pop(k, None)
                     else:
-                        self.index[k][v].append(pk)
-        except IndexError as e:
+                        self.index[k][v][pk] = None
+            self.indexed[pk] = keys
+            if self.fuzzy is not None:
+                self.fuzzy.add(pk)
+        except (IndexError, TypeError) as e:
             print(f"Cache {self.name} add error {e} pk:{pk} extrakeys: {extrakeys} value {value}")
 
+    def update(self, pk, value=None):
+        """Re-indexes an entity after it was changed in place, or replaces it if a value is given."""
+        if value is None:
+            if pk not in self.data:
+                return
+            value = self.data[pk]
+        extrakeys = value.extrakeys() if hasattr(value, "extrakeys") else None
+        self.add(pk, value, extrakeys)
+
+    def unindex(self, pk):
+        for k, values in self.indexed.pop(pk, {}).items():
+            for v in values:
+                pks = self.index.get(k, {}).get(v)
+                if pks is None:
+                    continue
+                pks.pop(pk, None)
+                if len(pks) == 0:
+                    del self.index[k][v]
+                    self.sorted_values.pop(k, None)
+
+    def remove(self, pk, extrakeys=None):
+        """Removes an entity and its index entries."""
+        del extrakeys  # the indexed values are remembered since add()
+        if pk not in self.data:
+            return
+        del self.data[pk]
+        self.dirty.discard(pk)
+        self.unindex(pk)
+        if self.fuzzy is not None:
+            self.fuzzy.remove(pk)
+
     def get(self, pk):
         return self.data[pk]
 
@@ -50,7 +135,7 @@ class Cache:
         key_list = self.index[key][value]
         if len(key_list) != 1:
             return None
-        return self.data[key_list[0]]
+        return self.data[next(iter(key_list))]
 
     def list_by_key(self, key, value):
         if key not in self.index:
@@ -62,3 +147,51 @@ class Cache:
         for pk in keylist:
             valuelist.append(self.data[pk])
         return valuelist
+
+    def find_pks(self, key, value) -> list:
+        """Returns the primary keys having the value in an index."""
+        return list(self.index.get(key, {}).get(value, ()))
+
+    def find(self, key, value) -> list:
+        """Returns the entities having the value in an index, empty list if none."""
+        return [self.data[pk] for pk in self.find_pks(key, value)]
+
+    def find_any(self, key, values) -> list:
+        """Returns the entities having any of the values in an index, each only once."""
+        pks = {}
+        for value in values:
+            for pk in self.find_pks(key, value):
+                pks[pk] = None
+        return [self.data[pk] for pk in pks]
+
+    def find_range(self, key, low=None, high=None) -> list:
+        """Returns the entities whose indexed value is between low and high inclusive, ordered by that value.
+
+        Leaving low or high None makes the range open on that side.
+        """
+        values = self.index_sorted_values(key)
+        start = 0 if low is None else bisect.bisect_left(values, low)
+        end = len(values) if high is None else bisect.bisect_right(values, high)
+        result = []
+        for v in values[start:end]:
+            for pk in self.index[key].get(v, ()):
+                result.append(self.data[pk])
+        return result
+
+    def index_sorted_values(self, key) -> list:
+        """Returns the distinct values of an index in order, sorted again only after a value appeared or vanished."""
+        if key not in self.sorted_values:
+            self.sorted_values[key] = sorted(self.index.get(key, {}).keys())
+        return self.sorted_values[key]
+
+    def find_fuzzy(self, text: str, max_distance: int = None, limit: int = 10) -> list[tuple[str, int]]:
+        """Returns the (pk, edit distance) pairs of the keys nearest to a mistyped one.
+
+        The fuzzy key index is built on the first lookup, and maintained by add() and remove() afterwards.
+        """
+        if self.fuzzy is None:
+            fuzzy = FuzzyKeyIndex()
+            for pk in self.data:
+                fuzzy.add(pk)
+            self.fuzzy = fuzzy
+        return self.fuzzy.lookup(text, max_distance, limit)
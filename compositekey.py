@@ -0,0 +1,70 @@
+"""
+Parsed composite keys of parts, like DS-001-0012(STEP-0042).
+
+"""
+import sys
+
+
+class CompositeKey:
+    """The part key and the key of the producing step of a composite key, parsed once.
+
+    Instances are interned, parse() returns the same instance for the same text, so the
+    keys of the hot loops are split only the first time they are seen. The storage starts
+    a new table with reset() on every load, so the keys of dropped data do not pile up.
+    Unpacks to the (part, step) pair, step is None if the text names no step.
+    """
+    __slots__ = ('text', 'part', 'step')
+
+    interned = {}
+
+    def __init__(self, text: str, part: str, step: str = None):
+        self.text = text
+        self.part = part
+        self.step = step
+
+    @classmethod
+    def parse(cls, text: str) -> 'CompositeKey':
+        composite = cls.interned.get(text)
+        if composite is None:
+            part, step = cls.split(text)
+            composite = cls.interned.setdefault(text, cls(sys.intern(text), sys.intern(part),
+                                                          None if step is None else sys.intern(step)))
+        return composite
+
+    @classmethod
+    def reset(cls):
+        """Drops the interned instances, the ones still referenced stay valid."""
+        cls.interned = {}
+
+    @staticmethod
+    def split(text: str) -> (str, str):
+        """Returns the beginning of the key and the step number between parenthesis as a tuple."""
+        key = text.strip()
+        if '(' in key:
+            key, step = key.split('(', 1)
+            if ')' in step:
+                step = step[:step.index(')')]
+                return key.strip(), step.strip()
+            return text.strip(), None
+        return key.strip(), None
+
+    def has_step(self) -> bool:
+        return self.step is not None and self.step != ''
+
+    def __iter__(self):
+        yield self.part
+        yield self.step
+
+    def __eq__(self, other):
+        if isinstance(other, CompositeKey):
+            return self.text == other.text
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f'CompositeKey({self.text!r})'
@@ -20,6 +20,18 @@ class Config:
     prefix_consumable: ''
     prefix_tool: ''
     prefix_machine: ''
+    backend: 'json'
+    sqlite_file: ''
+    layout: 'monolithic'
+    lazy_text: False
+    lazy_text_min_length: 64
+    snapshot_file: ''
+    watch_interval: 2.0
+    journal: False
+    journal_compact_records: 1000
+    journal_compact_seconds: 300
+    search_page_size: 50
+    search_debounce_seconds: 0.3
 
     @staticmethod
     def init_config():
@@ -37,5 +49,17 @@ class Config:
         Config.prefix_work = os.getenv('MFGDOCS_PREFIX_LOCATION', 'DS-LOC-')
         Config.inventree_url = os.getenv('INVENTREE_URL', '')
         Config.feedback_url = os.getenv('FEEDBACK_URL', '')
+        Config.backend = os.getenv('MFGDOCS_BACKEND', 'json')
+        Config.sqlite_file = os.getenv('MFGDOCS_SQLITE_FILE', Config.workdir + '/tempfiles/mfgdocs.sqlite')
+        Config.lazy_text = os.getenv('MFGDOCS_LAZY_TEXT', 'false').lower() in ('1', 'true', 'yes')
+        Config.lazy_text_min_length = int(os.getenv('MFGDOCS_LAZY_TEXT_MIN_LENGTH', '64'))
+        Config.layout = os.getenv('MFGDOCS_LAYOUT', 'monolithic')
+        Config.snapshot_file = os.getenv('MFGDOCS_SNAPSHOT_FILE', Config.workdir + '/tempfiles/snapshot.pickle')
+        Config.watch_interval = float(os.getenv('MFGDOCS_WATCH_INTERVAL', '2'))
+        Config.journal = os.getenv('MFGDOCS_JOURNAL', 'false').lower() in ('1', 'true', 'yes')
+        Config.journal_compact_records = int(os.getenv('MFGDOCS_JOURNAL_COMPACT_RECORDS', '1000'))
+        Config.journal_compact_seconds = float(os.getenv('MFGDOCS_JOURNAL_COMPACT_SECONDS', '300'))
+        Config.search_page_size = int(os.getenv('MFGDOCS_SEARCH_PAGE_SIZE', '50'))
+        Config.search_debounce_seconds = float(os.getenv('MFGDOCS_SEARCH_DEBOUNCE_SECONDS', '0.3'))
 
 Config.init_config()
@@ -0,0 +1,25 @@
+import json
+
+import pytest
+
+from config import Config
+from testdata import STEPS
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A workdir with two steps and no other entities, and the storage options at their defaults."""
+    (tmp_path / 'data').mkdir()
+    for resource_type in ('roles', 'tools', 'actions', 'parts', 'locations', 'machines', 'consumables', 'companies'):
+        (tmp_path / 'data' / f'{resource_type}.json').write_text('{}', encoding='utf-8')
+    (tmp_path / 'data' / 'steps.json').write_text(json.dumps(STEPS), encoding='utf-8')
+    monkeypatch.setattr(Config, 'workdir', str(tmp_path))
+    monkeypatch.setattr(Config, 'backend', 'json')
+    monkeypatch.setattr(Config, 'sqlite_file', str(tmp_path / 'tempfiles' / 'mfgdocs.sqlite'))
+    monkeypatch.setattr(Config, 'layout', 'monolithic')
+    monkeypatch.setattr(Config, 'lazy_text', False)
+    monkeypatch.setattr(Config, 'lazy_text_min_length', 64)
+    monkeypatch.setattr(Config, 'snapshot_file', '')
+    monkeypatch.setattr(Config, 'watch_interval', 0)
+    monkeypatch.setattr(Config, 'journal', False)
+    return tmp_path
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""Converts the datafiles between the monolithic and the perentity layout.
+
+Usage: convertlayout.py monolithic|perentity
+The data is read in the other layout from MFGDOCS_WORKDIR and written in the given one.
+"""
+import sys
+
+from config import Config
+from storage import Storage
+
+
+def main(argv: list[str]) -> int:
+    layouts = ('monolithic', 'perentity')
+    if len(argv) != 2 or argv[1] not in layouts:
+        print(__doc__)
+        return 1
+    Config.init_config()
+    target = argv[1]
+    source = layouts[0] if target == layouts[1] else layouts[1]
+    storage = Storage(layout=source)
+    storage.convert_layout(target)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
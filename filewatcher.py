@@ -0,0 +1,44 @@
+"""
+Watches the datafiles for changes made outside the application.
+
+Uses cheap mtime polling, so it works on every platform without extra dependencies.
+"""
+import threading
+
+
+class FileWatcher:
+    """Polls the datafiles of a storage and reloads only the caches whose files changed.
+    """
+
+    def __init__(self, storage: 'Storage', interval: float):
+        self.storage = storage
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='filewatcher', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self.storage.log(f'filewatcher error: {e}')
+
+    def check(self) -> list[str]:
+        """Reloads the changed caches and notifies the sessions.
+
+        The caches with unsaved changes or open editors are reloaded on a later check, after they are saved.
+
+        :return: The reloaded resource types.
+        """
+        changed = self.storage.changed_resource_types()
+        busy = self.storage.busy_resource_types()
+        reloaded = [resource_type for resource_type in changed
+                    if resource_type not in busy and self.storage.reload_resource(resource_type)]
+        if len(reloaded) > 0:
+            self.storage.notify_sessions(reloaded)
+        self.storage.postpone_reload([resource_type for resource_type in changed if resource_type not in reloaded])
+        return reloaded
+
+    def stop(self):
+        self.stopped.set()
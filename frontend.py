@@ -4,7 +4,7 @@ import json
 import flet as ft
 from size_aware_control import SizeAwareControl
 from PIL import Image
-from model import Part, Step, Action, Tool, Machine, Consumable, Role
+from model import Part, Step, Action, Tool, Machine, Consumable, Role, Company
 
 
 
@@ -124,6 +124,18 @@ class Frontend:
         )
         return c
 
+    def get_searchresultitem_company(self, item: Company or int, key: str = None) -> ft.Control:
+        if isinstance(item, int):
+            item: Company = self.mfgdocsapp.storage.cache_companies.data[item]
+        c = ft.Container()
+        c.bgcolor = ft.colors.PURPLE_600
+        c.border = ft.RoundedRectangleBorder()
+        c.content = ft.Row(
+            controls=[ft.IconButton(icon=ft.icons.BUSINESS),
+                      ft.Text(item.key, color='white'), ft.Text(item.name, color='white')]
+        )
+        return c
+
 class Overview:
 
     def __init__(self, mfgdocsapp: 'MFGDocsApp'):
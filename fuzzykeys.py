@@ -0,0 +1,103 @@
+"""
+Typo tolerant lookup of keys, using the symmetric delete method.
+
+"""
+
+
+class FuzzyKeyIndex:
+    """Finds the keys within a small edit distance of a mistyped one.
+
+    Every key is stored under the variants made by deleting up to max_distance characters from it.
+    A lookup generates the same variants of the typed text, the keys sharing a variant are the only
+    candidates, and their real distance is checked. Keys are compared case-insensitively.
+    """
+
+    def __init__(self, max_distance: int = 2):
+        self.max_distance = max_distance
+        self.variants = {}
+        self.keys = {}
+
+    @staticmethod
+    def normalize(key: str) -> str:
+        return key.strip().casefold()
+
+    def deletes(self, text: str) -> set[str]:
+        """Returns the text and every string made by deleting up to max_distance characters from it."""
+        result = {text}
+        edge = {text}
+        for _ in range(self.max_distance):
+            following = set()
+            for s in edge:
+                for i in range(len(s)):
+                    following.add(s[:i] + s[i + 1:])
+            following -= result
+            result |= following
+            edge = following
+        return result
+
+    def add(self, key: str):
+        normalized = self.normalize(key)
+        if normalized not in self.keys:
+            self.keys[normalized] = {}
+            for variant in self.deletes(normalized):
+                self.variants.setdefault(variant, {})[normalized] = None
+        self.keys[normalized][key] = None
+
+    def remove(self, key: str):
+        normalized = self.normalize(key)
+        keys = self.keys.get(normalized)
+        if keys is None:
+            return
+        keys.pop(key, None)
+        if len(keys) > 0:
+            return
+        del self.keys[normalized]
+        for variant in self.deletes(normalized):
+            candidates = self.variants.get(variant)
+            if candidates is None:
+                continue
+            candidates.pop(normalized, None)
+            if len(candidates) == 0:
+                del self.variants[variant]
+
+    def lookup(self, text: str, max_distance: int = None, limit: int = None) -> list[tuple[str, int]]:
+        """Returns the (key, distance) pairs of the keys near the text, nearest first.
+
+        :param max_distance: A tighter bound than the one of the index, if given.
+        :param limit: The number of keys to return at most.
+        """
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        normalized = self.normalize(text)
+        candidates = {}
+        for variant in self.deletes(normalized):
+            for candidate in self.variants.get(variant, ()):
+                candidates[candidate] = None
+        found = []
+        for candidate in candidates:
+            distance = self.distance(normalized, candidate, max_distance)
+            if distance <= max_distance:
+                for key in self.keys[candidate]:
+                    found.append((key, distance))
+        found.sort(key=lambda f: (f[1], f[0]))
+        return found if limit is None else found[:limit]
+
+    @staticmethod
+    def distance(a: str, b: str, max_distance: int) -> int:
+        """Returns the edit distance of two strings counting a swap of neighbours as one edit,
+        or max_distance + 1 if it is larger than max_distance."""
+        if abs(len(a) - len(b)) > max_distance:
+            return max_distance + 1
+        previous = list(range(len(b) + 1))
+        previous2 = previous
+        for i in range(1, len(a) + 1):
+            current = [i] + [0] * len(b)
+            for j in range(1, len(b) + 1):
+                cost = 0 if a[i - 1] == b[j - 1] else 1
+                current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+                if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                    current[j] = min(current[j], previous2[j - 2] + 1)
+            if min(current) > max_distance:
+                return max_distance + 1
+            previous2, previous = previous, current
+        return min(previous[len(b)], max_distance + 1)
@@ -3,7 +3,6 @@ A user control to edit a list of resources and their quantities.
 """
 import flet as ft
 from frontend import Frontend
-from model import Resource, Step, Part
 from storage import Storage
 
 
@@ -136,21 +135,18 @@ class IngredientListEditor(ft.UserControl):
         search = event.control.data['searchfield']
         drop = event.control.data['dropdown']
         txt = search.value
-        results = self.find_items(self.storage.cache_by_resource_type(self.resource_type).data, txt)
+        results = self.find_items(txt)
         drop.options = []
         for r in results:
             if r['key'] not in self.items:
                 drop.options.append(ft.dropdown.Option(r['key'], r['key'] + ' - ' + r['value']))
 
         if self.is_inputpart:
-            stepx: Step
-            for stepx in self.storage.cache_steps.data.values():
-                if stepx.outputparts is not None:
-                    for partkey in stepx.outputparts.keys():
-                        partx: Part = self.storage.cache_parts.get_by_unique_key('key', partkey)
-                        if partx.contains(txt):
-                            drop.options.append(ft.dropdown.Option(partx.key + '(' + stepx.key + ')',
-                                                                   partx.key + '(' + stepx.key + ') - ' + partx.name))
+            # the matching parts are offered from every step producing them, found by the producer index
+            for r in results:
+                for stepkey in self.storage.cache_steps.find_pks('outputparts', r['key']):
+                    drop.options.append(ft.dropdown.Option(r['key'] + '(' + stepkey + ')',
+                                                           r['key'] + '(' + stepkey + ') - ' + r['value']))
         drop.update()
         self.update_add_button()
         self.maincontrol.update()
@@ -196,12 +192,15 @@ class IngredientListEditor(ft.UserControl):
         self.build()
         self.maincontrol.update()
 
-    def find_items(self, items, txt):
-        """This method is used to find items in the items list that match the search text."""
+    def find_items(self, txt):
+        """This method is used to find items of the resource type that match the search text."""
         results = []
-        v: Resource
+        items = self.storage.cache_by_resource_type(self.resource_type).data
         k: str
-        for k, v in items.items():
-            if v.contains(txt):
-                results.append({'key': k, 'value': v.name})
+        for _, k in self.storage.search_contains(txt, [self.resource_type]):
+            results.append({'key': k, 'value': items[k].name})
+        if len(results) == 0 and txt.strip() != '':
+            # probably a mistyped key, offer the nearest ones
+            for _, k, _ in self.storage.find_fuzzy(txt, [self.resource_type]):
+                results.append({'key': k, 'value': items[k].name})
         return results
@@ -0,0 +1,95 @@
+"""
+Append-only journal of entity changes.
+
+Every saved entity is appended as one JSON line, the journal is replayed over the datafiles on startup
+and folded back into them by the compaction.
+"""
+import json
+import os
+import threading
+
+
+class Journal:
+    """Appends, replays and rotates the journal file.
+
+    A rotated journal is kept as <filename>.compacting until its content is written into the datafiles.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.compacting_filename = filename + '.compacting'
+        self.records = 0
+        self.resource_types = set()
+        self.lock = threading.Lock()
+
+    def append(self, records: list[dict]):
+        """Appends the records and syncs them to disk.
+
+        :param records: dicts with 'type', 'pk' and 'data' keys.
+        """
+        if len(records) == 0:
+            return
+        with self.lock:
+            with open(self.filename, mode='at', encoding='utf-8') as journal_file:
+                for record in records:
+                    journal_file.write(json.dumps(record, sort_keys=True) + '\n')
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            self.records += len(records)
+            self.resource_types.update(record['type'] for record in records)
+
+    def replay(self):
+        """Yields the records of an unfinished compaction first, then the current journal.
+
+        A torn last line, left by a crash during append, ends the replay of that file.
+        """
+        with self.lock:
+            self.records = 0
+            self.resource_types = set()
+        for filename in (self.compacting_filename, self.filename):
+            try:
+                with open(filename, mode='rt', encoding='utf-8') as journal_file:
+                    for line in journal_file:
+                        if line.strip() == '':
+                            continue
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            break
+                        with self.lock:
+                            if filename == self.filename:
+                                self.records += 1
+                            self.resource_types.add(record['type'])
+                        yield record
+            except FileNotFoundError:
+                pass
+
+    def rotate(self) -> set[str]:
+        """Moves the journal aside for compaction, following appends go to a new journal.
+
+        If an earlier compaction did not finish, the journal is appended to its file instead.
+
+        :return: The resource types having records in the rotated journal.
+        """
+        with self.lock:
+            resource_types = self.resource_types
+            if os.path.exists(self.filename):
+                if os.path.exists(self.compacting_filename):
+                    with open(self.filename, mode='rt', encoding='utf-8') as journal_file, \
+                            open(self.compacting_filename, mode='at', encoding='utf-8') as compacting_file:
+                        compacting_file.write(journal_file.read())
+                        compacting_file.flush()
+                        os.fsync(compacting_file.fileno())
+                    os.remove(self.filename)
+                else:
+                    os.replace(self.filename, self.compacting_filename)
+            self.records = 0
+            self.resource_types = set()
+            return resource_types
+
+    def finish_compaction(self):
+        """Removes the rotated journal once the datafiles contain its records."""
+        try:
+            os.remove(self.compacting_filename)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,99 @@
+"""
+Streaming reader for the top-level JSON object of the datafiles.
+
+json.load builds the whole dict tree before any entity exists, this reader yields one key and value at a time,
+so only one entity is decoded in memory while it is hydrated.
+"""
+import codecs
+import json
+
+DECODER = json.JSONDecoder()
+WHITESPACE = ' \t\n\r'
+
+
+class JsonObjectStream:
+    """Reads a file containing one JSON object, yielding its members one by one.
+
+    :param fileobj: File opened in binary mode.
+    :param chunk_size: Bytes read at once, doubled while a single value does not fit.
+    :param progress: Optional callable receiving the number of bytes read after every chunk.
+    """
+
+    def __init__(self, fileobj, chunk_size: int = 65536, progress=None):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def more(self, size: int) -> bool:
+        """Appends the next chunk to the buffer, dropping the consumed part. Returns False at the end of file."""
+        if self.eof:
+            return False
+        chunk = self.fileobj.read(size)
+        if self.progress is not None and len(chunk) > 0:
+            self.progress(len(chunk))
+        self.eof = len(chunk) == 0
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        return not self.eof
+
+    def next_char(self) -> str:
+        """Skips whitespace and returns the next character without consuming it, '' at the end of file."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.more(self.chunk_size):
+                return ''
+
+    def expect(self, expected: str):
+        char = self.next_char()
+        if char != expected:
+            raise ValueError(f'jsonstream: expected {expected!r} at {self.pos}, found {char!r}')
+        self.pos += 1
+
+    def decode_value(self):
+        """Decodes the value at the current position, reading more data until it is complete."""
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.more(size):
+                    raise
+                size *= 2
+                continue
+            # a number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self.more(size):
+                continue
+            self.pos = end
+            return value
+
+    def items(self):
+        """Yields the (key, value) pairs of the object in file order."""
+        self.expect('{')
+        if self.next_char() == '}':
+            self.pos += 1
+            return
+        while True:
+            if self.next_char() != '"':
+                raise ValueError(f'jsonstream: expected a key at {self.pos}')
+            key = self.decode_value()
+            self.expect(':')
+            self.next_char()
+            yield key, self.decode_value()
+            char = self.next_char()
+            self.pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError(f'jsonstream: expected , or }} at {self.pos - 1}, found {char!r}')
+
+
+def iter_object_items(fileobj, chunk_size: int = 65536, progress=None):
+    """Yields the (key, value) pairs of the top-level JSON object in a binary file, one at a time."""
+    return JsonObjectStream(fileobj, chunk_size, progress).items()
@@ -1,5 +1,7 @@
+import urllib.parse
+
 import flet as ft
-from model import Step
+from model import Part, Step
 from size_aware_control import SizeAwareControl
 from stepeditordialog import StepEditorDialog
 from stepresourcelisteditor import StepResourceListEditor
@@ -172,6 +174,20 @@ class MainDisplay:
         self.show_step_display()
         self.maincontrol.update()
 
+    def display_resource(self, resource):
+        """Shows a resource other than a step, with the steps using it."""
+        self.object_on_display = resource
+        self.ctrl['map_display'].visible = False
+        self.ctrl['step_display'].visible = True
+        if isinstance(resource, Part):
+            self.ctrl['step_markdown'].value = self.mfgdocsapp.rendermarkdown.render_part(resource)
+        else:
+            self.ctrl['step_markdown'].value = self.mfgdocsapp.rendermarkdown.render_resource(resource)
+        self.ctrl['step_topbar'].visible = False
+        self.ctrl['step_bottombar'].visible = False
+        self.show_step_display()
+        self.maincontrol.update()
+
     def prepare_bottom_dependency_buttons(self, step):
         control_list = []
         start_after_start_controls = []
@@ -249,9 +265,25 @@ class MainDisplay:
             self.click_step_edit_start_after(url_parts)
         elif action == 'step_edit_start_after_start':
             self.click_step_edit_start_after_start(url_parts)
+        elif action == 'step_show':
+            self.click_step_show(url_parts)
+        elif action == 'resource_show':
+            self.click_resource_show(url_parts)
         else:
             print(f'Unknown action: {action}')
 
+    def click_step_show(self, url_parts: list[str]):
+        key = urllib.parse.unquote(url_parts[1])
+        if key in self.storage.cache_steps.data:
+            self.mfgdocsapp.load_mainmarkdown_step(key)
+
+    def click_resource_show(self, url_parts: list[str]):
+        if len(url_parts) < 3:
+            return
+        resource = self.storage.get_resource_by_type_and_key(url_parts[1], urllib.parse.unquote(url_parts[2]))
+        if resource is not None:
+            self.display_resource(resource)
+
     def click_step_edit_actions(self, url_parts: list[str]):
         del url_parts
         if self.object_on_display is None:
@@ -260,7 +292,7 @@ class MainDisplay:
             return
         step = self.object_on_display
 
-        dlg = StepResourceListEditor(self.mfgdocsapp, step, step.actions, 'actions', f'Actions used for {step.key}')
+        dlg = StepResourceListEditor(self.mfgdocsapp, step, 'actions', 'actions', f'Actions used for {step.key}')
         self.edit_popup_editordialog(dlg)
 
     def click_step_edit_consumables(self, url_parts: list[str]):
@@ -272,7 +304,7 @@ class MainDisplay:
         step = self.object_on_display
 
         dlg = StepResourceListEditor(
-            self.mfgdocsapp, step, step.consumables, 'consumables', f'Consumables used in {step.key}'
+            self.mfgdocsapp, step, 'consumables', 'consumables', f'Consumables used in {step.key}'
         )
         self.edit_popup_editordialog(dlg)
 
@@ -283,7 +315,7 @@ class MainDisplay:
         if not isinstance(self.object_on_display, Step):
             return
         step = self.object_on_display
-        dlg = StepResourceListEditor(self.mfgdocsapp, step, step.tools, 'tools', f'Tools used for {step.key}')
+        dlg = StepResourceListEditor(self.mfgdocsapp, step, 'tools', 'tools', f'Tools used for {step.key}')
         self.edit_popup_editordialog(dlg)
 
     def click_step_edit_roles(self, url_parts: list[str]):
@@ -294,7 +326,7 @@ class MainDisplay:
         if not isinstance(self.object_on_display, Step):
             return
         step = self.object_on_display
-        dlg = StepResourceListEditor(self.mfgdocsapp, step, step.roles, 'roles', f'Roles for {step.key}')
+        dlg = StepResourceListEditor(self.mfgdocsapp, step, 'roles', 'roles', f'Roles for {step.key}')
         self.edit_popup_editordialog(dlg)
 
     def click_step_edit_inputparts(self, url_parts: list[str]):
@@ -305,7 +337,7 @@ class MainDisplay:
             return
         step = self.object_on_display
         dlg = StepResourceListEditor(
-            self.mfgdocsapp, step, step.inputparts,
+            self.mfgdocsapp, step, 'inputparts',
             'parts', f'Input parts for {step.key}', is_inputpart=True
         )
         self.edit_popup_editordialog(dlg)
@@ -332,7 +364,7 @@ class MainDisplay:
         step = self.object_on_display
 
         dlg = StepResourceListEditor(
-            self.mfgdocsapp, step, step.outputparts,
+            self.mfgdocsapp, step, 'outputparts',
             'parts', f'Output parts for {step.key}'
         )
         self.edit_popup_editordialog(dlg)
@@ -345,7 +377,7 @@ class MainDisplay:
             return
         step = self.object_on_display
 
-        dlg = StepResourceListEditor(self.mfgdocsapp, step, step.machines, 'machines', f'Machines used for {step.key}')
+        dlg = StepResourceListEditor(self.mfgdocsapp, step, 'machines', 'machines', f'Machines used for {step.key}')
         self.edit_popup_editordialog(dlg)
 
     def click_step_edit_start_after(self, url_parts: list[str]):
@@ -357,7 +389,7 @@ class MainDisplay:
         step = self.object_on_display
 
         dlg = StepResourceListEditor(
-            self.mfgdocsapp, step, step.start_after, 'start_after',
+            self.mfgdocsapp, step, 'start_after', 'start_after',
             f'{step.key} dependencies start_after'
         )
         self.edit_popup_editordialog(dlg)
@@ -371,7 +403,7 @@ class MainDisplay:
         step = self.object_on_display
 
         dlg = StepResourceListEditor(
-            self.mfgdocsapp, step, step.start_after_start, 'start_after_start',
+            self.mfgdocsapp, step, 'start_after_start', 'start_after_start',
             f'Parallel dependencies for {step.key} start_after_start'
         )
         self.edit_popup_editordialog(dlg)
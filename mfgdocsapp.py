@@ -2,12 +2,12 @@
 
 """
 import base64
-from datetime import datetime
+import threading
+from concurrent.futures import CancelledError
 import flet as ft
 from config import Config
 from frontend import Frontend, Overview
 from maindisplay import MainDisplay
-from model import Step
 from renderdot import RenderDot
 from rendermarkdown import RenderMarkdown
 from size_aware_control import SizeAwareControl
@@ -92,9 +92,15 @@ class MFGDocsApp:
         self.page = page
         self.configure_page()
         self.visible_step_key = None
+        self.search_results = None
+        self.search_page = 0
+        self.search_generation = 0
+        self.search_timer = None
+        self.search_cancelled = threading.Event()
         self.frontend = Frontend(self)
         self.ctrl = {}
-        self.storage = Storage(self)
+        self.storage = Storage.attach(self)
+        self.page.on_close = self.session_close
         self.overview = Overview(self)
         self.renderdot = RenderDot(self)
         self.rendermarkdown = RenderMarkdown(self)
@@ -110,7 +116,7 @@ class MFGDocsApp:
 
         self.ctrl['contains'] = ft.TextField(
             label='Search here', width=150, color='black', border=ft.InputBorder.NONE,
-            filled=True, dense=True, icon=ft.icons.SEARCH, on_submit=self.search
+            filled=True, dense=True, icon=ft.icons.SEARCH, on_submit=self.search, on_change=self.search_changed
         )
         self.ctrl['panel_editor'] = ft.Column(controls=[ft.Text('editor')], visible=False)
         self.ctrl['panel_searchresults'] = ft.Column(controls=[ft.Text('searchresults')], expand=True)
@@ -266,9 +272,69 @@ class MFGDocsApp:
         self.ctrl['panel_searchresults_container'].update()
 
     def search(self, event):
+        """Runs the search at once, on submit or when the data changed."""
         del event
+        self.run_search(*self.next_search())
+
+    def search_changed(self, event):
+        """Runs the search after the typing paused for the debounce window, dropping the one in flight."""
+        del event
+        self.search_timer = threading.Timer(Config.search_debounce_seconds, self.run_search, self.next_search())
+        self.search_timer.daemon = True
+        self.search_timer.start()
+
+    def next_search(self) -> tuple[int, threading.Event]:
+        """Cancels the search pending or in flight, and returns the generation and cancel event of the next one.
+
+        The event is registered before the next search submits any work, so that one can be cancelled at any time.
+        """
+        self.search_generation += 1
+        if self.search_timer is not None:
+            self.search_timer.cancel()
+        self.search_cancelled.set()
+        if self.search_results is not None and not self.search_results.complete():
+            self.search_results.cancel()
+        self.search_cancelled = threading.Event()
+        return self.search_generation, self.search_cancelled
+
+    def run_search(self, generation: int, cancelled: threading.Event):
+        """Searches and shows the first page, unless a newer keystroke arrived meanwhile."""
+        query = self.ctrl['contains'].value or ''
+        resource_types = ['steps'] + [rt for rt, _, _ in self.storage.resource_types if rt != 'steps']
+        try:
+            results = self.storage.search_all(query, resource_types, previous=self.search_results, cancelled=cancelled)
+            if query.strip() != '' and len(results.page(0, 1)) == 0 and not cancelled.is_set():
+                # probably a mistyped key, offer the nearest ones
+                results = self.storage.search_all(query, resource_types, fuzzy=True, cancelled=cancelled)
+        except CancelledError:
+            return
+        if cancelled.is_set() or generation != self.search_generation:
+            results.cancel()
+            return
+        self.search_results = results
+        self.show_search_page(0, generation)
+
+    def show_search_page(self, number: int, generation: int = None):
+        """Renders one page of the search results, the totals are added when every type is searched.
+
+        :param generation: The search the page belongs to, nothing more is rendered once a newer one started.
+        """
+        self.search_page = number
         self.ctrl['progressring'].visible = True
         self.ctrl['progressring'].update()
+        try:
+            self.render_search_page(self.search_results, number, generation)
+        except CancelledError:
+            # a newer search cancelled these results while they were read, it renders its own page
+            pass
+        finally:
+            self.ctrl['progressring'].visible = False
+            self.ctrl['progressring'].update()
+
+    def render_search_page(self, results, number: int, generation: int = None):
+        """Fills the search panel with a page, raises CancelledError if the results were cancelled meanwhile."""
+        if generation is not None and generation != self.search_generation:
+            return
         self.ctrl['panel_searchresults'].controls.clear()
         self.ctrl['panel_searchresults'].controls.append(
             ft.Row(
@@ -278,15 +344,20 @@ class MFGDocsApp:
             )
         )
         self.show_searchresults()
-        results = 0
-        for k, v in self.storage.cache_steps.data.items():
-            assert isinstance(v, Step)
-            if v.contains(self.ctrl['contains'].value):
-                results += 1
+        page_size = Config.search_page_size
+        matches = results.page(number, page_size)
+        totals = ft.Text('', style=ft.TextThemeStyle.LABEL_SMALL)
+        self.ctrl['panel_searchresults'].controls.append(totals)
+        for resource_type, k in matches:
+            if resource_type == 'steps':
                 button = self.frontend.get_searchresultitem_step(k)
                 button.on_click = lambda e, key=k: self.load_mainmarkdown_step(key)
-                self.ctrl['panel_searchresults'].controls.append(button)
-        if results == 0:
+            else:
+                item = self.storage.cache_by_resource_type(resource_type).data[k]
+                button = self.frontend.get_searchresultitem(item, k)
+                button.on_click = lambda e, resource=item: self.main_display.display_resource(resource)
+            self.ctrl['panel_searchresults'].controls.append(button)
+        if len(matches) == 0:
             self.ctrl['panel_searchresults'].controls.clear()
             self.ctrl['panel_searchresults'].controls.append(
                 ft.Text(
@@ -294,11 +365,27 @@ class MFGDocsApp:
                     style=ft.TextThemeStyle.HEADLINE_MEDIUM
                 )
             )
+            self.ctrl['panel_searchresults'].update()
+            return
+        navigation = ft.Row()
+        self.ctrl['panel_searchresults'].controls.append(navigation)
+        self.ctrl['panel_searchresults'].update()
+        type_totals = results.totals()
+        if generation is not None and generation != self.search_generation:
+            return
+        totals.value = ', '.join(f'{rt} {n}' for rt, n in type_totals.items() if n > 0)
+        pages = (sum(type_totals.values()) + page_size - 1) // page_size
+        if number > 0:
+            navigation.controls.append(
+                ft.IconButton(ft.icons.NAVIGATE_BEFORE, on_click=lambda e: self.show_search_page(number - 1)))
+        navigation.controls.append(ft.Text(f'{number + 1} / {pages}'))
+        if number + 1 < pages:
+            navigation.controls.append(
+                ft.IconButton(ft.icons.NAVIGATE_NEXT, on_click=lambda e: self.show_search_page(number + 1)))
         self.ctrl['panel_searchresults'].update()
-        self.ctrl['progressring'].visible = False
-        self.ctrl['progressring'].update()
 
     def load_mainmarkdown_step(self, key):
+        self.visible_step_key = key
         step = self.storage.cache_steps.data[key]
         self.main_display.display_step(step)
         self.maincontent.update()
@@ -307,11 +394,44 @@ class MFGDocsApp:
         del e  # unused
         self.ctrl['progressring'].visible = True
         self.ctrl['progressring'].update()
-        self.storage.load_resources()
-        self.load_mainmarkdown_step(self.visible_step_key)
+        busy = self.storage.load_resources(progress=self.show_load_progress)
+        if len(busy) > 0:
+            self.show_message(f'Not reloaded, {", ".join(sorted(busy))} has unsaved changes or an open editor')
+        else:
+            self.load_mainmarkdown_step(self.visible_step_key)
+        self.ctrl['progressring'].value = None
         self.ctrl['progressring'].visible = False
         self.ctrl['progressring'].update()
 
+    def show_load_progress(self, fraction: float):
+        """Shows the loaded fraction of the datafiles on the progress ring."""
+        self.ctrl['progressring'].value = fraction
+        self.ctrl['progressring'].update()
+
+    def data_changed(self, resource_types: list[str]):
+        """Called by the storage after datafiles changed on disk, redraws what this session shows.
+
+        :param resource_types: The reloaded resource types.
+        """
+        self.log(f'data changed: {resource_types}, version {self.storage.version}')
+        if self.visible_step_key in self.storage.cache_steps.data:
+            self.load_mainmarkdown_step(self.visible_step_key)
+        self.seach_update()
+
+    def reload_postponed(self, resource_types: list[str]):
+        """Called by the storage when datafiles changed on disk while they were being edited.
+
+        :param resource_types: The resource types reloaded only after their edits are saved or cancelled.
+        """
+        self.show_message(f'{", ".join(resource_types)} changed on disk, reloaded after the open edits are closed')
+
+    def show_message(self, message: str):
+        """Shows a short notice at the bottom of the page."""
+        self.log(message)
+        self.page.snack_bar = ft.SnackBar(ft.Text(message))
+        self.page.snack_bar.open = True
+        self.page.update()
+
     def longprocess_start(self):
         """ Starts a long process, disabling the maincontent and showing a progress ring.
 
@@ -336,9 +456,14 @@ class MFGDocsApp:
             self.maincontent.opacity = 1.0
             self.maincontent.update()
 
+    def session_close(self, e):
+        """Releases the shared storage when the session expires."""
+        del e
+        self.storage.detach(self)
+
     def log(self, message):
         """Write a message to the console."""
-        print(f"[{datetime.now().isoformat()}] {message}")
+        Storage.log(message)
 
     def display_overview(self):
         """Displays the overview dialog."""
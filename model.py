@@ -1,14 +1,82 @@
 """Contains entities used for the app.
 
 """
+import math
+from types import MappingProxyType
+
+from compositekey import CompositeKey
+from textstore import TextStore, TextRef
+
+EMPTY_RELATION = MappingProxyType({})
+
+
+def to_number(value) -> int or float:
+    """Returns a number, or the number a text spells as an int or a float.
+
+    :raises ValueError: If the value is not a number and spells none.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    if not isinstance(value, str):
+        raise ValueError(f'not a number: {value!r}')
+    v = float(value.strip())
+    if not math.isfinite(v):
+        raise ValueError(f'not a number: {value!r}')
+    if v.is_integer():
+        return int(v)
+    return v
+
+
+class LazyText:
+    """Text attribute that may be kept in a TextStore until it is read.
+
+    The value is stored under the attribute name prefixed with an underscore.
+    """
+
+    def __set_name__(self, owner, name):
+        self.attribute = '_' + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.attribute)
+        if isinstance(value, TextRef):
+            return value.read()
+        return value
+
+    def __set__(self, obj, value):
+        setattr(obj, self.attribute, value)
+
+
+class Relation:
+    """Dict attribute of related keys, left unset until the first write.
+
+    The value is stored under the attribute name prefixed with an underscore, an unset relation
+    reads as a shared, read-only empty mapping. Edit relations through Resource.writable().
+    """
+
+    def __set_name__(self, owner, name):
+        self.attribute = '_' + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.attribute)
+        return EMPTY_RELATION if value is None else value
+
+    def __set__(self, obj, value):
+        setattr(obj, self.attribute, value)
 
 
 class Entity:
     """The Item represents one entity in the model"""
-    pk = None
-    key = ''
-    unit = ''
-    keywords = ''
+    __slots__ = ('pk', 'key', 'unit', 'keywords', '__weakref__')
+
+    def __init__(self):
+        self.pk = None
+        self.key = ''
+        self.unit = ''
+        self.keywords = ''
 
     def set_id(self, pk):
         self.pk = pk
@@ -37,8 +105,12 @@ class Entity:
 class Resource(Entity):
     """A simple resource entity, like a tool,a machine or a role.
     """
+    __slots__ = ('url', 'name', '_description', 'image', 'color', 'category')
+    description = LazyText()
+    lazy_text_fields = ('description',)
 
     def __init__(self):
+        super().__init__()
         self.url = ''
         self.name = ''
         self.description = ''
@@ -46,6 +118,29 @@ class Resource(Entity):
         self.color = ''
         self.category = ''
 
+    def offload_texts(self, store: TextStore, min_length: int):
+        """Moves the long text fields into the store, they are read back on access."""
+        for name in self.lazy_text_fields:
+            value = getattr(self, '_' + name)
+            if isinstance(value, str) and len(value) >= min_length:
+                setattr(self, '_' + name, store.put(value))
+
+    def writable(self, relation: str) -> dict:
+        """Returns the dict of a relation for editing it in place, created on the first write."""
+        value = getattr(self, '_' + relation)
+        if value is None:
+            value = {}
+            setattr(self, '_' + relation, value)
+        return value
+
+    def search_fields(self) -> list[tuple[str, int]]:
+        """Returns the texts indexed for the search box, with their weights in the ranking."""
+        return [(self.key, 4), (self.name, 3), (self.category, 2), (self.description, 1)]
+
+    def contains_texts(self) -> list[str]:
+        """Returns the texts contains() looks into, keep the two in sync."""
+        return [self.name, self.description, self.key, self.category]
+
     def contains(self, txt: str):
         """Returns true if the resource contains the text."""
         txt = txt.lower()
@@ -76,65 +171,66 @@ class Resource(Entity):
 class Part(Resource):
     """Represents a basic part in the technology.
     """
+    __slots__ = ('_bom',)
+    bom = Relation()
 
     def __init__(self):
         super().__init__()
-        self.bom = {}
+        self.bom = None
 
     def to_dict(self):
-        return super().to_dict() | {'bom': self.bom}
+        return super().to_dict() | {'bom': self.bom or {}}
 
     def from_dict(self, d: dict):
         super().from_dict(d)
-        self.bom = d.get('bom', {})
+        self.bom = d.get('bom') or None
 
     @staticmethod
     def extract_stepkey(composite_key: str) -> (str, str):
         """Returns the beginning of the key and the step number between parenthesis as a tuple."""
-        key = composite_key.strip()
-        if '(' in key:
-            key, step = key.split('(', 1)
-            if ')' in step:
-                step = step[:step.index(')')]
-                return key.strip(), step.strip()
-            else:
-                return composite_key.strip(), None
-        return key.strip(), None
+        return tuple(CompositeKey.parse(composite_key))
 
 
 class Action(Resource):
     """Represents a basic action in the technology.
     """
+    __slots__ = ()
 
 
 class Location(Resource):
     """Represents a location.
     """
+    __slots__ = ()
 
 
 class Machine(Resource):
     """Represents a machine used in manufacturing.
     """
+    __slots__ = ()
 
 
 class Consumable(Resource):
     """Represents consumables (mostly untracked amounts).
     """
+    __slots__ = ()
 
 
 class Role(Resource):
     """Represents a role, job position or qualification, not specific employee.
     """
+    __slots__ = ()
 
 
 class Tool(Resource):
     """Represents a tool necessary for manufacturing. Includes custom tools and generic tools.
     """
+    __slots__ = ()
 
 
 class Company(Resource):
     """Represents a company who is responsible for the step.
     """
+    __slots__ = ()
 
 
 class Step(Resource):
@@ -142,69 +238,81 @@ class Step(Resource):
 
     The process itself uses the same tools and machines during all the subprocesses.
     """
+    __slots__ = ('qcfailstep', '_cleanup_text', '_prepare_text', '_acceptance', '_consumables', '_actions',
+                 '_inputparts', '_outputparts', '_tools', '_machines', '_roles', 'location', 'company', 'final',
+                 '_start_after', '_start_after_start', 'unit_time_hours', 'prepare_hours', 'cooldown_hours')
+    prepare_text = LazyText()
+    cleanup_text = LazyText()
+    acceptance = LazyText()
+    lazy_text_fields = ('description', 'prepare_text', 'cleanup_text', 'acceptance')
+    inputparts = Relation()
+    outputparts = Relation()
+    tools = Relation()
+    machines = Relation()
+    roles = Relation()
+    consumables = Relation()
+    actions = Relation()
+    start_after = Relation()
+    start_after_start = Relation()
+    relation_names = ('inputparts', 'outputparts', 'tools', 'machines', 'roles', 'consumables', 'actions',
+                      'start_after', 'start_after_start')
 
     def __init__(self):
         super().__init__()
         self.qcfailstep = None
         self.cleanup_text = ''
         self.prepare_text = ''
-        self.consumables = {}
         self.acceptance = ''
-        self.actions = {}
-        self.inputparts = {}
-        self.outputparts = {}
-        self.tools = {}
-        self.machines = {}
-        self.roles = {}
+        for name in self.relation_names:
+            setattr(self, '_' + name, None)
         self.location = None
         self.company = None
         self.final = False
-        self.start_after = {}
-        self.start_after_start = {}
         self.unit_time_hours = 0
         self.prepare_hours = 0
         self.cooldown_hours = 0
 
     def from_dict(self, d: dict):
         super().from_dict(d)
-        self.inputparts = d.get('inputparts', {})
-        self.outputparts = d.get('outputparts', {})
+        # parsed once here, the keys share the interned strings of their CompositeKey
+        self.inputparts = {CompositeKey.parse(k).text: v for k, v in d.get('inputparts', {}).items()} or None
+        self.outputparts = d.get('outputparts') or None
         self.final = d.get('final', False)
         self.qcfailstep = d.get('qcfailstep', False)
-        self.tools = d.get('tools', {})
-        self.machines = d.get('machines', {})
-        self.roles = d.get('roles', {})
-        self.consumables = d.get('consumables', {})
+        self.tools = d.get('tools') or None
+        self.machines = d.get('machines') or None
+        self.roles = d.get('roles') or None
+        self.consumables = d.get('consumables') or None
         self.location = d.get('location', None)
         self.company = d.get('company', None)
-        self.actions = d.get('actions', {})
+        self.actions = d.get('actions') or None
         self.acceptance = d.get('acceptance', '')
         self.prepare_text = d.get('prepare_text', '')
         self.cleanup_text = d.get('cleanup_text', '')
-        self.start_after = d.get('start_after', {})
-        self.start_after_start = d.get('start_after_start', {})
+        self.start_after = d.get('start_after') or None
+        self.start_after_start = d.get('start_after_start') or None
         self.unit_time_hours = d.get('unit_time_hours', 0)
         self.prepare_hours = d.get('prepare_hours', 0)
         self.cooldown_hours = d.get('cooldown_hours', 0)
 
     def to_dict(self):
         return super().to_dict() | {
-            'inputparts': self.inputparts,
-            'outputparts': self.outputparts,
-            'tools': self.tools,
-            'machines': self.machines,
+            'inputparts': self.inputparts or {},
+            'outputparts': self.outputparts or {},
+            'tools': self.tools or {},
+            'machines': self.machines or {},
             'final': self.final,
             'qcfailstep': self.qcfailstep,
-            'roles': self.roles,
-            'actions': self.actions,
-            'consumables': self.consumables,
+            'roles': self.roles or {},
+            'actions': self.actions or {},
+            'consumables': self.consumables or {},
             'prepare_text': self.prepare_text,
             'cleanup_text': self.cleanup_text,
             'company': self.company,
             'location': self.location,
             'acceptance': self.acceptance,
-            'start_after': self.start_after,
-            'start_after_start': self.start_after_start,
+            'start_after': self.start_after or {},
+            'start_after_start': self.start_after_start or {},
             'unit_time_hours': self.unit_time_hours,
             'prepare_hours': self.prepare_hours,
             'cooldown_hours': self.cooldown_hours}
@@ -247,75 +355,94 @@ class Step(Resource):
                 key in self.start_after or
                 key in self.start_after_start)
 
+    def inputpart_keys(self) -> list[str]:
+        """Returns the part keys of the inputs, without the producing step of composite keys."""
+        return [CompositeKey.parse(k).part for k in self.inputparts.keys()]
+
+    def inputpart_step_keys(self) -> list[str]:
+        """Returns the keys of the steps producing the inputs, for the composite PART(STEP) keys."""
+        steps = []
+        for k in self.inputparts.keys():
+            composite = CompositeKey.parse(k)
+            if composite.has_step() and composite.step not in steps:
+                steps.append(composite.step)
+        return steps
+
     def add_inputpart(self, partkey, amount):
-        if partkey in self.inputparts:
-            self.inputparts[partkey] += amount
+        inputparts = self.writable('inputparts')
+        if partkey in inputparts:
+            inputparts[partkey] += amount
         else:
-            self.inputparts[partkey] = amount
+            inputparts[partkey] = amount
 
     def remove_inputpart(self, partkey):
         if partkey in self.inputparts:
             del self.inputparts[partkey]
 
     def add_outputpart(self, partkey, amount):
-        if partkey in self.outputparts:
-            self.outputparts[partkey] += amount
+        outputparts = self.writable('outputparts')
+        if partkey in outputparts:
+            outputparts[partkey] += amount
         else:
-            self.outputparts[partkey] = amount
+            outputparts[partkey] = amount
 
     def remove_outputpart(self, partkey):
         if partkey in self.outputparts:
             del self.outputparts[partkey]
 
     def add_tool(self, partkey, amount):
-        if partkey in self.tools:
-            self.inputparts[partkey] += amount
+        tools = self.writable('tools')
+        if partkey in tools:
+            tools[partkey] += amount
         else:
-            self.inputparts[partkey] = amount
+            tools[partkey] = amount
 
     def remove_tool(self, partkey):
         if partkey in self.tools:
             del self.tools[partkey]
 
     def add_action(self, key, amount):
-        if key in self.actions:
-            self.inputparts[key] += amount
+        actions = self.writable('actions')
+        if key in actions:
+            actions[key] += amount
         else:
-            self.inputparts[key] = amount
+            actions[key] = amount
 
     def remove_action(self, key):
         if key in self.actions:
             del self.actions[key]
 
     def add_machine(self, partkey, amount):
-        if partkey in self.machines:
-            self.inputparts[partkey] += amount
+        machines = self.writable('machines')
+        if partkey in machines:
+            machines[partkey] += amount
         else:
-            self.inputparts[partkey] = amount
+            machines[partkey] = amount
 
     def remove_machine(self, partkey):
         if partkey in self.machines:
             del self.machines[partkey]
 
     def add_role(self, partkey, amount):
-        if partkey in self.roles:
-            self.roles[partkey] += amount
+        roles = self.writable('roles')
+        if partkey in roles:
+            roles[partkey] += amount
         else:
-            self.roles[partkey] = amount
+            roles[partkey] = amount
 
     def remove_role(self, partkey):
         if partkey in self.roles:
             del self.roles[partkey]
 
     def add_start_after(self, stepkey, amount):
-        self.start_after[stepkey] = amount
+        self.writable('start_after')[stepkey] = amount
 
     def remove_start_after(self, stepkey):
         if stepkey in self.start_after:
             del self.start_after[stepkey]
 
     def add_start_after_start(self, stepkey, amount):
-        self.start_after_start[stepkey] = amount
+        self.writable('start_after_start')[stepkey] = amount
 
     def remove_start_after_start(self, stepkey):
         if stepkey in self.start_after_start:
@@ -327,11 +454,27 @@ class Step(Resource):
     def set_company(self, companykey):
         self.company = companykey
 
-    def set_prepare_hours(self, prepare_hours: float):
-        self.prepare_hours = prepare_hours
+    # the setters validate the hours typed into the editor, a ValueError leaves the step unchanged
+    def set_unit_time_hours(self, unit_time_hours):
+        self.unit_time_hours = to_number(unit_time_hours)
+
+    def set_prepare_hours(self, prepare_hours):
+        self.prepare_hours = to_number(prepare_hours)
+
+    def set_cooldown_hours(self, cooldown_hours):
+        self.cooldown_hours = to_number(cooldown_hours)
+
+    def search_fields(self) -> list[tuple[str, int]]:
+        relations = [self.inputparts, self.outputparts, self.tools, self.actions,
+                     self.machines, self.roles, self.consumables]
+        return super().search_fields() + [
+            (self.acceptance, 1), (self.prepare_text, 1), (self.cleanup_text, 1), (self.location, 2),
+            (' '.join(key for relation in relations for key in relation.keys()), 2)]
 
-    def set_cooldown_hours(self, cooldown_hours: float):
-        self.cooldown_hours = cooldown_hours
+    def contains_texts(self) -> list[str]:
+        return super().contains_texts() + [self.acceptance, self.prepare_text, self.cleanup_text, self.location] + [
+            key for relation in [self.inputparts, self.outputparts, self.tools, self.actions,
+                                 self.machines, self.roles, self.consumables] for key in relation.keys()]
 
     def contains(self, txt: str):
         """Returns true if the step contains the text."""
@@ -7,6 +7,7 @@ import os
 import graphviz
 from graphviz import Digraph
 
+from compositekey import CompositeKey
 from model import Step, Part
 
 
@@ -44,8 +45,7 @@ class RenderDot:
             nodes[stepkey] = True
             self.dot_render_step_compact(dg, step)
             for partkey, amount in step.inputparts.items():
-                only_partkey, only_stepkey = Part.extract_stepkey(partkey)
-                part = self.storage.cache_parts.data[only_partkey]
+                part = self.storage.cache_parts.data[CompositeKey.parse(partkey).part]
                 if partkey not in nodes:
                     nodes[partkey] = True
                     self.dot_render_part_compact(dg, part, partkey)
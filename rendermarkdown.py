@@ -1,7 +1,10 @@
 """Contains Markdown rendering functions."""
 import itertools
+import math
+import urllib.parse
 
-from model import Part, Step
+from compositekey import CompositeKey
+from model import Part, Resource, Step
 
 
 class RenderMarkdown:
@@ -18,9 +21,38 @@ class RenderMarkdown:
         :return: The rendered markdown.
         """
         md = f'''# {part.key} {part.name}'''
+        md += self.render_where_used(part.key)
+        return md
+
+    def render_resource(self, resource: Resource) -> str:
+        """Renders a resource other than a step or a part to markdown.
+
+        :param resource: The resource to render.
+        :return: The rendered markdown.
+        """
+        md = f'''# {resource.key} {resource.name}
 
+{resource.description}
+'''
+        md += self.render_where_used(resource.key)
         return md
 
+    def render_where_used(self, key: str) -> str:
+        """Renders the steps referring to a key, with the relations they have to it."""
+        used = self.storage.where_used([key])[key]
+        if len(used) == 0:
+            return ''
+        relations = {}
+        for step_key, relation in sorted(used):
+            relations.setdefault(step_key, []).append(relation)
+        steps = self.storage.cache_steps.data
+        lines = ['', '', '## Where used', '']
+        for step_key, names in relations.items():
+            name = steps[step_key].name if step_key in steps else 'MISSING'
+            lines.append(f" - [{step_key}](click://step_show/{urllib.parse.quote(step_key, safe='')}) "
+                         f"{name} ({', '.join(names)})")
+        return '\n'.join(lines) + '\n'
+
     def render_step(self, step: Step) -> str:
         """Renders a step to markdown.
 
@@ -28,9 +60,16 @@ class RenderMarkdown:
         :return: The rendered markdown.
         """
         s = self.mfgdocsapp.storage
+        # the long texts may live in the text store, read each of them only once
+        prepare_text = step.prepare_text
+        description = step.description
+        acceptance = step.acceptance
+        cleanup_text = step.cleanup_text
+        with s.lock:
+            needed_by = dict.fromkeys(s.step_graph.descendants(step.pk))
         md = f'''
 # {step.key} {step.name} [:pencil2:](click://step_edit/{step.pk})
- - :busts_in_silhouette: {self.lookup_single_item(step.company, s.cache_companies.data)} :round_pushpin: {self.lookup_single_item(step.location, s.cache_locations.data)} :clock1: {step.unit_time_hours} :clock2: {step.prepare_hours} :clock3: {step.cooldown_hours}
+ - :busts_in_silhouette: {self.lookup_single_item(step.company, s.cache_companies.data)} :round_pushpin: {self.lookup_single_item(step.location, s.cache_locations.data)} :clock1: {step.unit_time_hours} :clock2: {step.prepare_hours} :clock3: {step.cooldown_hours} :hourglass: {self.render_lead_hours(step)}
 | Input [:pencil2:](click://step_edit_inputparts/{step.pk})| Output [:pencil2:](click://step_edit_outputparts/{step.pk})| Roles [:pencil2:](click://step_edit_roles/{step.pk})| Actions [:pencil2:](click://step_edit_actions/{step.pk})| Machines [:pencil2:](click://step_edit_machines/{step.pk})| Tools [:pencil2:](click://step_edit_tools/{step.pk})| Consumables [:pencil2:](click://step_edit_consumables/{step.pk})|
 | :---: | :---: | :---: | :---: | :---: | :---: | :---: |
 {self.multitable(step,step.inputparts, s.cache_parts.data,
@@ -40,18 +79,18 @@ class RenderMarkdown:
                  step.machines, s.cache_machines.data,
                  step.tools, s.cache_tools.data,
                  step.consumables, s.cache_consumables.data)}
-{'## Prepare' if len(step.prepare_text.strip()) > 0 else ''}
-{'## Prepare' if len(step.prepare_text.strip()) > 0 else ''}
-{step.prepare_text}
+{'## Prepare' if len(prepare_text.strip()) > 0 else ''}
+{'## Prepare' if len(prepare_text.strip()) > 0 else ''}
+{prepare_text}
 
-{'## Description' if len(step.description.strip()) > 0 else ''}
-{step.description}
+{'## Description' if len(description.strip()) > 0 else ''}
+{description}
 
-{'## Acceptance criteria' if len(step.acceptance.strip()) > 0 else ''}
-{step.acceptance}
+{'## Acceptance criteria' if len(acceptance.strip()) > 0 else ''}
+{acceptance}
 
-{'## Cleanup' if len(step.cleanup_text.strip()) > 0 else ''}
-{step.cleanup_text}
+{'## Cleanup' if len(cleanup_text.strip()) > 0 else ''}
+{cleanup_text}
 
 {'## Depends on ' if len(step.start_after) > 0 else ''}
 
@@ -61,10 +100,42 @@ class RenderMarkdown:
 
 {self.list_items(step.start_after_start, s.cache_steps.data)}
 
+{'## Needed by ' if len(needed_by) > 0 else ''}
+
+{self.list_items(needed_by, s.cache_steps.data)}
+
 
         '''
         return md
 
+    def render_lead_hours(self, step: Step) -> str:
+        """Renders the hours until a step is done, along the longest chain of the steps it waits for.
+
+        The steps started together with it by start_after_start run in parallel, their hours are not added.
+        """
+        edge_types = ['start_after', 'inputparts']
+        with self.storage.lock:
+            graph = self.storage.step_graph
+            pks = [step.pk] + graph.ancestors(step.pk, edge_types)
+            depends = {pk: graph.neighbors(pk, edge_types) for pk in pks}
+            hours = self.storage.step_table.lead_hours(pks=pks)
+        skipped = {pk for pk in pks if math.isnan(hours.get(pk, math.nan))}
+        done = {}
+        visiting = set()
+        stack = [(step.pk, False)]
+        while len(stack) > 0:
+            pk, expanded = stack.pop()
+            if expanded:
+                own = 0 if pk in skipped else hours[pk]
+                done[pk] = own + max((done.get(dependency, 0) for dependency in depends[pk]), default=0)
+            elif pk not in done and pk not in visiting:
+                # a dependency cycle is cut where it closes
+                visiting.add(pk)
+                stack.append((pk, True))
+                stack.extend((dependency, False) for dependency in depends[pk])
+        total = done[step.pk]
+        return f'{total:g}' + (f' ({len(skipped)} steps without valid hours)' if len(skipped) > 0 else '')
+
     def lookup_single_item(self, key, data: dict) -> str:
         return f"{key} {data[key].name if key in data else 'MISSING'}"
 
@@ -89,13 +160,15 @@ class RenderMarkdown:
 
     def multitable(self, step:Step, ipart, ipartdata, opart, opartdata, roles, rolesdata, actions, actionsdata, machines,
                    machinesdata, tools, toolsdata, consumables, consumablesdata) -> str:
-        ipartlist = self.list_from_itemlist_and_data(ipart, ipartdata)
-        opartlist = self.list_from_itemlist_and_data(opart, opartdata, ':heavy_check_mark:' if step.final else '('+step.key+')')
-        roleslist = self.list_from_itemlist_and_data(roles, rolesdata)
-        actionslist = self.list_from_itemlist_and_data(actions, actionsdata)
-        machineslist = self.list_from_itemlist_and_data(machines, machinesdata)
-        toolslist = self.list_from_itemlist_and_data(tools, toolsdata)
-        consumableslist = self.list_from_itemlist_and_data(consumables, consumablesdata)
+        ipartlist = self.list_from_itemlist_and_data(ipart, ipartdata, resource_type='parts')
+        opartlist = self.list_from_itemlist_and_data(opart, opartdata,
+                                                     ':heavy_check_mark:' if step.final else '('+step.key+')',
+                                                     resource_type='parts')
+        roleslist = self.list_from_itemlist_and_data(roles, rolesdata, resource_type='roles')
+        actionslist = self.list_from_itemlist_and_data(actions, actionsdata, resource_type='actions')
+        machineslist = self.list_from_itemlist_and_data(machines, machinesdata, resource_type='machines')
+        toolslist = self.list_from_itemlist_and_data(tools, toolsdata, resource_type='tools')
+        consumableslist = self.list_from_itemlist_and_data(consumables, consumablesdata, resource_type='consumables')
 
         table = ''
         for (ipart, opart, role, action, machine, tool, consumable) in itertools.zip_longest(ipartlist, opartlist,
@@ -106,13 +179,18 @@ class RenderMarkdown:
             table += '| ' + ipart + ' | ' + opart + ' | ' + role + ' | ' + action + ' | ' + machine + ' | ' + tool + ' | ' + consumable + ' | \n'
         return table
 
-    def list_from_itemlist_and_data(self, itemdict: dict, data: dict, append: str = '') -> list:
+    def list_from_itemlist_and_data(self, itemdict: dict, data: dict, append: str = '',
+                                    resource_type: str = None) -> list:
         lst = []
         for k, v in itemdict.items():
+            kk = k
             try:
                 item = data[k]
             except KeyError:
-                kk,stepkey = Part.extract_stepkey(k)
+                kk = CompositeKey.parse(k).part
                 item = data[kk]
-            lst.append(f"{v} {item.unit} x {k}{' '+append if append != '' else ''} - {item.name}")
+            name = item.name
+            if resource_type is not None:
+                name = f"[{item.name}](click://resource_show/{resource_type}/{urllib.parse.quote(kk, safe='')})"
+            lst.append(f"{v} {item.unit} x {k}{' '+append if append != '' else ''} - {name}")
         return lst
@@ -0,0 +1,69 @@
+"""
+Typed results of a search over several resource types, read a page at a time.
+
+"""
+import threading
+from concurrent.futures import Future
+
+
+class SearchResults:
+    """The matching pks of each resource type, searched concurrently.
+
+    The pages follow the order of the resource types, a page waits only for the types it shows,
+    so the first page is ready as soon as the first types are searched.
+    """
+
+    def __init__(self, query: str, resource_types: list[str], futures: dict[str, Future], mode: str = 'contains',
+                 version: int = None, cancelled: threading.Event = None):
+        self.query = query
+        self.resource_types = list(resource_types)
+        self.futures = futures
+        self.mode = mode
+        self.version = version
+        self.cancelled = cancelled if cancelled is not None else threading.Event()
+
+    @staticmethod
+    def done(pks: list[str]) -> Future:
+        """Returns a finished future, for the results known already."""
+        future = Future()
+        future.set_result(pks)
+        return future
+
+    def pks(self, resource_type: str) -> list[str]:
+        return self.futures[resource_type].result()
+
+    def totals(self) -> dict[str, int]:
+        """Returns the number of matches by resource type, waiting for every type."""
+        return {resource_type: len(self.pks(resource_type)) for resource_type in self.resource_types}
+
+    def total(self) -> int:
+        return sum(self.totals().values())
+
+    def page(self, number: int, page_size: int) -> list[tuple[str, str]]:
+        """Returns the (resource type, pk) pairs of a page, numbered from 0."""
+        start = number * page_size
+        end = start + page_size
+        result = []
+        offset = 0
+        for resource_type in self.resource_types:
+            pks = self.pks(resource_type)
+            if offset + len(pks) > start:
+                result.extend((resource_type, pk) for pk in pks[max(0, start - offset):end - offset])
+            offset += len(pks)
+            if offset >= end:
+                break
+        return result
+
+    def page_count(self, page_size: int) -> int:
+        return (self.total() + page_size - 1) // page_size
+
+    def cancel(self):
+        """Cancels the searches not started yet, and asks the running ones to stop."""
+        self.cancelled.set()
+        for future in self.futures.values():
+            future.cancel()
+
+    def complete(self) -> bool:
+        """Returns true if every type was searched to the end."""
+        return not self.cancelled.is_set() and all(
+            future.done() and not future.cancelled() for future in self.futures.values())
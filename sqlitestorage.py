@@ -0,0 +1,468 @@
+"""
+SQLite backed storage for datasets that do not fit the "load everything into dicts" model.
+
+Every resource type has its own table, the relations of the steps are kept in a separate indexed table.
+Entities are hydrated on access, so memory use does not grow with the dataset.
+The JSON datafiles stay the version controlled source: they are imported when they change on disk
+and the saved resource types are exported back to them.
+"""
+import json
+import os
+import sqlite3
+import weakref
+from collections import deque
+from collections.abc import MutableMapping
+
+from cache import Cache
+from compositekey import CompositeKey
+from config import Config
+from stepgraph import StepGraph
+from steptable import StepTable
+from storage import Storage
+
+COLUMNS = ('key', 'name', 'category', 'unit', 'location', 'company')
+INDEXED_COLUMNS = ('key', 'category', 'location', 'company')
+STEP_RELATIONS = ('inputparts', 'outputparts', 'tools', 'machines', 'roles', 'actions', 'consumables',
+                  'start_after', 'start_after_start')
+# relations derived from the entity instead of read from its dict, stored in step_relations too
+DERIVED_RELATIONS = ('inputpart_keys', 'inputpart_step_keys')
+PAGE_SIZE = 500
+# hydrated entities held strongly, so one edited in place is still found when it is marked dirty
+RECENT_ENTITIES = 1024
+# bumped when the stored rows change shape, the datafiles are imported again after that
+SCHEMA_VERSION = 3
+
+
+class SqliteMapping(MutableMapping):
+    """Dict-like view of a table, used as the data attribute of a SqliteCache.
+
+    Hydrated entities are kept in an identity map while they are referenced, so every reader shares
+    the same object and in-place edits are found by the next save. The last RECENT_ENTITIES hydrated
+    are referenced here too, as an entity edited in place may have no other reference left when it is marked dirty.
+    """
+
+    def __init__(self, cache: 'SqliteCache'):
+        self.cache = cache
+        self.live = weakref.WeakValueDictionary()
+        self.recent = deque(maxlen=RECENT_ENTITIES)
+
+    def hydrate(self, pk: str, doc: str):
+        item = self.live.get(pk)
+        if item is None:
+            item = self.cache.classname()
+            item.from_dict(json.loads(doc))
+            self.live[pk] = item
+            self.recent.append(item)
+        return item
+
+    def __getitem__(self, pk):
+        item = self.live.get(pk)
+        if item is not None:
+            return item
+        row = self.cache.query_one(f'SELECT doc FROM {self.cache.name} WHERE pk = ?', (pk,))
+        if row is None:
+            raise KeyError(pk)
+        return self.hydrate(pk, row[0])
+
+    def __setitem__(self, pk, value):
+        self.cache.add(pk, value)
+
+    def __delitem__(self, pk):
+        if pk not in self:
+            raise KeyError(pk)
+        self.cache.remove(pk)
+
+    def __contains__(self, pk):
+        return self.cache.query_one(f'SELECT 1 FROM {self.cache.name} WHERE pk = ?', (pk,)) is not None
+
+    def __iter__(self):
+        for pk, _ in self.rows():
+            yield pk
+
+    def __len__(self):
+        return self.cache.query_one(f'SELECT COUNT(*) FROM {self.cache.name}')[0]
+
+    def rows(self):
+        """Yields (pk, doc) pairs in insertion order, fetching them page by page."""
+        rowid = -1
+        while True:
+            page = self.cache.query_all(
+                f'SELECT rowid, pk, doc FROM {self.cache.name} WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                (rowid, PAGE_SIZE)
+            )
+            for rowid, pk, doc in page:
+                yield pk, doc
+            if len(page) < PAGE_SIZE:
+                return
+
+    def items(self):
+        for pk, doc in self.rows():
+            yield pk, self.hydrate(pk, doc)
+
+    def values(self):
+        for pk, doc in self.rows():
+            yield self.hydrate(pk, doc)
+
+
+class SqliteCache(Cache):
+    """Cache with the same API as the in-memory one, backed by one table.
+
+    The extra keys are served by real indexes on the key, category, location and company columns.
+    """
+
+    def __init__(self, name: str, classname, connection: sqlite3.Connection, lock):
+        super().__init__(name)
+        self.classname = classname
+        self.connection = connection
+        self.lock = lock
+        self.data = SqliteMapping(self)
+
+    def query_one(self, sql: str, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchone()
+
+    def query_all(self, sql: str, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute(f'DELETE FROM {self.name}')
+            if self.name == 'steps':
+                self.connection.execute('DELETE FROM step_relations')
+        self.data.live = weakref.WeakValueDictionary()
+        self.data.recent.clear()
+        self.fuzzy = None
+        self.dirty = set()
+
+    def add(self, pk, value, extrakeys=None):
+        """Inserts or updates the row of an entity, the transaction is committed by the storage."""
+        del extrakeys  # the columns are indexed by the database
+        self.add_many([(pk, value)])
+
+    def add_many(self, items: list):
+        """Inserts or updates the rows of (pk, entity) pairs in one batch, see add()."""
+        rows = []
+        relations = []
+        for pk, value in items:
+            d = value.to_dict()
+            rows.append([pk] + [d.get(column) for column in COLUMNS] + [json.dumps(d, sort_keys=True)])
+            if self.name == 'steps':
+                relations.extend((pk, relation, target, json.dumps(amount))
+                                 for relation in STEP_RELATIONS for target, amount in (d.get(relation) or {}).items())
+                relations.extend((pk, relation, target, None)
+                                 for relation in DERIVED_RELATIONS for target in getattr(value, relation)())
+        with self.lock:
+            self.connection.executemany(
+                f'INSERT INTO {self.name} (pk, {", ".join(COLUMNS)}, doc) VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+                f'ON CONFLICT(pk) DO UPDATE SET '
+                f'{", ".join(column + " = excluded." + column for column in COLUMNS)}, doc = excluded.doc',
+                rows
+            )
+            if self.name == 'steps':
+                self.connection.executemany('DELETE FROM step_relations WHERE step_pk = ?',
+                                            [(pk,) for pk, _ in items])
+                self.connection.executemany(
+                    'INSERT INTO step_relations (step_pk, relation, target, amount) VALUES (?, ?, ?, ?)', relations
+                )
+            for pk, value in items:
+                self.data.live[pk] = value
+                if self.fuzzy is not None:
+                    self.fuzzy.add(pk)
+
+    def remove(self, pk, extrakeys=None):
+        del extrakeys
+        with self.lock:
+            self.connection.execute(f'DELETE FROM {self.name} WHERE pk = ?', (pk,))
+            if self.name == 'steps':
+                self.connection.execute('DELETE FROM step_relations WHERE step_pk = ?', (pk,))
+        self.data.live.pop(pk, None)
+        self.dirty.discard(pk)
+        if self.fuzzy is not None:
+            self.fuzzy.remove(pk)
+
+    def get_by_unique_key(self, key, value):
+        if key not in COLUMNS:
+            return None
+        rows = self.query_all(f'SELECT pk, doc FROM {self.name} WHERE {key} = ? LIMIT 2', (value,))
+        if len(rows) != 1:
+            return None
+        return self.data.hydrate(rows[0][0], rows[0][1])
+
+    def update(self, pk, value=None):
+        """Writes the row of an entity changed in place, or replaces it if a value is given.
+
+        The entities are only held weakly, an edit not written here is lost once the entity is dropped.
+        """
+        if value is None:
+            value = self.data.live.get(pk)
+        if value is not None:
+            self.add(pk, value)
+
+    def find_pks(self, key, value) -> list:
+        """Returns the primary keys by an indexed column, or by a step relation using the relation table."""
+        if key in COLUMNS:
+            return [row[0] for row in self.query_all(
+                f'SELECT pk FROM {self.name} WHERE {key} = ? ORDER BY rowid', (value,)
+            )]
+        if self.name == 'steps' and (key in STEP_RELATIONS or key in DERIVED_RELATIONS):
+            return [row[0] for row in self.query_all(
+                'SELECT DISTINCT step_pk FROM step_relations WHERE relation = ? AND target = ?', (key, value)
+            )]
+        return []
+
+    def find_range(self, key, low=None, high=None) -> list:
+        if key not in COLUMNS:
+            return []
+        conditions = [f'{key} IS NOT NULL']
+        params = []
+        if low is not None:
+            conditions.append(f'{key} >= ?')
+            params.append(low)
+        if high is not None:
+            conditions.append(f'{key} <= ?')
+            params.append(high)
+        rows = self.query_all(
+            f'SELECT pk, doc FROM {self.name} WHERE {" AND ".join(conditions)} ORDER BY {key}, rowid', params
+        )
+        return [self.data.hydrate(pk, doc) for pk, doc in rows]
+
+    def list_by_key(self, key, value):
+        if key not in COLUMNS:
+            return None
+        rows = self.query_all(f'SELECT pk, doc FROM {self.name} WHERE {key} = ? ORDER BY rowid', (value,))
+        if len(rows) == 0:
+            return None
+        return [self.data.hydrate(pk, doc) for pk, doc in rows]
+
+
+class SqliteStorage(Storage):
+    """Storage keeping the data in a SQLite database instead of in memory.
+
+    get_resource_by_type_and_key(), cache_by_resource_type() and the caches work as with the JSON backend.
+    """
+
+    def __init__(self):
+        self.connection = None
+        super().__init__(layout='monolithic')
+        self.journal = None
+        self.textstore = None
+
+    def open_database(self):
+        """Connects to Config.sqlite_file, creating the schema and the caches on first use."""
+        if self.connection is not None:
+            return
+        os.makedirs(os.path.dirname(Config.sqlite_file) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(Config.sqlite_file, check_same_thread=False)
+        with self.lock, self.connection:
+            for resource_type, _, _ in self.resource_types:
+                self.connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS {resource_type} '
+                    f'(pk TEXT PRIMARY KEY, {", ".join(column + " TEXT" for column in COLUMNS)}, doc TEXT NOT NULL)'
+                )
+                for column in INDEXED_COLUMNS:
+                    self.connection.execute(
+                        f'CREATE INDEX IF NOT EXISTS {resource_type}_{column} ON {resource_type} ({column})'
+                    )
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS step_relations (step_pk TEXT, relation TEXT, target TEXT, amount TEXT)'
+            )
+            self.connection.execute('CREATE INDEX IF NOT EXISTS step_relations_step ON step_relations (step_pk)')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS step_relations_target ON step_relations (target, relation)'
+            )
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS datafiles (filename TEXT PRIMARY KEY, stat TEXT)'
+            )
+            if self.connection.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                self.connection.execute('DELETE FROM datafiles')
+                self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        for resource_type, _, classname in self.resource_types:
+            setattr(self, f'cache_{resource_type}', SqliteCache(resource_type, classname, self.connection, self.lock))
+
+    def load_resources(self, progress=None) -> set[str]:
+        """Imports the datafiles that changed since their last import or export.
+
+        :return: The resource types that kept the data from being reloaded, see Storage.load_resources().
+        """
+        self.open_database()
+        busy = self.busy_resource_types()
+        if len(busy) > 0:
+            self.log(f'sqlitestorage.load_resources refused, unsaved changes or open editors in {sorted(busy)}')
+            return busy
+        CompositeKey.reset()
+        report = self.progress_reporter(progress)
+        imported = []
+        for resource_type, filename, _ in self.resource_types:
+            stat = self.datafile_stat(filename)
+            if stat is not None and stat != self.imported_stat(filename):
+                if self.import_json(resource_type, report):
+                    imported.append(resource_type)
+            else:
+                self.file_stats[filename] = stat
+        if progress is not None:
+            progress(1.0)
+        step_graph = self.build_step_graph(self.cache_steps)
+        step_table = self.build_step_table(self.cache_steps)
+        with self.lock:
+            self.step_graph = step_graph
+            self.step_table = step_table
+            self.text_index = None
+            self.trigram_indexes = {}
+            self.version += 1
+        self.log(f'sqlitestorage imported {imported if len(imported) > 0 else "nothing"}')
+        return set()
+
+    def build_step_graph(self, cache: Cache) -> StepGraph:
+        """Builds the dependency graph from the relation table, without hydrating the steps."""
+        graph = StepGraph(self.symbols)
+        relations = {'start_after': 'start_after', 'start_after_start': 'start_after_start',
+                     'inputpart_step_keys': 'inputparts'}
+        for pk, relation, target in cache.query_all(
+                f'SELECT step_pk, relation, target FROM step_relations '
+                f'WHERE relation IN ({", ".join("?" * len(relations))}) ORDER BY rowid', list(relations)):
+            graph.add_edge(pk, relations[relation], target)
+        return graph
+
+    def build_step_table(self, cache: Cache) -> StepTable:
+        """Builds the columnar mirror of the steps from the stored documents, without hydrating the steps."""
+        table = StepTable(self.symbols)
+        amounts = {}
+        for pk, relation, target, amount in cache.query_all(
+                f'SELECT step_pk, relation, target, amount FROM step_relations '
+                f'WHERE relation IN ({", ".join("?" * len(StepTable.amount_relations))}) ORDER BY rowid',
+                list(StepTable.amount_relations)):
+            amounts.setdefault(pk, []).append((relation, target, json.loads(amount)))
+        hours = ', '.join(f"json_extract(doc, '$.{name}')" for name in StepTable.hour_columns)
+        for row in cache.query_all(f'SELECT pk, {hours} FROM steps ORDER BY rowid'):
+            table.set_row(row[0], list(row[1:]), amounts.get(row[0], []))
+        return table
+
+    def query_one(self, sql: str, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchone()
+
+    def query_all(self, sql: str, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def imported_stat(self, filename: str):
+        row = self.query_one('SELECT stat FROM datafiles WHERE filename = ?', (filename,))
+        return None if row is None else tuple(json.loads(row[0]))
+
+    def remember_stat(self, filename: str):
+        """Records the datafile state matching the database content, the caller commits."""
+        stat = self.datafile_stat(filename)
+        self.file_stats[filename] = stat
+        self.connection.execute(
+            'INSERT OR REPLACE INTO datafiles (filename, stat) VALUES (?, ?)', (filename, json.dumps(stat))
+        )
+
+    def import_json(self, resource_type: str, progress=None) -> bool:
+        """Replaces the table of a resource type with the content of its datafile.
+
+        The datafile is streamed into the table a page of entities at a time, in a single transaction,
+        so the memory used does not grow with the datafile.
+
+        :return: False if the resource type is being edited or saved, the table is kept.
+        """
+        for rt, filename, classname in self.resource_types:
+            if rt == resource_type:
+                cache = self.cache_by_resource_type(resource_type)
+                with self.lock, self.connection:
+                    if resource_type in self.busy_resource_types():
+                        self.log(f'sqlitestorage.import_json skipped {resource_type}, it is being edited or saved')
+                        return False
+                    cache.clear()
+                    page = []
+                    for key, item in self.iter_json(filename, classname, progress):
+                        page.append((key, item))
+                        if len(page) == PAGE_SIZE:
+                            cache.add_many(page)
+                            page = []
+                    cache.add_many(page)
+                    self.remember_stat(filename)
+                return True
+        return False
+
+    def export_json(self):
+        """Writes every datafile from the database."""
+        for resource_type, filename, _ in self.resource_types:
+            self.save_json(resource_type, filename)
+        self.flush()
+
+    def reload_resource(self, resource_type: str) -> bool:
+        if resource_type in self.busy_resource_types():
+            self.log(f'sqlitestorage.reload_resource skipped {resource_type}, it has unsaved changes or open editors')
+            return False
+        if not self.import_json(resource_type):
+            return False
+        step_graph = self.build_step_graph(self.cache_steps) if resource_type == 'steps' else None
+        step_table = self.build_step_table(self.cache_steps) if resource_type == 'steps' else None
+        with self.lock:
+            if step_graph is not None:
+                self.step_graph = step_graph
+                self.step_table = step_table
+            self.refresh_search_indexes(resource_type)
+            self.version += 1
+        return True
+
+    def save_resources(self, force=False) -> dict[str, int]:
+        """Writes the changed entities into the database, then queues exporting their datafiles."""
+        saved = {}
+        with self.lock, self.connection:
+            for resource_type, filename, _ in self.resource_types:
+                cache = self.cache_by_resource_type(resource_type)
+                if not force and not cache.is_dirty():
+                    continue
+                dirty = cache.dirty
+                cache.clear_dirty()
+                written = 0
+                for pk in dirty:
+                    if pk in cache.data.live:
+                        cache.add(pk, cache.data.live[pk])
+                        written += 1
+                    elif pk in cache.data:
+                        # written by update() when it was marked dirty, and dropped since
+                        written += 1
+                saved[filename] = written
+        for resource_type, filename, _ in self.resource_types:
+            if filename in saved:
+                self.save_json(resource_type, filename)
+        if len(saved) > 0:
+            self.version += 1
+        self.log(f'sqlitestorage.save_resources saved {saved if len(saved) > 0 else "nothing"}')
+        return saved
+
+    def write_datafile(self, resource_type: str, filename: str):
+        super().write_datafile(resource_type, filename)
+        with self.lock, self.connection:
+            self.remember_stat(filename)
+
+    def snapshot(self, resource_type: str) -> dict:
+        """Returns the serializable form of a table, straight from the stored documents."""
+        return {pk: json.loads(doc) for pk, doc in self.cache_by_resource_type(resource_type).data.rows()}
+
+    def where_used(self, keys) -> dict[str, set[tuple[str, str]]]:
+        """Returns the (step key, relation) pairs of the steps referring to each of the keys.
+
+        Served by the step_relations table and the location and company columns.
+        """
+        result = {key: set() for key in keys}
+        relations = {index: relation for relation, index in self.where_used_indexes.items()}
+        targets = list(result)
+        for start in range(0, len(targets), PAGE_SIZE):
+            page = targets[start:start + PAGE_SIZE]
+            placeholders = ', '.join('?' * len(page))
+            rows = self.query_all(
+                'SELECT target, step_pk, relation FROM step_relations '
+                f"WHERE target IN ({placeholders}) AND relation IN ({', '.join('?' * len(relations))})",
+                page + list(relations)
+            )
+            for column in ('location', 'company'):
+                rows += self.query_all(
+                    f"SELECT {column}, pk, '{column}' FROM steps WHERE {column} IN ({placeholders})", page
+                )
+            for target, pk, relation in rows:
+                result[target].add((pk, relations.get(relation, relation)))
+        return result
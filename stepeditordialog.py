@@ -12,13 +12,14 @@ class StepEditorDialog:
     """Builds and handles the step editor dialog.
     """
     dialog: ft.AlertDialog
-    original_step: dict
 
     def __init__(self, mfgdocsapp: 'MFGDocsApp', step: Step):
         self.mfgdocsapp = mfgdocsapp
-        self.step = step
-        self.original_step = copy.deepcopy(step.to_dict())
-        self.dialog = ft.AlertDialog(modal=False)
+        # edits go to a copy, the step shown to the other sessions only changes on save
+        self.step = Step()
+        self.step.from_dict(copy.deepcopy(step.to_dict()))
+        self.mfgdocsapp.storage.begin_edit(mfgdocsapp, 'steps', self.step.key)
+        self.dialog = ft.AlertDialog(modal=False, on_dismiss=self.dialog_dismiss)
         self.dialog.title = ft.Text(f'Step Editor {self.step.key}')
         self.dialog.content = self.build()
         self.dialog.actions = [ft.TextButton('Cancel', on_click=self.dialog_cancel),
@@ -72,19 +73,19 @@ class StepEditorDialog:
                              width=200,
                              value=self.step.unit_time_hours,
                              text_align=ft.TextAlign.RIGHT,
-                             on_change=lambda e: setattr(self.step, 'unit_time_hours', e.control.value)),
+                             on_change=lambda e: self.hours_changed(e, self.step.set_unit_time_hours)),
                 ft.TextField(label='Prepare hours',
                              dense=True,
                              width=200,
                              value=self.step.prepare_hours,
                              text_align=ft.TextAlign.RIGHT,
-                             on_change=lambda e: setattr(self.step, 'prepare_hours', e.control.value)),
+                             on_change=lambda e: self.hours_changed(e, self.step.set_prepare_hours)),
                 ft.TextField(label='Cooldown hours',
                              dense=True,
                              value=self.step.cooldown_hours,
                              width=200,
                              text_align=ft.TextAlign.RIGHT,
-                             on_change=lambda e: setattr(self.step, 'cooldown_hours', e.control.value)),
+                             on_change=lambda e: self.hours_changed(e, self.step.set_cooldown_hours)),
             ]),
         ]
         return ft.Container(expand=True,
@@ -93,19 +94,34 @@ class StepEditorDialog:
                                               width=800,
                                               controls=control_list))
 
+    @staticmethod
+    def hours_changed(e, setter):
+        """Stores the typed hours, or marks the field while the text is not a number."""
+        try:
+            setter(e.control.value)
+            e.control.error_text = None
+        except ValueError:
+            e.control.error_text = 'Not a number, the previous value is kept'
+        e.control.update()
+
     def dialog_cancel(self, e):
-        """Closes the dialog and reverts any changes."""
+        """Closes the dialog, dropping the changes."""
         del e
         self.dialog.open = False
-        self.step.from_dict(self.original_step)
-        self.parent_search_update()
-        self.parent_markdown_update()
+        self.mfgdocsapp.storage.end_edit(self.mfgdocsapp, 'steps', self.step.key)
         self.mfgdocsapp.page.update()
 
+    def dialog_dismiss(self, e):
+        """Drops the changes when the dialog is closed by clicking outside of it."""
+        del e
+        self.mfgdocsapp.storage.end_edit(self.mfgdocsapp, 'steps', self.step.key)
+
     def dialog_save(self, e):
         """Saves the step into the storage and closes the dialog."""
         del e
         self.dialog.open = False
+        self.mfgdocsapp.storage.apply_edit('steps', self.step.key, self.step.to_dict())
+        self.mfgdocsapp.storage.end_edit(self.mfgdocsapp, 'steps', self.step.key)
         self.mfgdocsapp.storage.save_resources()
         self.parent_search_update()
         self.parent_markdown_update()
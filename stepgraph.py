@@ -0,0 +1,114 @@
+"""
+Dependency graph of the steps, kept next to the steps cache.
+
+"""
+from model import Step
+from symboltable import SymbolTable
+
+
+class StepGraph:
+    """Forward and reverse adjacency of the steps.
+
+    An edge points from a step to a step it depends on. The edge types are the start_after and
+    start_after_start relations, and the inputparts naming their producing step in a composite PART(STEP) key.
+    Edges may point to keys missing from the cache, the callers decide what to do with those.
+    The adjacency is kept by the ids of a SymbolTable, the methods taking and returning keys
+    translate at the boundary, the *_ids variants work on the ids directly.
+    """
+    edge_types = ('start_after', 'start_after_start', 'inputparts')
+
+    def __init__(self, symbols: SymbolTable = None):
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.forward = {}
+        self.reverse = {}
+
+    @staticmethod
+    def step_edges(step: Step) -> dict[str, list[str]]:
+        """Returns the keys a step depends on, by edge type."""
+        return {
+            'start_after': list(step.start_after.keys()),
+            'start_after_start': list(step.start_after_start.keys()),
+            'inputparts': step.inputpart_step_keys(),
+        }
+
+    @classmethod
+    def from_steps(cls, steps: dict, symbols: SymbolTable = None) -> 'StepGraph':
+        graph = cls(symbols)
+        for key, step in steps.items():
+            graph.set_step(key, step)
+        return graph
+
+    def set_step(self, key: str, step: Step):
+        """Replaces the edges of a step after it was added or edited."""
+        self.remove_step(key)
+        for edge_type, targets in self.step_edges(step).items():
+            for target in targets:
+                self.add_edge(key, edge_type, target)
+
+    def add_edge(self, key: str, edge_type: str, target: str):
+        source = self.symbols.intern(key)
+        target = self.symbols.intern(target)
+        self.forward.setdefault(source, {}).setdefault(edge_type, {})[target] = None
+        self.reverse.setdefault(target, {}).setdefault(edge_type, {})[source] = None
+
+    def remove_step(self, key: str):
+        """Removes the edges starting from a step, the edges of other steps pointing to it stay."""
+        source = self.symbols.lookup(key)
+        for edge_type, targets in self.forward.pop(source, {}).items():
+            for target in targets:
+                sources = self.reverse.get(target, {}).get(edge_type)
+                if sources is None:
+                    continue
+                sources.pop(source, None)
+                if len(sources) == 0:
+                    del self.reverse[target][edge_type]
+                    if len(self.reverse[target]) == 0:
+                        del self.reverse[target]
+
+    def neighbors(self, key: str, edge_types=None, reverse: bool = False) -> list[str]:
+        """Returns the steps a step depends on, or the steps depending on it if reverse is set.
+
+        :param edge_types: The edge types to follow, all of them if None.
+        """
+        symbol = self.symbols.lookup(key)
+        if symbol is None:
+            return []
+        return [self.symbols.key(n) for n in self.neighbor_ids(symbol, edge_types, reverse)]
+
+    def neighbor_ids(self, symbol: int, edge_types=None, reverse: bool = False) -> list[int]:
+        adjacency = (self.reverse if reverse else self.forward).get(symbol)
+        if adjacency is None:
+            return []
+        result = {}
+        for edge_type in edge_types or self.edge_types:
+            for n in adjacency.get(edge_type, ()):
+                result[n] = None
+        return list(result)
+
+    def ancestors(self, key: str, edge_types=None) -> list[str]:
+        """Returns every step a step depends on, directly or indirectly, nearest first."""
+        return self.walk(key, edge_types, False)
+
+    def descendants(self, key: str, edge_types=None) -> list[str]:
+        """Returns every step depending on a step, directly or indirectly, nearest first."""
+        return self.walk(key, edge_types, True)
+
+    def walk(self, key: str, edge_types, reverse: bool) -> list[str]:
+        symbol = self.symbols.lookup(key)
+        if symbol is None:
+            return []
+        return [self.symbols.key(n) for n in self.walk_ids(symbol, edge_types, reverse)]
+
+    def walk_ids(self, symbol: int, edge_types, reverse: bool) -> list[int]:
+        seen = {symbol: None}
+        queue = [symbol]
+        while len(queue) > 0:
+            following = []
+            for s in queue:
+                for n in self.neighbor_ids(s, edge_types, reverse):
+                    if n not in seen:
+                        seen[n] = None
+                        following.append(n)
+            queue = following
+        del seen[symbol]
+        return list(seen)
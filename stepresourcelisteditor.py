@@ -2,8 +2,6 @@
 
 Use the dialog property to access the dialog control.
 """
-import copy
-
 import flet as ft
 from model import Step
 from ingredidentlisteditor import IngredientListEditor
@@ -13,17 +11,19 @@ class StepResourceListEditor():
     """Builds and handles the list of resources in a Step.
     """
     dialog: ft.AlertDialog
-    original_step: dict
 
-    def __init__(self, mfgdocsapp: 'MFGDocsApp', step: Step, itemlist: dict, resource_type: str, title: str, is_inputpart: bool = False):
+    def __init__(self, mfgdocsapp: 'MFGDocsApp', step: Step, relation: str, resource_type: str, title: str,
+                 is_inputpart: bool = False):
         self.is_inputpart = is_inputpart
-        self.itemlist = itemlist
+        self.relation = relation
+        # edits go to a copy, the step shown to the other sessions only changes on save
+        self.itemlist = dict(getattr(step, relation))
         self.title = title
         self.resource_type = resource_type
         self.mfgdocsapp = mfgdocsapp
         self.step = step
-        self.original_step = copy.deepcopy(step.to_dict())
-        self.dialog = ft.AlertDialog(modal=False)
+        self.mfgdocsapp.storage.begin_edit(mfgdocsapp, 'steps', self.step.key)
+        self.dialog = ft.AlertDialog(modal=False, on_dismiss=self.dialog_dismiss)
         self.dialog.title = ft.Text(title)
         self.dialog.content = self.build()
         self.dialog.actions = [ft.TextButton('Cancel', on_click=self.dialog_cancel),
@@ -54,14 +54,19 @@ class StepResourceListEditor():
         """Closes the dialog without saving changes."""
         del e
         self.dialog.open = False
-        self.step.from_dict(self.original_step)
-        self.parent_search_update()
-        self.parent_markdown_update()
+        self.mfgdocsapp.storage.end_edit(self.mfgdocsapp, 'steps', self.step.key)
         self.mfgdocsapp.page.update()
 
+    def dialog_dismiss(self, e):
+        """Drops the changes when the dialog is closed by clicking outside of it."""
+        del e
+        self.mfgdocsapp.storage.end_edit(self.mfgdocsapp, 'steps', self.step.key)
+
     def dialog_save(self, e):
         """Closes the dialog and saves changes."""
         del e
+        self.mfgdocsapp.storage.apply_edit('steps', self.step.key, {self.relation: self.itemlist})
+        self.mfgdocsapp.storage.end_edit(self.mfgdocsapp, 'steps', self.step.key)
         self.mfgdocsapp.storage.save_resources()
         self.dialog.open = False
         self.parent_search_update()
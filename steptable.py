@@ -0,0 +1,211 @@
+"""
+Columnar mirror of the numeric data of the steps, for totals and rollups.
+
+"""
+import math
+from array import array
+
+from model import Step, to_number
+from symboltable import SymbolTable
+
+try:
+    import numpy
+except ImportError:  # in requirements.txt, without it the columns are summed by the standard library
+    numpy = None
+
+
+class StepTable:
+    """The hours and relation amounts of every step in typed, contiguous columns.
+
+    Every step has a row in the hour columns. The amounts of the relations are kept as entries
+    of (row, relation, target id, amount), the targets are ids of the SymbolTable of the storage.
+    Edits replace the row and the entries of a single step: a removed row is filled with the last
+    one, and dropped entries are only marked until enough of them pile up for a compaction.
+    Numeric text counts as the number it spells. Other values are kept in the steps as they are,
+    here they are NaN hours, which the totals skip, or left out amounts, and listed in invalid.
+    If numpy is installed, the analytics run on numpy copies of the columns.
+    """
+    hour_columns = ('unit_time_hours', 'prepare_hours', 'cooldown_hours')
+    amount_relations = ('inputparts', 'outputparts', 'tools', 'machines', 'roles', 'actions', 'consumables')
+
+    def __init__(self, symbols: SymbolTable = None):
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.pks = []
+        self.rows = {}
+        self.columns = {name: array('d') for name in self.hour_columns}
+        self.entry_rows = array('q')
+        self.entry_relations = array('b')
+        self.entry_targets = array('q')
+        self.entry_amounts = array('d')
+        self.entries = {}
+        self.dropped = 0
+        self.invalid = {}
+
+    @staticmethod
+    def number(value) -> float:
+        try:
+            return float(to_number(value))
+        except ValueError:
+            return math.nan
+
+    @classmethod
+    def from_steps(cls, steps: dict, symbols: SymbolTable = None) -> 'StepTable':
+        table = cls(symbols)
+        for pk, step in steps.items():
+            table.set_step(pk, step)
+        return table
+
+    def set_step(self, pk: str, step: Step):
+        """Replaces the row and the amounts of a step after it was added or edited."""
+        self.set_row(pk, [getattr(step, name) for name in self.hour_columns],
+                     [(relation, target, amount) for relation in self.amount_relations
+                      for target, amount in getattr(step, relation).items()])
+
+    def set_row(self, pk: str, hours: list, amounts: list[tuple[str, str, float]]):
+        """Replaces the row of a step.
+
+        :param hours: The values of the hour columns, in their order.
+        :param amounts: The (relation, target key, amount) triples of the step.
+        """
+        invalid = []
+        values = []
+        for name, value in zip(self.hour_columns, hours):
+            values.append(self.number(value))
+            if math.isnan(values[-1]):
+                invalid.append(name)
+        row = self.rows.get(pk)
+        if row is None:
+            row = len(self.pks)
+            self.rows[pk] = row
+            self.pks.append(pk)
+            for name, value in zip(self.hour_columns, values):
+                self.columns[name].append(value)
+        else:
+            for name, value in zip(self.hour_columns, values):
+                self.columns[name][row] = value
+        self.drop_entries(pk)
+        indices = []
+        for relation, target, amount in amounts:
+            amount = self.number(amount)
+            if math.isnan(amount):
+                invalid.append(f'{relation}.{target}')
+                continue
+            indices.append(len(self.entry_rows))
+            self.entry_rows.append(row)
+            self.entry_relations.append(self.amount_relations.index(relation))
+            self.entry_targets.append(self.symbols.intern(target))
+            self.entry_amounts.append(amount)
+        if len(indices) > 0:
+            self.entries[pk] = indices
+        if len(invalid) > 0:
+            self.invalid[pk] = invalid
+        else:
+            self.invalid.pop(pk, None)
+
+    def remove_step(self, pk: str):
+        row = self.rows.pop(pk, None)
+        if row is None:
+            return
+        self.invalid.pop(pk, None)
+        self.drop_entries(pk)
+        last = len(self.pks) - 1
+        moved = self.pks.pop()
+        if row != last:
+            self.pks[row] = moved
+            self.rows[moved] = row
+            for i in self.entries.get(moved, ()):
+                self.entry_rows[i] = row
+        for column in self.columns.values():
+            column[row] = column[last]
+            column.pop()
+
+    def drop_entries(self, pk: str):
+        for i in self.entries.pop(pk, ()):
+            self.entry_rows[i] = -1
+            self.dropped += 1
+        if self.dropped > 1024 and self.dropped * 2 > len(self.entry_rows):
+            self.compact()
+
+    def compact(self):
+        """Rewrites the entries without the dropped ones."""
+        live = [i for i, row in enumerate(self.entry_rows) if row >= 0]
+        self.entry_rows = array('q', (self.entry_rows[i] for i in live))
+        self.entry_relations = array('b', (self.entry_relations[i] for i in live))
+        self.entry_targets = array('q', (self.entry_targets[i] for i in live))
+        self.entry_amounts = array('d', (self.entry_amounts[i] for i in live))
+        self.entries = {}
+        for i, row in enumerate(self.entry_rows):
+            self.entries.setdefault(self.pks[row], []).append(i)
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self.pks)
+
+    @staticmethod
+    def to_numpy(values: array):
+        # copied in a single call, an exported view would keep the array from growing on the next edit
+        return numpy.array(values, dtype=values.typecode)
+
+    def column(self, name: str):
+        """Returns an hour column by row, as a numpy array if numpy is installed."""
+        if numpy is not None:
+            return self.to_numpy(self.columns[name])
+        return self.columns[name]
+
+    def total(self, name: str) -> float:
+        """Returns the sum of an hour column, without the values that are not numbers."""
+        if numpy is not None:
+            return float(numpy.nansum(self.column(name)))
+        return math.fsum(v for v in self.columns[name] if not math.isnan(v))
+
+    def lead_hours(self, quantity: float = 1, pks=None) -> dict[str, float]:
+        """Returns the hours every step takes for a quantity, the prepare and cooldown hours included.
+
+        The hours of a step are NaN if any of its hours is not a number, see invalid.
+
+        :param pks: Only the hours of these steps are computed, the ones missing from the table are left out.
+        """
+        if pks is not None:
+            prepare, unit, cooldown = (self.columns[name] for name in ('prepare_hours', 'unit_time_hours',
+                                                                       'cooldown_hours'))
+            return {pk: prepare[self.rows[pk]] + unit[self.rows[pk]] * quantity + cooldown[self.rows[pk]]
+                    for pk in pks if pk in self.rows}
+        prepare, unit, cooldown = (self.column(name) for name in ('prepare_hours', 'unit_time_hours',
+                                                                  'cooldown_hours'))
+        if numpy is not None:
+            hours = (prepare + unit * quantity + cooldown).tolist()
+        else:
+            hours = [p + u * quantity + c for p, u, c in zip(prepare, unit, cooldown)]
+        return dict(zip(self.pks, hours))
+
+    def amount_totals(self, relation: str, quantities: dict[str, float] = None) -> dict[str, float]:
+        """Returns the summed amounts of a relation by target key, e.g. the parts consumed by every step.
+
+        :param quantities: Multiplies the amounts of the steps listed, for what-if scaling of the plan.
+        """
+        code = self.amount_relations.index(relation)
+        factors = None
+        if quantities is not None:
+            factors = array('d', [1.0]) * len(self.pks)
+            for pk, quantity in quantities.items():
+                if pk in self.rows:
+                    factors[self.rows[pk]] = float(quantity)
+        if numpy is not None:
+            rows = self.to_numpy(self.entry_rows)
+            mask = (rows >= 0) & (self.to_numpy(self.entry_relations) == code)
+            amounts = self.to_numpy(self.entry_amounts)[mask]
+            if factors is not None:
+                amounts = amounts * self.to_numpy(factors)[rows[mask]]
+            targets = self.to_numpy(self.entry_targets)[mask]
+            sums = numpy.bincount(targets, weights=amounts)
+            return {self.symbols.key(int(t)): float(sums[t]) for t in numpy.unique(targets)}
+        totals = {}
+        for row, r, target, amount in zip(self.entry_rows, self.entry_relations, self.entry_targets,
+                                          self.entry_amounts):
+            if row < 0 or r != code:
+                continue
+            if factors is not None:
+                amount *= factors[row]
+            key = self.symbols.key(target)
+            totals[key] = totals.get(key, 0) + amount
+        return totals
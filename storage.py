@@ -1,32 +1,213 @@
 """
 Handles overall in-memory data.
 
+A single Storage instance is shared by every client session of the process,
+sessions attach to it with Storage.attach() instead of loading their own copy.
+
+Two datafile layouts are supported, selected by Config.layout:
+ - monolithic: one JSON file per resource type, eg. data/steps.json
+ - perentity: one JSON file per entity, eg. data/steps/STEP-0001.json
+
+With the monolithic layout the loaded caches are also pickled into Config.snapshot_file,
+a derived binary snapshot used instead of parsing the datafiles that did not change since.
 """
+import atexit
+import hashlib
 import os
+import pickle
+import threading
+import time
+import urllib.parse
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from cache import Cache
+from compositekey import CompositeKey
 from config import Config
 import json
+from filewatcher import FileWatcher
+from journal import Journal
+from jsonstream import iter_object_items
+from searchresults import SearchResults
+from stepgraph import StepGraph
+from steptable import StepTable
+from symboltable import SymbolTable
+from textindex import TextIndex
+from trigramindex import TrigramIndex
+from textstore import TextStore
+from writebehind import WriteBehind
 from model import Step, Part, Role, Tool, Action, Location, Machine, Consumable, Company
 
 
+SNAPSHOT_FORMAT = 6
+
+
 class Storage:
     """Stores data in memory and handles loading and saving.
 
     """
+    shared = None
+    shared_lock = threading.Lock()
 
-    def __init__(self, mfgdocsapp):
-        self.cache_actions = Cache('actions')
-        self.cache_roles = Cache('roles')
-        self.cache_tools = Cache('tools')
-        self.cache_steps = Cache('steps')
-        self.cache_parts = Cache('parts')
-        self.cache_locations = Cache('locations')
-        self.cache_companies = Cache('companies')
-        self.cache_machines = Cache('machines')
-        self.cache_consumables = Cache('consumables')
-        self.mfgdocsapp = mfgdocsapp
+    # resource type, datafile and entity class, in loading order
+    resource_types = [
+        ('roles', '/data/roles.json', Role),
+        ('tools', '/data/tools.json', Tool),
+        ('actions', '/data/actions.json', Action),
+        ('parts', '/data/parts.json', Part),
+        ('locations', '/data/locations.json', Location),
+        ('machines', '/data/machines.json', Machine),
+        ('consumables', '/data/consumables.json', Consumable),
+        ('companies', '/data/companies.json', Company),
+        ('steps', '/data/steps.json', Step),
+    ]
+
+    # indexes maintained by the caches besides the key, see Cache
+    cache_indexes = {
+        'steps': ('category', 'location', 'company', 'start_after', 'start_after_start',
+                  'inputpart_keys', 'inputpart_step_keys', 'outputparts',
+                  'tools', 'actions', 'machines', 'roles', 'consumables'),
+        'parts': ('category', 'unit'),
+    }
+    default_cache_indexes = ('category',)
+    # the step relations reported by where_used(), with the steps index answering each of them
+    where_used_indexes = {
+        'inputparts': 'inputpart_keys',
+        'outputparts': 'outputparts',
+        'tools': 'tools',
+        'actions': 'actions',
+        'machines': 'machines',
+        'roles': 'roles',
+        'consumables': 'consumables',
+        'location': 'location',
+        'company': 'company',
+        'start_after': 'start_after',
+        'start_after_start': 'start_after_start',
+    }
+
+    def __init__(self, layout: str = None):
+        self.cache_actions = self.new_cache('actions')
+        self.cache_roles = self.new_cache('roles')
+        self.cache_tools = self.new_cache('tools')
+        self.cache_steps = self.new_cache('steps')
+        self.cache_parts = self.new_cache('parts')
+        self.cache_locations = self.new_cache('locations')
+        self.cache_companies = self.new_cache('companies')
+        self.cache_machines = self.new_cache('machines')
+        self.cache_consumables = self.new_cache('consumables')
+        self.symbols = SymbolTable()
+        self.step_graph = StepGraph(self.symbols)
+        self.step_table = StepTable(self.symbols)
+        self.text_index = None
+        self.trigram_indexes = {}
+        self.lock = threading.RLock()
+        self.version = 0
+        self.sessions = weakref.WeakSet()
+        self.editing = weakref.WeakKeyDictionary()
+        self.postponed = set()
+        self.load_stats = {}
+        self.snapshot_stats = {'hits': 0, 'misses': 0}
+        self.fingerprints = {}
+        self.file_stats = {}
+        self.writing = set()
+        self.saving = {}
+        self.saves = {}
+        self.watcher = None
+        self.textstore = None
+        self.writer = WriteBehind(self.log)
+        self.search_executor = ThreadPoolExecutor(max_workers=len(self.resource_types), thread_name_prefix='search')
+        self.layout = layout if layout is not None else Config.layout
+        self.journal = None
+        self.compaction_timer = None
+        if Config.journal and self.layout == 'perentity':
+            self.log('storage: the journal is not used with the perentity layout, saves are per entity already')
+        elif Config.journal:
+            self.journal = Journal(Config.workdir + '/data/journal.jsonl'.replace('/', os.sep))
+        atexit.register(self.flush)
         self.load_resources()
 
+    @staticmethod
+    def attach(mfgdocsapp) -> 'Storage':
+        """Returns the process-wide storage and registers the session using it.
+
+        The data is loaded only when the first session attaches, later sessions get the same instance.
+        """
+        with Storage.shared_lock:
+            if Storage.shared is None:
+                Storage.shared = Storage.create()
+                if Config.watch_interval > 0:
+                    Storage.shared.start_watcher(Config.watch_interval)
+            Storage.shared.sessions.add(mfgdocsapp)
+            return Storage.shared
+
+    @staticmethod
+    def create() -> 'Storage':
+        """Returns a new storage using the backend selected by Config.backend."""
+        if Config.backend == 'sqlite':
+            from sqlitestorage import SqliteStorage  # pylint: disable=import-outside-toplevel
+            return SqliteStorage()
+        return Storage()
+
+    def detach(self, mfgdocsapp):
+        """Unregisters a session, the data stays loaded for the others."""
+        self.sessions.discard(mfgdocsapp)
+        with self.lock:
+            self.editing.pop(mfgdocsapp, None)
+
+    def begin_edit(self, mfgdocsapp, resource_type: str, pk: str):
+        """Registers an editor opened by a session, the resource type is not reloaded until it is closed."""
+        with self.lock:
+            self.editing.setdefault(mfgdocsapp, set()).add((resource_type, pk))
+
+    def end_edit(self, mfgdocsapp, resource_type: str, pk: str):
+        with self.lock:
+            self.editing.get(mfgdocsapp, set()).discard((resource_type, pk))
+
+    def apply_edit(self, resource_type: str, pk: str, d: dict) -> bool:
+        """Copies the fields edited on a copy into the shared entity and marks it dirty.
+
+        The editors work on copies, so the entity the other sessions see changes only here, under the lock.
+
+        :param d: The edited fields in the form of to_dict(), the fields missing are kept.
+        :return: False if the entity is gone.
+        """
+        with self.lock:
+            item = self.cache_by_resource_type(resource_type).data.get(pk)
+            if item is None:
+                self.log(f'storage.apply_edit {resource_type} {pk} is gone, the edit is dropped')
+                return False
+            item.from_dict(item.to_dict() | d)
+            self.mark_dirty(resource_type, pk)
+            return True
+
+    def busy_resource_types(self) -> set[str]:
+        """Returns the resource types which must not be reloaded.
+
+        Those have unsaved changes, open editors, or saves still queued or being written, which would
+        write the reloaded data over the saved one.
+        """
+        with self.lock:
+            busy = {resource_type for resource_type, _, _ in self.resource_types
+                    if self.cache_by_resource_type(resource_type).is_dirty()}
+            for edits in self.editing.values():
+                busy.update(resource_type for resource_type, _ in edits)
+            busy.update(resource_type for resource_type, count in self.saving.items() if count > 0)
+        return busy
+
+    def saved_since(self, saves: dict) -> set[str]:
+        """Returns the resource types saved since the saves counters were copied, e.g. while reading a datafile."""
+        with self.lock:
+            return {resource_type for resource_type, count in self.saves.items() if saves.get(resource_type) != count}
+
+    def new_cache(self, resource_type: str) -> Cache:
+        """Returns an empty cache with the indexes declared for the resource type."""
+        return Cache(resource_type, self.cache_indexes.get(resource_type, self.default_cache_indexes))
+
+    @staticmethod
+    def log(message):
+        """Write a message to the console, the sessions log through it too."""
+        print(f'[{datetime.now().isoformat()}] {message}')
+
     def cache_by_resource_type(self, resource_type):
         cache_map = {
             'actions': self.cache_actions,
@@ -58,57 +239,764 @@ class Storage:
             'consumables': self.cache_consumables,
         }
         if res_type == 'parts':
-            key, stepkey = Part.extract_stepkey(key)
+            key = CompositeKey.parse(key).part
         if res_type in cache_map:
             return cache_map[res_type].get_by_unique_key('key', key)
 
         print(f'storage.get_resource_by_type_and_key({res_type}, {key}) unknown type {res_type}')
         return None
 
-    def load_resources(self):
-        self.load_json(self.cache_roles, '/data/roles.json', Role)
-        self.load_json(self.cache_tools, '/data/tools.json', Tool)
-        self.load_json(self.cache_actions, '/data/actions.json', Action)
-        self.load_json(self.cache_parts, '/data/parts.json', Part)
-        self.load_json(self.cache_locations, '/data/locations.json', Location)
-        self.load_json(self.cache_machines, '/data/machines.json', Machine)
-        self.load_json(self.cache_consumables, '/data/consumables.json', Consumable)
-        self.load_json(self.cache_companies, '/data/companies.json', Company)
-        self.load_json(self.cache_steps, '/data/steps.json', Step)
-
-    def save_resources(self):
-        self.save_json(self.cache_roles.data, '/data/roles.json')
-        self.save_json(self.cache_tools.data, '/data/tools.json')
-        self.save_json(self.cache_actions.data, '/data/actions.json')
-        self.save_json(self.cache_parts.data, '/data/parts.json')
-        self.save_json(self.cache_locations.data, '/data/locations.json')
-        self.save_json(self.cache_machines.data, '/data/machines.json')
-        self.save_json(self.cache_consumables.data, '/data/consumables.json')
-        self.save_json(self.cache_companies.data, '/data/companies.json')
-        self.save_json(self.cache_steps.data, '/data/steps.json')
+    def load_resources(self, progress=None) -> set[str]:
+        """Loads every datafile into new caches and swaps them in at once.
+
+        The datafiles are parsed and hydrated concurrently, the caches are indexed afterwards.
+        Sessions reading the caches meanwhile keep seeing the previous, complete data.
+        Nothing is swapped while any resource type has unsaved changes or open editors.
+
+        :param progress: Optional callable receiving the loaded fraction of the datafiles, between 0 and 1.
+        :return: The resource types that kept the data from being reloaded, empty if it was reloaded.
+        """
+        busy = self.busy_resource_types()
+        if len(busy) > 0:
+            self.log(f'storage.load_resources refused, unsaved changes or open editors in {sorted(busy)}')
+            return busy
+        file_stats = dict(self.file_stats)
+        saves = dict(self.saves)
+        CompositeKey.reset()
+        self.textstore = self.new_textstore()
+        use_snapshot = self.layout == 'monolithic' and Config.snapshot_file != ''
+        snapshot = self.read_snapshot() if use_snapshot else {}
+        report = self.progress_reporter(progress)
+        with ThreadPoolExecutor(max_workers=len(self.resource_types)) as executor:
+            futures = {resource_type: executor.submit(self.read_resource, filename, classname, snapshot.get(filename),
+                                                      report)
+                       for resource_type, filename, classname in self.resource_types}
+        caches = {}
+        fingerprints = {}
+        misses = 0
+        for resource_type, filename, _ in self.resource_types:
+            fingerprint, cached, items = futures[resource_type].result()
+            fingerprints[filename] = fingerprint
+            if cached is not None:
+                caches[resource_type] = cached
+                for item in cached.data.values():
+                    self.offload_texts(item)
+                continue
+            misses += 1
+            caches[resource_type] = self.new_cache(resource_type)
+            self.add_items(caches[resource_type], items)
+        self.fingerprints = fingerprints
+        if use_snapshot:
+            self.snapshot_stats['hits'] += len(self.resource_types) - misses
+            self.snapshot_stats['misses'] += misses
+            self.log(f'storage snapshot {len(self.resource_types) - misses} hits, {misses} misses')
+            if misses > 0:
+                self.write_snapshot(caches, fingerprints)
+        if self.journal is not None:
+            self.replay_journal(caches)
+        if progress is not None:
+            progress(1.0)
+        step_graph = self.build_step_graph(caches['steps'])
+        step_table = self.build_step_table(caches['steps'])
+        with self.lock:
+            busy = self.busy_resource_types() | self.saved_since(saves)
+            if len(busy) > 0:
+                # an editor opened or a save ran while loading, the watcher is to see the files as not loaded yet
+                self.file_stats = file_stats
+                self.log(f'storage.load_resources refused, unsaved changes or open editors in {sorted(busy)}')
+                return busy
+            for resource_type, cache in caches.items():
+                setattr(self, f'cache_{resource_type}', cache)
+            self.step_graph = step_graph
+            self.step_table = step_table
+            self.text_index = None
+            self.trigram_indexes = {}
+            self.version += 1
+        if self.journal is not None:
+            self.schedule_compaction()
+        return set()
+
+    def build_step_graph(self, cache: Cache) -> StepGraph:
+        """Returns the dependency graph of the steps in a cache."""
+        return StepGraph.from_steps(cache.data, self.symbols)
+
+    def build_step_table(self, cache: Cache) -> StepTable:
+        """Returns the columnar mirror of the hours and amounts of the steps in a cache."""
+        return StepTable.from_steps(cache.data, self.symbols)
+
+    def datafile_stat(self, filename: str):
+        """Returns a cheap signature of a datafile, or of its directory in the perentity layout.
+
+        The signature of a directory is the count, the total size and the sum of the modification times
+        of its files, so writing one entity can update it without a scan, see entity_dir_stat().
+        """
+        try:
+            if self.layout == 'perentity':
+                count, size, mtimes = 0, 0, 0
+                with os.scandir(self.entity_dir(filename)) as entries:
+                    for entry in entries:
+                        stat = entry.stat()
+                        count, size, mtimes = count + 1, size + stat.st_size, mtimes + stat.st_mtime_ns
+                return count, size, mtimes
+            stat = os.stat(Config.workdir + filename.replace('/', os.sep))
+            return stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def file_stat(f_name: str):
+        """Returns the size and modification time of a file, None if it is missing."""
+        try:
+            stat = os.stat(f_name)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    @staticmethod
+    def entity_dir_stat(dir_stat, before, after):
+        """Returns the signature of an entity directory after one of its files changed from before to after.
+
+        :param before: The file_stat() of the file before the change, None if it did not exist.
+        :param after: The file_stat() of the file after the change, None if it is gone.
+        """
+        count, size, mtimes = dir_stat if dir_stat is not None else (0, 0, 0)
+        for stat, sign in ((before, -1), (after, 1)):
+            if stat is not None:
+                count, size, mtimes = count + sign, size + sign * stat[0], mtimes + sign * stat[1]
+        return count, size, mtimes
+
+    def changed_resource_types(self) -> list[str]:
+        """Returns the resource types whose datafiles changed on disk since they were loaded or written.
+
+        The datafiles are checked without holding the lock. A datafile written by the storage meanwhile
+        is checked again on the next call.
+        """
+        with self.lock:
+            file_stats = dict(self.file_stats)
+        stats = {filename: self.datafile_stat(filename) for _, filename, _ in self.resource_types}
+        changed = []
+        with self.lock:
+            for resource_type, filename, _ in self.resource_types:
+                if (filename not in self.writing and self.file_stats.get(filename) == file_stats.get(filename)
+                        and stats[filename] != file_stats.get(filename)):
+                    changed.append(resource_type)
+        return changed
+
+    def reload_resource(self, resource_type: str) -> bool:
+        """Reloads a single cache from its datafile and swaps it in.
+
+        A cache with unsaved changes or open editors is not reloaded, to keep the edits of the sessions.
+
+        :return: True if the cache was reloaded.
+        """
+        if resource_type in self.busy_resource_types():
+            self.log(f'storage.reload_resource skipped {resource_type}, it has unsaved changes or open editors')
+            return False
+        for rt, filename, classname in self.resource_types:
+            if rt == resource_type:
+                file_stat = self.file_stats.get(filename)
+                saves = dict(self.saves)
+                if resource_type == 'steps':
+                    CompositeKey.reset()
+                self.textstore = self.new_textstore()
+                read = self.read_entity_dir if self.layout == 'perentity' else self.read_json
+                caches = {resource_type: self.new_cache(resource_type)}
+                self.add_items(caches[resource_type], read(filename, classname))
+                if self.journal is not None:
+                    self.replay_journal(caches)
+                step_graph = self.build_step_graph(caches[resource_type]) if resource_type == 'steps' else None
+                step_table = self.build_step_table(caches[resource_type]) if resource_type == 'steps' else None
+                with self.lock:
+                    if resource_type in self.busy_resource_types() | self.saved_since(saves):
+                        self.file_stats[filename] = file_stat
+                        self.log(f'storage.reload_resource skipped {resource_type}, it was edited or saved meanwhile')
+                        return False
+                    setattr(self, f'cache_{resource_type}', caches[resource_type])
+                    if step_graph is not None:
+                        self.step_graph = step_graph
+                        self.step_table = step_table
+                    self.refresh_search_indexes(resource_type)
+                    self.version += 1
+                self.log(f'storage.reload_resource reloaded {resource_type}, version {self.version}')
+                return True
+        return False
+
+    def notify_sessions(self, resource_types: list[str], event: str = 'data_changed'):
+        """Tells every attached session which resource types were reloaded.
+
+        :param event: The method of the sessions to call, reload_postponed for the changes not reloaded yet.
+        """
+        for mfgdocsapp in list(self.sessions):
+            try:
+                getattr(mfgdocsapp, event)(resource_types)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self.log(f'storage.notify_sessions error: {e}')
+
+    def postpone_reload(self, resource_types: list[str]):
+        """Remembers the changed resource types that could not be reloaded, and tells the sessions once."""
+        with self.lock:
+            new = [resource_type for resource_type in resource_types if resource_type not in self.postponed]
+            self.postponed = set(resource_types)
+        if len(new) > 0:
+            self.notify_sessions(new, 'reload_postponed')
+
+    def start_watcher(self, interval: float):
+        """Starts polling the datafiles for changes made outside the application, eg. by git pull."""
+        self.watcher = FileWatcher(self, interval)
+
+    def mark_dirty(self, resource_type: str, pk: str):
+        """Flags an entity as changed, so the next save_resources() writes its datafile.
+
+        The indexes of the cache are updated too, since entities are edited in place.
+        """
+        self.cache_by_resource_type(resource_type).mark_dirty(pk)
+        self.reindex(resource_type, pk)
+
+    def reindex(self, resource_type: str, pk: str):
+        """Updates the indexes of an entity after it was edited in place, e.g. by the Step.add_* methods."""
+        with self.lock:
+            cache = self.cache_by_resource_type(resource_type)
+            cache.update(pk)
+            if resource_type == 'steps':
+                if pk in cache.data:
+                    self.step_graph.set_step(pk, cache.data[pk])
+                    self.step_table.set_step(pk, cache.data[pk])
+                else:
+                    self.step_graph.remove_step(pk)
+                    self.step_table.remove_step(pk)
+            if self.text_index is not None:
+                if pk in cache.data:
+                    self.text_index.add(resource_type, pk, cache.data[pk])
+                else:
+                    self.text_index.remove(resource_type, pk)
+            if resource_type in self.trigram_indexes:
+                if pk in cache.data:
+                    self.trigram_indexes[resource_type].add(pk, cache.data[pk])
+                else:
+                    self.trigram_indexes[resource_type].remove(pk)
+
+    def search(self, query: str, resource_types=None) -> list[tuple[str, str, float]]:
+        """Returns the (resource type, pk, score) triples of the entities matching a query, best first.
+
+        The full-text index is built on the first search after loading, see TextIndex for the query syntax.
+        """
+        with self.lock:
+            if self.text_index is None:
+                text_index = TextIndex()
+                for resource_type, _, _ in self.resource_types:
+                    for pk, entity in self.cache_by_resource_type(resource_type).data.items():
+                        text_index.add(resource_type, pk, entity)
+                self.text_index = text_index
+            return self.text_index.search(query, resource_types)
+
+    def search_contains(self, text: str, resource_types=None) -> list[tuple[str, str]]:
+        """Returns the (resource type, pk) pairs of the entities whose contains() is true for the text.
+
+        The results are the same as calling contains() on every entity, in cache order,
+        but only the candidates found by the trigram index of each cache are checked.
+        """
+        result = []
+        for resource_type in resource_types or [rt for rt, _, _ in self.resource_types]:
+            result.extend((resource_type, pk) for pk in self.search_contains_type(resource_type, text))
+        return result
+
+    def search_contains_type(self, resource_type: str, text: str, candidates: list[str] = None,
+                             cancelled: threading.Event = None) -> list[str]:
+        """Returns the pks of one cache for search_contains().
+
+        The trigram index of a cache is built on its first search after loading.
+        The candidates are checked without holding the lock, so several caches can be searched at once.
+
+        :param candidates: The pks to check instead of the candidates of the trigram index,
+            like the matches of a shorter query.
+        :param cancelled: Stops checking when set, the caller throws the partial result away.
+        """
+        with self.lock:
+            cache = self.cache_by_resource_type(resource_type)
+            if candidates is None:
+                trigram_index = self.trigram_indexes.get(resource_type)
+                if trigram_index is None:
+                    trigram_index = TrigramIndex()
+                    for pk, entity in cache.data.items():
+                        trigram_index.add(pk, entity)
+                    self.trigram_indexes[resource_type] = trigram_index
+                candidates = trigram_index.candidates(text)
+        result = []
+        for i, pk in enumerate(candidates):
+            if cancelled is not None and i % 256 == 0 and cancelled.is_set():
+                break
+            entity = cache.data.get(pk)
+            if entity is not None and entity.contains(text):
+                result.append(pk)
+        return result
+
+    def search_all(self, query: str, resource_types=None, fuzzy: bool = False,
+                   previous: SearchResults = None, cancelled: threading.Event = None) -> SearchResults:
+        """Searches the caches concurrently, the results are read a page at a time, see SearchResults.
+
+        Queries using the syntax of the word index (* or OR) are ranked by search(),
+        others match like contains() does. With fuzzy set, the keys nearest to a mistyped one are found instead.
+
+        :param previous: The results of the last search. If they are complete, were found on the same data
+            and the query extends their query, only their matches are checked again.
+        :param cancelled: Stops the search when set. Created by the caller to be able to cancel it before the
+            results are returned, a new one is used if None.
+        """
+        resource_types = list(resource_types or [rt for rt, _, _ in self.resource_types])
+        cancelled = cancelled if cancelled is not None else threading.Event()
+        if fuzzy:
+            mode = 'fuzzy'
+            futures = {resource_type: self.search_executor.submit(
+                lambda rt: [pk for _, pk, _ in self.find_fuzzy(query, [rt])], resource_type)
+                for resource_type in resource_types}
+        elif '*' in query or ' OR ' in query:
+            mode = 'ranked'
+            matches = {resource_type: [] for resource_type in resource_types}
+            for resource_type, pk, _ in self.search(query, resource_types):
+                matches[resource_type].append(pk)
+            futures = {resource_type: SearchResults.done(pks) for resource_type, pks in matches.items()}
+        else:
+            mode = 'contains'
+            reuse = (previous is not None and previous.mode == 'contains' and previous.version == self.version
+                     and previous.query != '' and previous.query.lower() in query.lower() and previous.complete())
+            futures = {resource_type: self.search_executor.submit(
+                self.search_contains_type, resource_type, query,
+                previous.pks(resource_type) if reuse and resource_type in previous.futures else None, cancelled)
+                for resource_type in resource_types}
+        return SearchResults(query, resource_types, futures, mode, self.version, cancelled)
+
+    def find_fuzzy(self, text: str, resource_types=None, limit: int = 10) -> list[tuple[str, str, int]]:
+        """Returns the (resource type, pk, edit distance) triples of the keys nearest to a mistyped one."""
+        found = []
+        with self.lock:
+            for resource_type in resource_types or [rt for rt, _, _ in self.resource_types]:
+                for pk, distance in self.cache_by_resource_type(resource_type).find_fuzzy(text, limit=limit):
+                    found.append((resource_type, pk, distance))
+        found.sort(key=lambda f: f[2])
+        return found[:limit]
+
+    def refresh_search_indexes(self, resource_type: str):
+        """Indexes a reloaded cache again, if the search indexes were built already."""
+        with self.lock:
+            self.trigram_indexes.pop(resource_type, None)
+            if self.text_index is None:
+                return
+            self.text_index.remove_type(resource_type)
+            for pk, entity in self.cache_by_resource_type(resource_type).data.items():
+                self.text_index.add(resource_type, pk, entity)
+
+    def where_used(self, keys) -> dict[str, set[tuple[str, str]]]:
+        """Returns the (step key, relation) pairs of the steps referring to each of the keys.
+
+        :param keys: The keys of any resource type, parts are found by their key in composite inputs too.
+        """
+        result = {key: set() for key in keys}
+        with self.lock:
+            cache = self.cache_steps
+            for relation, index in self.where_used_indexes.items():
+                for key, used in result.items():
+                    for pk in cache.find_pks(index, key):
+                        used.add((pk, relation))
+        return result
+
+    def save_resources(self, force=False) -> dict[str, int]:
+        """Queues writing the datafiles of the caches having changed entities.
+
+        The files are written by the background writer, use flush() to wait for them.
+        In journal mode the changed entities are appended to the journal instead, see save_journal().
+
+        :param force: Write every datafile, even if nothing changed.
+        :return: The queued filenames and the number of changed entities in each.
+        """
+        if self.journal is not None:
+            saved = self.save_journal()
+            if force:
+                self.compact_journal({resource_type for resource_type, _, _ in self.resource_types})
+            return saved
+        saved = {}
+        for resource_type, filename, _ in self.resource_types:
+            with self.lock:
+                cache = self.cache_by_resource_type(resource_type)
+                if not force and not cache.is_dirty():
+                    continue
+                dirty = cache.dirty
+                cache.clear_dirty()
+                pks = list(cache.data.keys()) if force else dirty
+            if self.layout == 'perentity':
+                saved[filename[:-len('.json')] + '/'] = len(dirty)
+                self.save_entities(resource_type, filename, pks)
+            else:
+                saved[filename] = len(dirty)
+                self.save_json(resource_type, filename)
+        if len(saved) > 0:
+            with self.lock:
+                self.version += 1
+        self.log(f'storage.save_resources queued {saved if len(saved) > 0 else "nothing"}')
+        return saved
+
+    def save_journal(self) -> dict[str, int]:
+        """Appends every changed entity to the journal, and starts a compaction when it is due.
+
+        :return: The journal filename and the number of appended entities.
+        """
+        records = []
+        for resource_type, _, _ in self.resource_types:
+            with self.lock:
+                cache = self.cache_by_resource_type(resource_type)
+                dirty = cache.dirty
+                cache.clear_dirty()
+                for pk in dirty:
+                    if pk in cache.data:
+                        records.append({'type': resource_type, 'pk': pk, 'data': self.entity_dict(cache.data[pk])})
+        self.journal.append(records)
+        if len(records) > 0:
+            with self.lock:
+                self.version += 1
+        self.log(f'storage.save_journal appended {len(records)} records')
+        self.schedule_compaction()
+        return {self.journal.filename: len(records)} if len(records) > 0 else {}
+
+    def schedule_compaction(self):
+        """Compacts when the journal reached the record threshold, otherwise arms the compaction timer."""
+        if self.journal.records >= Config.journal_compact_records:
+            self.compact_journal()
+            return
+        with self.lock:
+            if len(self.journal.resource_types) > 0 and self.compaction_timer is None:
+                self.compaction_timer = threading.Timer(Config.journal_compact_seconds, self.compact_journal)
+                self.compaction_timer.daemon = True
+                self.compaction_timer.start()
+
+    def replay_journal(self, caches: dict[str, Cache]):
+        """Applies the journal records over the freshly loaded caches."""
+        classes = {resource_type: classname for resource_type, _, classname in self.resource_types}
+        replayed = 0
+        for record in self.journal.replay():
+            if record['type'] not in caches:
+                continue
+            cache = caches[record['type']]
+            pk = record['pk']
+            if pk in cache.data:
+                cache.remove(pk, cache.data[pk].extrakeys())
+            item = classes[record['type']]()
+            item.from_dict(record['data'])
+            self.offload_texts(item)
+            cache.add(pk, item, item.extrakeys())
+            replayed += 1
+        self.log(f'storage.replay_journal replayed {replayed} records')
+
+    def compact_journal(self, extra_resource_types: set[str] = None):
+        """Folds the journal back into the datafiles on the background writer.
+
+        :param extra_resource_types: Types to rewrite even if the journal has no records for them.
+        """
+        with self.lock:
+            if self.compaction_timer is not None:
+                self.compaction_timer.cancel()
+                self.compaction_timer = None
+            resource_types = self.journal.rotate() | (extra_resource_types or set())
+        if len(resource_types) > 0:
+            self.writer.submit(self.journal.compacting_filename, lambda: self.run_compaction(resource_types))
+
+    def run_compaction(self, resource_types: set[str]):
+        """Rewrites the datafiles of the given types, then drops the rotated journal.
+
+        If a write fails, the rotated journal stays and is replayed on the next start.
+        """
+        for resource_type, filename, _ in self.resource_types:
+            if resource_type in resource_types:
+                self.write_datafile(resource_type, filename)
+        self.journal.finish_compaction()
+        self.log(f'storage.run_compaction compacted {sorted(resource_types)}')
+
+    def flush(self, timeout: float = None) -> bool:
+        """Waits until every queued save is written to disk, returns False on timeout."""
+        return self.writer.flush(timeout)
+
+    def read_resource(self, filename, classname, snapshot_entry: dict = None, progress=None):
+        """Reads a resource type from the snapshot if its datafile did not change, otherwise from the datafile.
+
+        :return: The fingerprint of the datafile, the cache from the snapshot or None, and the parsed items.
+        """
+        if self.layout == 'perentity':
+            return None, None, self.read_entity_dir(filename, classname)
+        fingerprint = self.file_fingerprint(filename)
+        if (snapshot_entry is not None and fingerprint is not None and snapshot_entry['fingerprint'] == fingerprint
+                and snapshot_entry['cache'].indexes == self.new_cache(snapshot_entry['cache'].name).indexes):
+            self.file_stats[filename] = fingerprint[:2]
+            return fingerprint, snapshot_entry['cache'], []
+        return fingerprint, None, self.read_json(filename, classname, progress)
+
+    def progress_reporter(self, progress):
+        """Returns a thread safe callable adding up the bytes read from the datafiles.
+
+        It calls progress with the loaded fraction whenever that grew by at least a percent.
+        """
+        if progress is None or self.layout == 'perentity':
+            return None
+        total = 0
+        for _, filename, _ in self.resource_types:
+            stat = self.datafile_stat(filename)
+            total += stat[0] if stat is not None else 0
+        state = {'read': 0, 'reported': 0.0}
+        lock = threading.Lock()
+
+        def report(size: int):
+            with lock:
+                state['read'] += size
+                fraction = min(1.0, state['read'] / total) if total > 0 else 1.0
+                if fraction - state['reported'] < 0.01:
+                    return
+                state['reported'] = fraction
+            progress(fraction)
+
+        return report
+
+    @staticmethod
+    def file_fingerprint(filename: str):
+        """Returns the size, modification time and hash of a datafile, None if it is missing.
+
+        The file is hashed in chunks of a MiB, it is never read whole into memory.
+        """
+        f_name = Config.workdir + filename.replace('/', os.sep)
+        try:
+            with open(f_name, mode='rb') as datafile:
+                stat = os.fstat(datafile.fileno())
+                digest = hashlib.sha1()
+                for chunk in iter(lambda: datafile.read(1 << 20), b''):
+                    digest.update(chunk)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+    def read_snapshot(self) -> dict:
+        """Returns the snapshot entries by datafile, or an empty dict if it is missing or unusable."""
+        try:
+            with open(Config.snapshot_file, mode='rb') as snapshot_file:
+                snapshot = pickle.load(snapshot_file)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.log(f'storage.read_snapshot ignored unusable snapshot: {e}')
+            return {}
+        if not isinstance(snapshot, dict) or snapshot.get('format') != SNAPSHOT_FORMAT:
+            return {}
+        return snapshot['files']
+
+    def write_snapshot(self, caches: dict[str, Cache], fingerprints: dict):
+        """Pickles the freshly loaded caches right away and queues writing them to the snapshot file."""
+        files = {}
+        for resource_type, filename, _ in self.resource_types:
+            if fingerprints[filename] is not None:
+                files[filename] = {'fingerprint': fingerprints[filename], 'cache': caches[resource_type]}
+        content = pickle.dumps({'format': SNAPSHOT_FORMAT, 'files': files}, protocol=pickle.HIGHEST_PROTOCOL)
+        os.makedirs(os.path.dirname(Config.snapshot_file) or '.', exist_ok=True)
+        self.writer.submit(Config.snapshot_file, lambda: self.writer.write_bytes(Config.snapshot_file, content))
 
     def load_json(self, cache, filename, classname, no_clear_before_load=False):
         if not no_clear_before_load:
             cache.clear()
+        self.add_items(cache, self.read_json(filename, classname))
+
+    def read_json(self, filename, classname, progress=None) -> list:
+        """Parses a datafile into (key, entity) pairs without touching any cache.
+
+        :param progress: Optional callable receiving the number of bytes read after every chunk.
+        """
+        return list(self.iter_json(filename, classname, progress))
+
+    def iter_json(self, filename, classname, progress=None):
+        """Yields the (key, entity) pairs of a datafile as they are parsed.
+
+        The file is streamed, only one entity is decoded into dicts at a time before it is hydrated.
+        """
+        start = time.perf_counter()
+        self.file_stats[filename] = self.datafile_stat(filename)
         f_name = Config.workdir + filename.replace('/', os.sep)
+        count = 0
+        size = 0
         try:
-            with open(f_name, mode='rt', encoding='utf-8') as json_file:
-                json_data = json.load(json_file)
-                for key in json_data.keys():
+            with open(f_name, mode='rb') as json_file:
+                size = os.fstat(json_file.fileno()).st_size
+                for key, d in iter_object_items(json_file, progress=progress):
                     item = classname()
-                    item.from_dict(json_data[key])
-                    extrakeys = item.extrakeys()
-                    cache.add(key, item, extrakeys)
+                    item.from_dict(d)
+                    count += 1
+                    yield key, item
         except OSError as e:
-            self.mfgdocsapp.log(f'storage.load_json error: {e}')
+            self.log(f'storage.load_json error: {e}')
+        self.record_load_stats(filename, size, count, start)
+
+    def add_items(self, cache, items: list):
+        """Adds (key, entity) pairs to a cache, indexing their extra keys."""
+        for key, item in items:
+            self.offload_texts(item)
+            cache.add(key, item, item.extrakeys())
 
-    def save_json(self, data: dict, filename: str):
+    @staticmethod
+    def new_textstore():
+        """Returns an empty text store for a load when lazy texts are enabled, otherwise None.
+
+        Every load offloads into a new store. The previous one is closed, and its temporary file freed,
+        once the last entity referring to it is gone, sessions may still show those for a while.
+        """
+        return TextStore() if Config.lazy_text else None
+
+    def offload_texts(self, item):
+        """Moves the long texts of an entity into the text store, when lazy texts are enabled."""
+        if self.textstore is not None:
+            item.offload_texts(self.textstore, Config.lazy_text_min_length)
+
+    def record_load_stats(self, filename: str, size: int, entities: int, start: float):
+        """Stores and logs the size, entity count and duration of loading a datafile."""
+        stats = {'bytes': size, 'entities': entities, 'ms': round((time.perf_counter() - start) * 1000, 1)}
+        self.load_stats[filename] = stats
+        self.log(f'storage loaded {filename}: {stats["bytes"]} bytes, {stats["entities"]} entities, {stats["ms"]} ms')
+
+    def save_json(self, resource_type: str, filename: str):
         f_name = Config.workdir + filename.replace('/', os.sep)
-        fulldict = {}
-        for k, v in data.items():
-            fulldict[k] = v.to_dict()
+        self.queue_write(resource_type, f_name, lambda: self.write_datafile(resource_type, filename))
+
+    def queue_write(self, resource_type: str, key: str, action):
+        """Queues a write of a resource type on the background writer.
+
+        The resource type counts as busy until the write ran, so no reload swaps in the data it replaces.
+        """
+        def run():
+            try:
+                action()
+            finally:
+                with self.lock:
+                    self.saving[resource_type] -= 1
+
+        with self.lock:
+            self.saving[resource_type] = self.saving.get(resource_type, 0) + 1
+            self.saves[resource_type] = self.saves.get(resource_type, 0) + 1
+            if self.writer.submit(key, run):
+                # the queued write it replaced is never run
+                self.saving[resource_type] -= 1
+
+    def write_datafile(self, resource_type: str, filename: str):
+        """Writes a monolithic datafile and remembers its state, so the watcher does not reload our own write.
+
+        Only the snapshot of the cache is taken under the lock, the sessions can go on while it is
+        serialized and synced to disk. The watcher skips the file until its new state is recorded.
+        """
+        f_name = Config.workdir + filename.replace('/', os.sep)
+        with self.lock:
+            data = self.snapshot(resource_type)
+            self.writing.add(filename)
         try:
-            with open(f_name, mode='wt', encoding='utf-8') as json_file:
-                json.dump(fulldict, json_file, indent=4, sort_keys=True)
+            self.writer.write_json(f_name, lambda: data)
+        finally:
+            with self.lock:
+                self.writing.discard(filename)
+                self.file_stats[filename] = self.datafile_stat(filename)
+
+    def entity_dir(self, filename: str) -> str:
+        """Returns the directory of the perentity layout belonging to a monolithic datafile."""
+        return Config.workdir + filename.replace('/', os.sep)[:-len('.json')]
+
+    def entity_filename(self, filename: str, pk: str) -> str:
+        return os.path.join(self.entity_dir(filename), urllib.parse.quote(pk, safe='') + '.json')
+
+    def load_entity_dir(self, cache, filename, classname):
+        """Loads the perentity layout of a resource type."""
+        cache.clear()
+        self.add_items(cache, self.read_entity_dir(filename, classname))
+
+    def read_entity_dir(self, filename, classname) -> list:
+        """Parses the perentity layout of a resource type into (key, entity) pairs.
+
+        The files are read on a thread pool.
+        """
+        start = time.perf_counter()
+        self.file_stats[filename] = self.datafile_stat(filename)
+        dirname = self.entity_dir(filename)
+        items = []
+        size = 0
+        try:
+            names = sorted(name for name in os.listdir(dirname) if name.endswith('.json'))
         except OSError as e:
-            self.mfgdocsapp.log(f'storage.save_json error: {e}')
+            self.log(f'storage.load_entity_dir error: {e}')
+            names = []
+
+        def read_entity(name):
+            with open(os.path.join(dirname, name), mode='rt', encoding='utf-8') as json_file:
+                return (urllib.parse.unquote(name[:-len('.json')]), json.load(json_file),
+                        os.fstat(json_file.fileno()).st_size)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(read_entity, name) for name in names]
+            for future in futures:
+                try:
+                    pk, d, entity_size = future.result()
+                except (OSError, json.JSONDecodeError) as e:
+                    self.log(f'storage.load_entity_dir error: {e}')
+                    continue
+                item = classname()
+                item.from_dict(d)
+                items.append((pk, item))
+                size += entity_size
+        self.record_load_stats(filename, size, len(items), start)
+        return items
+
+    def save_entities(self, resource_type: str, filename: str, pks):
+        """Queues writing one file per entity, or removing it if the entity is gone."""
+        cache = self.cache_by_resource_type(resource_type)
+        os.makedirs(self.entity_dir(filename), exist_ok=True)
+        for pk in pks:
+            f_name = self.entity_filename(filename, pk)
+            self.queue_write(resource_type, f_name,
+                             lambda c=cache, k=pk, f=f_name: self.write_entity(c, k, filename, f))
+
+    def write_entity(self, cache, pk: str, filename: str, f_name: str):
+        """Writes or removes the file of one entity and updates the signature of its directory.
+
+        As in write_datafile(), only the entity is copied under the lock, and the watcher skips the
+        directory until the signature is updated.
+        """
+        with self.lock:
+            data = self.entity_dict(cache.data[pk]) if pk in cache.data else None
+            self.writing.add(filename)
+        before = self.file_stat(f_name)
+        try:
+            if data is not None:
+                self.writer.write_json(f_name, lambda: data)
+            elif before is not None:
+                os.remove(f_name)
+        finally:
+            after = self.file_stat(f_name)
+            with self.lock:
+                self.writing.discard(filename)
+                self.file_stats[filename] = self.entity_dir_stat(self.file_stats.get(filename), before, after)
+
+    def convert_layout(self, target: str):
+        """Writes all data in the target layout, the files of the current layout are left in place.
+
+        :param target: 'monolithic' or 'perentity'
+        """
+        for resource_type, filename, _ in self.resource_types:
+            if target == 'perentity':
+                pks = list(self.cache_by_resource_type(resource_type).data.keys())
+                self.save_entities(resource_type, filename, pks)
+            else:
+                self.save_json(resource_type, filename)
+        self.flush()
+        self.log(f'storage.convert_layout converted {self.layout} to {target}')
+
+    def snapshot(self, resource_type: str) -> dict:
+        """Returns the serializable form of every entity in a cache.
+
+        The relations and lists are copied, so the result can be serialized after the lock is released.
+        """
+        fulldict = {}
+        for k, v in self.cache_by_resource_type(resource_type).data.items():
+            fulldict[k] = self.entity_dict(v)
+        return fulldict
+
+    @staticmethod
+    def entity_dict(item) -> dict:
+        """Returns item.to_dict() with copies of the relations and lists instead of the ones of the entity."""
+        return {name: value.copy() if isinstance(value, (dict, list)) else value
+                for name, value in item.to_dict().items()}
@@ -0,0 +1,46 @@
+"""
+Dense integer ids of the entity keys.
+
+"""
+import threading
+
+
+class SymbolTable:
+    """Maps every key to a small integer id and back.
+
+    Ids are handed out in order from 0 and never change or get reused, so structures built
+    from the ids stay valid as the table grows. Graph walks hash and compare the ids instead
+    of the long keys, and turn them back into keys only for the result.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.keys = []
+        self.lock = threading.Lock()
+
+    def intern(self, key: str) -> int:
+        """Returns the id of a key, giving it the next free one if it has none yet."""
+        symbol = self.ids.get(key)
+        if symbol is not None:
+            return symbol
+        with self.lock:
+            symbol = self.ids.get(key)
+            if symbol is None:
+                # the key is listed before its id is published, for the readers not taking the lock
+                self.keys.append(key)
+                symbol = len(self.keys) - 1
+                self.ids[key] = symbol
+            return symbol
+
+    def lookup(self, key: str) -> int:
+        """Returns the id of a key, or None if it has none."""
+        return self.ids.get(key)
+
+    def key(self, symbol: int) -> str:
+        return self.keys[symbol]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.ids
+
+    def __len__(self) -> int:
+        return len(self.keys)
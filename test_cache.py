@@ -0,0 +1,104 @@
+from cache import Cache
+from testdata import make_step
+
+
+class TestCacheIndexes:
+
+    #  Should find entities by a declared attribute index, and by the extra keys given to add().
+    def test_find_by_attribute_and_extrakey(self):
+        cache = Cache('steps', ('category',))
+        step = make_step('S1', category='welding')
+        cache.add('S1', step, step.extrakeys())
+        assert cache.find('category', 'welding') == [step]
+        assert cache.get_by_unique_key('key', 'S1') is step
+        assert cache.find('category', 'painting') == []
+
+    #  Should index every member of a list valued attribute, so relations can be queried in reverse.
+    def test_multi_valued_index(self):
+        cache = Cache('steps', ('start_after',))
+        cache.add('S2', make_step('S2', start_after={'S1': 0}))
+        cache.add('S3', make_step('S3', start_after={'S1': 0, 'S2': 0}))
+        assert cache.find_pks('start_after', 'S1') == ['S2', 'S3']
+        assert cache.find_pks('start_after', 'S2') == ['S3']
+        assert [s.key for s in cache.find_any('start_after', ['S1', 'S2'])] == ['S2', 'S3']
+
+    #  Should move an entity between index values when it is changed in place and updated.
+    def test_update_reindexes(self):
+        cache = Cache('steps', ('category',))
+        step = make_step('S1', category='welding')
+        cache.add('S1', step, step.extrakeys())
+        step.category = 'painting'
+        cache.update('S1')
+        assert cache.find('category', 'welding') == []
+        assert cache.find('category', 'painting') == [step]
+
+    #  Should drop the index entries of a removed entity.
+    def test_remove_unindexes(self):
+        cache = Cache('steps', ('category',))
+        step = make_step('S1', category='welding')
+        cache.add('S1', step, step.extrakeys())
+        cache.remove('S1')
+        assert cache.find('category', 'welding') == []
+        assert cache.get_by_unique_key('key', 'S1') is None
+        assert 'category' not in cache.indexed
+
+    #  Should return the entities in index order between inclusive bounds, open where a bound is None.
+    def test_find_range(self):
+        cache = Cache('steps')
+        for key in ['S3', 'S1', 'S4', 'S2']:
+            step = make_step(key)
+            cache.add(key, step, step.extrakeys())
+        assert [s.key for s in cache.find_range('key')] == ['S1', 'S2', 'S3', 'S4']
+        assert [s.key for s in cache.find_range('key', 'S2', 'S3')] == ['S2', 'S3']
+        assert [s.key for s in cache.find_range('key', low='S3')] == ['S3', 'S4']
+        cache.remove('S3')
+        assert [s.key for s in cache.find_range('key', high='S3')] == ['S1', 'S2']
+
+    #  Should find the consumers of a part by its key, even when the input names the producing step too.
+    def test_index_by_method(self):
+        cache = Cache('steps', ('inputpart_keys',))
+        step = make_step('S2')
+        step.add_inputpart('P1(S1)', 2)
+        step.add_inputpart('P2', 1)
+        cache.add('S2', step)
+        assert cache.find_pks('inputpart_keys', 'P1') == ['S2']
+        assert cache.find_pks('inputpart_keys', 'P2') == ['S2']
+        step.remove_inputpart('P1(S1)')
+        cache.update('S2')
+        assert cache.find_pks('inputpart_keys', 'P1') == []
+
+    #  Should index the tools, actions and machines added by the Step methods under their own relation.
+    def test_step_add_methods_use_their_relation(self):
+        cache = Cache('steps', ('tools', 'actions', 'machines', 'inputpart_keys'))
+        step = make_step('S1')
+        step.add_tool('T1', 1)
+        step.add_action('A1', 1)
+        step.add_machine('M1', 1)
+        cache.add('S1', step)
+        assert cache.find_pks('tools', 'T1') == ['S1']
+        assert cache.find_pks('actions', 'A1') == ['S1']
+        assert cache.find_pks('machines', 'M1') == ['S1']
+        assert step.inputparts == {}
+
+    #  Should find the consumers of a step's outputs by the producing step of the composite inputs.
+    def test_inputpart_step_keys(self):
+        cache = Cache('steps', ('inputpart_step_keys',))
+        step = make_step('S3')
+        step.add_inputpart('P1(S1)', 1)
+        step.add_inputpart(' P2 ( S1 ) ', 1)
+        step.add_inputpart('P3(S2)', 1)
+        step.add_inputpart('P4', 1)
+        cache.add('S3', step)
+        assert step.inputpart_step_keys() == ['S1', 'S2']
+        assert cache.find_pks('inputpart_step_keys', 'S1') == ['S3']
+        assert cache.find_pks('inputpart_step_keys', 'P4') == []
+
+    #  Should index an unset relation of a step as empty.
+    def test_index_unset_relation(self):
+        cache = Cache('steps', ('tools',))
+        step = make_step('S1')
+        cache.add('S1', step)
+        assert cache.find_pks('tools', 'T1') == []
+        step.add_tool('T1', 1)
+        cache.update('S1')
+        assert cache.find_pks('tools', 'T1') == ['S1']
@@ -0,0 +1,42 @@
+from compositekey import CompositeKey
+from model import Step
+
+
+class TestCompositeKey:
+
+    #  Should return the same instance for the same text.
+    def test_interned(self):
+        assert CompositeKey.parse('DS-001-0012(STEP-0042)') is CompositeKey.parse('DS-001-0012(STEP-0042)')
+
+    #  Should unpack to the part key and the step key.
+    def test_unpack(self):
+        part, step = CompositeKey.parse(' DS-001-0012 ( STEP-0042 ) ')
+        assert (part, step) == ('DS-001-0012', 'STEP-0042')
+        assert tuple(CompositeKey.parse('DS-001-0012')) == ('DS-001-0012', None)
+
+    #  Should name a step only if the parentheses are not empty.
+    def test_has_step(self):
+        assert CompositeKey.parse('P1(S1)').has_step()
+        assert not CompositeKey.parse('P1()').has_step()
+        assert not CompositeKey.parse('P1').has_step()
+
+    #  Should be equal and hash equal by the text.
+    def test_hashable(self):
+        keys = {CompositeKey('P1(S1)', 'P1', 'S1'), CompositeKey.parse('P1(S1)')}
+        assert len(keys) == 1
+
+    #  Should serve the input keys of a step from the parsed keys.
+    def test_step_inputparts(self):
+        step = Step()
+        step.from_dict({'key': 'S3', 'inputparts': {'P1(S2)': 1, 'P2': 2, 'P3()': 1, 'P4(S2)': 1}})
+        assert step.inputpart_keys() == ['P1', 'P2', 'P3', 'P4']
+        assert step.inputpart_step_keys() == ['S2']
+        assert step.to_dict()['inputparts'] == {'P1(S2)': 1, 'P2': 2, 'P3()': 1, 'P4(S2)': 1}
+
+    #  Should start a new table on reset, keeping the instances already handed out valid.
+    def test_reset(self):
+        composite = CompositeKey.parse('P9(S9)')
+        CompositeKey.reset()
+        assert 'P9(S9)' not in CompositeKey.interned
+        assert tuple(composite) == ('P9', 'S9')
+        assert CompositeKey.parse('P9(S9)') == composite
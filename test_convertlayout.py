@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+
+from config import Config
+import convertlayout
+from storage import Storage
+from testdata import STEPS
+
+
+class TestConvertLayout:
+
+    #  Should write one file per entity, loading back the same data in the perentity layout.
+    def test_round_trip(self, workdir, monkeypatch):
+        monkeypatch.setenv('MFGDOCS_WORKDIR', str(workdir))
+        monkeypatch.setenv('MFGDOCS_SNAPSHOT_FILE', '')
+        monkeypatch.setenv('MFGDOCS_WATCH_INTERVAL', '0')
+        assert convertlayout.main(['convertlayout.py', 'perentity']) == 0
+        assert sorted(os.listdir(workdir / 'data' / 'steps')) == ['S1.json', 'S2.json']
+        storage = Storage(layout='perentity')
+        assert storage.snapshot('steps') == Storage(layout='monolithic').snapshot('steps')
+        assert storage.snapshot('steps')['S2']['tools'] == STEPS['S2']['tools']
+
+    #  Should reject an unknown layout.
+    def test_usage(self):
+        assert convertlayout.main(['convertlayout.py', 'sharded']) == 1
+
+
+class TestPerEntityLayout:
+
+    #  Should write only the files of the changed entities, and remove the files of the removed ones.
+    def test_save_entities(self, workdir):
+        Config.layout = 'perentity'
+        Storage(layout='monolithic').convert_layout('perentity')
+        storage = Storage()
+        untouched = os.stat(workdir / 'data' / 'steps' / 'S1.json').st_mtime_ns
+        storage.cache_steps.get('S2').name = 'Braze frame'
+        storage.mark_dirty('steps', 'S2')
+        assert storage.save_resources() == {'/data/steps/': 1}
+        assert storage.flush(5)
+        text = (workdir / 'data' / 'steps' / 'S2.json').read_text(encoding='utf-8')
+        assert json.loads(text)['name'] == 'Braze frame'
+        assert os.stat(workdir / 'data' / 'steps' / 'S1.json').st_mtime_ns == untouched
+        storage.cache_steps.remove('S2')
+        storage.mark_dirty('steps', 'S2')
+        storage.save_resources()
+        assert storage.flush(5)
+        assert os.listdir(workdir / 'data' / 'steps') == ['S1.json']
+        assert storage.changed_resource_types() == []
+        assert storage.file_stats['/data/steps.json'] == storage.datafile_stat('/data/steps.json')
+
+    #  Should write an entity file without holding the lock, keeping the directory signature without a scan.
+    def test_write_entity_outside_lock(self, workdir):
+        Config.layout = 'perentity'
+        Storage(layout='monolithic').convert_layout('perentity')
+        storage = Storage()
+        write_bytes = storage.writer.write_bytes
+        datafile_stat = storage.datafile_stat
+        seen = []
+        scans = []
+
+        def probe():
+            seen.append(storage.lock.acquire(timeout=1))
+            if seen[-1]:
+                storage.lock.release()
+
+        def checked_write_bytes(filename, content):
+            write_bytes(filename, content)
+            thread = threading.Thread(target=probe)
+            thread.start()
+            thread.join()
+
+        storage.writer.write_bytes = checked_write_bytes
+        storage.datafile_stat = lambda filename: scans.append(filename) or datafile_stat(filename)
+        storage.apply_edit('steps', 'S1', {'name': 'Saw frame'})
+        storage.apply_edit('steps', 'S2', {'name': 'Braze frame'})
+        storage.save_resources()
+        assert storage.flush(5)
+        assert seen == [True, True]
+        assert scans == []
+        assert storage.file_stats['/data/steps.json'] == datafile_stat('/data/steps.json')
+        assert storage.changed_resource_types() == []
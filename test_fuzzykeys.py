@@ -0,0 +1,54 @@
+from cache import Cache
+from fuzzykeys import FuzzyKeyIndex
+from model import Part
+
+
+def make_index(keys):
+    index = FuzzyKeyIndex()
+    for key in keys:
+        index.add(key)
+    return index
+
+
+class TestFuzzyKeyIndex:
+
+    #  Should find a key with one wrong, missing, extra or swapped character, ignoring the case.
+    def test_single_typo(self):
+        index = make_index(['DS-001-0012', 'DS-001-0013', 'DS-TOL-1'])
+        assert index.lookup('DS-001-0012')[0] == ('DS-001-0012', 0)
+        assert index.lookup('ds-001-00l2', max_distance=1) == [('DS-001-0012', 1)]
+        assert index.lookup('DS-001-012', max_distance=1) == [('DS-001-0012', 1)]
+        assert index.lookup('DS-TOLL-1') == [('DS-TOL-1', 1)]
+        assert index.lookup('DS-OTL-1') == [('DS-TOL-1', 1)]
+
+    #  Should return the keys nearest first, within the distance bound only.
+    def test_nearest_first(self):
+        index = make_index(['DS-001-0012', 'DS-001-0013', 'DS-001-0113'])
+        assert index.lookup('DS-001-0012') == [('DS-001-0012', 0), ('DS-001-0013', 1), ('DS-001-0113', 2)]
+        assert index.lookup('DS-001-0012', max_distance=1) == [('DS-001-0012', 0), ('DS-001-0013', 1)]
+        assert index.lookup('DS-001-0012', limit=1) == [('DS-001-0012', 0)]
+        assert index.lookup('XX-999-9999') == []
+
+    #  Should agree with the plain distance on every key.
+    def test_same_as_distance_scan(self):
+        keys = [f'P-{i:03d}' for i in range(200)] + ['ABC', 'ACB', 'BAC']
+        index = make_index(keys)
+        for text in ['P-017', 'P-71', 'P-1000', 'p-0a5', 'ABC', 'CAB', '']:
+            expected = sorted(((k, FuzzyKeyIndex.distance(text.casefold(), k.casefold(), 2)) for k in keys
+                               if FuzzyKeyIndex.distance(text.casefold(), k.casefold(), 2) <= 2),
+                              key=lambda f: (f[1], f[0]))
+            assert index.lookup(text) == expected
+
+    #  Should forget removed keys, also from the cache the index was built for.
+    def test_cache_maintains_index(self):
+        cache = Cache('parts')
+        for key in ['DS-001-0012', 'DS-001-0099']:
+            part = Part()
+            part.key = key
+            cache.add(key, part, part.extrakeys())
+        assert cache.find_fuzzy('DS-001-0021', max_distance=1) == [('DS-001-0012', 1)]
+        cache.remove('DS-001-0012')
+        part = Part()
+        part.key = 'DS-001-0022'
+        cache.add(part.key, part, part.extrakeys())
+        assert cache.find_fuzzy('DS-001-0021', max_distance=1) == [('DS-001-0022', 1)]
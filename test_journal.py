@@ -0,0 +1,78 @@
+import json
+import threading
+
+from config import Config
+from journal import Journal
+from storage import Storage
+
+
+def record(pk: str, name: str) -> dict:
+    return {'type': 'steps', 'pk': pk, 'data': {'pk': pk, 'key': pk, 'name': name}}
+
+
+class TestJournal:
+
+    #  Should replay the appended records in order.
+    def test_append_replay(self, tmp_path):
+        journal = Journal(str(tmp_path / 'journal.jsonl'))
+        journal.append([record('S1', 'Cut')])
+        journal.append([record('S2', 'Weld'), record('S1', 'Saw')])
+        assert [r['data']['name'] for r in Journal(journal.filename).replay()] == ['Cut', 'Weld', 'Saw']
+
+    #  Should end the replay at a line torn by a crash during append.
+    def test_torn_line(self, tmp_path):
+        journal = Journal(str(tmp_path / 'journal.jsonl'))
+        journal.append([record('S1', 'Cut')])
+        with open(journal.filename, mode='at', encoding='utf-8') as journal_file:
+            journal_file.write('{"type": "steps", "pk"')
+        assert [r['pk'] for r in journal.replay()] == ['S1']
+        assert journal.records == 1
+
+    #  Should replay a rotated journal not compacted yet before the new one.
+    def test_rotate(self, tmp_path):
+        journal = Journal(str(tmp_path / 'journal.jsonl'))
+        journal.append([record('S1', 'Cut')])
+        assert journal.rotate() == {'steps'}
+        journal.append([record('S1', 'Saw')])
+        assert [r['data']['name'] for r in journal.replay()] == ['Cut', 'Saw']
+        journal.finish_compaction()
+        assert [r['data']['name'] for r in journal.replay()] == ['Saw']
+
+    #  Should keep every line whole when sessions append concurrently.
+    def test_concurrent_append(self, tmp_path):
+        journal = Journal(str(tmp_path / 'journal.jsonl'))
+        threads = [threading.Thread(target=lambda n=n: [journal.append([record(f'S{n}', str(i))]) for i in range(20)])
+                   for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert journal.records == 80
+        assert len(list(Journal(journal.filename).replay())) == 80
+
+
+class TestStorageJournal:
+
+    #  Should append the saved entities instead of writing the datafiles, and replay them on the next start.
+    def test_round_trip(self, workdir):
+        Config.journal = True
+        storage = Storage()
+        storage.cache_steps.get('S1').name = 'Saw frame'
+        storage.mark_dirty('steps', 'S1')
+        assert storage.save_resources() == {storage.journal.filename: 1}
+        assert json.loads((workdir / 'data' / 'steps.json').read_text(encoding='utf-8'))['S1']['name'] == 'Cut frame'
+        assert Storage().cache_steps.get('S1').name == 'Saw frame'
+
+    #  Should fold the journal into the datafiles and drop it.
+    def test_compaction(self, workdir):
+        Config.journal = True
+        storage = Storage()
+        storage.cache_steps.get('S2').name = 'Braze frame'
+        storage.mark_dirty('steps', 'S2')
+        storage.save_resources()
+        storage.compact_journal()
+        assert storage.flush(5)
+        assert json.loads((workdir / 'data' / 'steps.json').read_text(encoding='utf-8'))['S2']['name'] == 'Braze frame'
+        assert not (workdir / 'data' / 'journal.jsonl').exists()
+        assert not (workdir / 'data' / 'journal.jsonl.compacting').exists()
+        assert Storage().cache_steps.get('S2').name == 'Braze frame'
@@ -0,0 +1,49 @@
+import io
+import json
+
+import pytest
+
+from jsonstream import iter_object_items
+
+
+class TestIterObjectItems:
+
+    #  Should yield the same members as json.load, in file order, even when values span many chunks.
+    def test_same_as_json_load(self):
+        data = {f'STEP-{i:04d}': {'name': f'step {i}', 'amount': i * 1.5, 'final': i % 2 == 0,
+                                  'inputparts': {'DS-001-0012(STEP-0042)': 12345}, 'qcfailstep': None}
+                for i in range(50)}
+        raw = json.dumps(data, indent=4).encode('utf-8')
+        result = list(iter_object_items(io.BytesIO(raw), chunk_size=7))
+        assert result == list(data.items())
+
+    #  Should not cut a number that ends exactly at a chunk boundary.
+    def test_number_at_chunk_boundary(self):
+        raw = b'{"a": 1234567, "b": 2}'
+        assert list(iter_object_items(io.BytesIO(raw), chunk_size=9)) == [('a', 1234567), ('b', 2)]
+
+    #  Should yield nothing for an empty object.
+    def test_empty_object(self):
+        assert list(iter_object_items(io.BytesIO(b' { } '))) == []
+
+    #  Should decode multibyte characters split between chunks.
+    def test_multibyte_characters(self):
+        raw = json.dumps({'k': 'árvíztűrő tükörfúrógép'}, ensure_ascii=False).encode('utf-8')
+        assert list(iter_object_items(io.BytesIO(raw), chunk_size=3)) == [('k', 'árvíztűrő tükörfúrógép')]
+
+    #  Should report the number of bytes read.
+    def test_progress(self):
+        raw = b'{"a": [1, 2, 3], "b": {"c": "d"}}'
+        read = []
+        list(iter_object_items(io.BytesIO(raw), chunk_size=4, progress=read.append))
+        assert sum(read) == len(raw)
+
+    #  Should raise an error if the file does not contain an object.
+    def test_not_an_object(self):
+        with pytest.raises(ValueError):
+            list(iter_object_items(io.BytesIO(b'[1, 2]')))
+
+    #  Should raise an error on a truncated file.
+    def test_truncated(self):
+        with pytest.raises(ValueError):
+            list(iter_object_items(io.BytesIO(b'{"a": {"b": 1}')))
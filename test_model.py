@@ -0,0 +1,46 @@
+import pickle
+import weakref
+
+from model import Step, Part, Tool
+
+
+class TestCompactEntities:
+
+    #  Should keep the attributes in slots, without a per-instance dict.
+    def test_no_instance_dict(self):
+        for entity in (Step(), Part(), Tool()):
+            assert not hasattr(entity, '__dict__')
+            assert weakref.ref(entity)() is entity
+
+    #  Should share the empty relations until the first write, without leaking it into other steps.
+    def test_relation_written_on_demand(self):
+        first = Step()
+        second = Step()
+        assert first.tools is second.tools
+        first.add_tool('T1', 1)
+        first.add_tool('T1', 2)
+        assert first.tools == {'T1': 3}
+        assert len(second.tools) == 0
+        second.writable('roles')['R1'] = 1
+        assert second.roles == {'R1': 1}
+
+    #  Should give back the same dict it was hydrated from, with plain dicts for the empty relations.
+    def test_dict_round_trip(self):
+        d = {'pk': 'S1', 'key': 'S1', 'name': 'Step', 'inputparts': {'P1(S0)': 1}, 'start_after': {'S0': 0}}
+        step = Step()
+        step.from_dict(d)
+        result = step.to_dict()
+        assert result['inputparts'] == {'P1(S0)': 1}
+        assert result['start_after'] == {'S0': 0}
+        assert result['tools'] == {} and type(result['tools']) is dict
+        copy = Step()
+        copy.from_dict(result)
+        assert copy.to_dict() == result
+
+    #  Should survive pickling, as the snapshot does.
+    def test_pickle(self):
+        step = Step()
+        step.from_dict({'pk': 'S1', 'key': 'S1', 'description': 'text', 'tools': {'T1': 1}})
+        copy = pickle.loads(pickle.dumps(step))
+        assert copy.to_dict() == step.to_dict()
+        assert copy.roles is Step().roles
@@ -0,0 +1,50 @@
+import json
+from types import SimpleNamespace
+
+from rendermarkdown import RenderMarkdown
+from storage import Storage
+
+
+class TestRenderStep:
+
+    #  Should render the steps needing a step, directly or indirectly.
+    def test_needed_by(self, workdir):
+        parts = {pk: {'pk': pk, 'key': pk, 'name': pk} for pk in ('DS-001-0001', 'DS-001-0002')}
+        (workdir / 'data' / 'parts.json').write_text(json.dumps(parts), encoding='utf-8')
+        tools = {'DS-TOL-1': {'pk': 'DS-TOL-1', 'key': 'DS-TOL-1', 'name': 'Welder'}}
+        (workdir / 'data' / 'tools.json').write_text(json.dumps(tools), encoding='utf-8')
+        storage = Storage()
+        render = RenderMarkdown(SimpleNamespace(storage=storage))
+        s1 = storage.cache_steps.get('S1')
+        s2 = storage.cache_steps.get('S2')
+        assert '## Needed by' in render.render_step(s1)
+        assert 'S2 Weld frame' in render.render_step(s1)
+        assert '## Needed by' not in render.render_step(s2)
+
+
+    #  Should render the hours of a step summed with the steps it depends on, skipping the hours that are not numbers.
+    def test_lead_hours(self, workdir):
+        storage = Storage()
+        render = RenderMarkdown(SimpleNamespace(storage=storage))
+        assert render.render_lead_hours(storage.cache_steps.get('S1')) == '1'
+        assert render.render_lead_hours(storage.cache_steps.get('S2')) == '1.5'
+        storage.apply_edit('steps', 'S1', {'unit_time_hours': 'x'})
+        storage.reindex('steps', 'S1')
+        assert render.render_lead_hours(storage.cache_steps.get('S2')) == '0.5 (1 steps without valid hours)'
+
+    #  Should add the hours of the longest chain of steps waited for, not of the parallel ones.
+    def test_lead_hours_longest_chain(self, workdir):
+        steps = {
+            'A': {'unit_time_hours': 2},
+            'B': {'unit_time_hours': 1, 'start_after': {'A': 0}},
+            'C': {'unit_time_hours': 5},
+            'D': {'unit_time_hours': 1, 'start_after': {'B': 0, 'C': 0}},
+            'E': {'unit_time_hours': 1, 'start_after': {'D': 0}, 'start_after_start': {'F': 0}},
+            'F': {'unit_time_hours': 9},
+        }
+        (workdir / 'data' / 'steps.json').write_text(
+            json.dumps({pk: {'pk': pk, 'key': pk, 'name': pk} | d for pk, d in steps.items()}), encoding='utf-8')
+        storage = Storage()
+        render = RenderMarkdown(SimpleNamespace(storage=storage))
+        assert render.render_lead_hours(storage.cache_steps.get('D')) == '6'
+        assert render.render_lead_hours(storage.cache_steps.get('E')) == '7'
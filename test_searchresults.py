@@ -0,0 +1,67 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from searchresults import SearchResults
+from storage import Storage
+
+
+def make_results():
+    matches = {'steps': ['S1', 'S2', 'S3'], 'parts': [], 'tools': ['T1', 'T2']}
+    return SearchResults('q', ['steps', 'parts', 'tools'],
+                         {rt: SearchResults.done(pks) for rt, pks in matches.items()})
+
+
+class TestSearchResults:
+
+    #  Should count the matches of every resource type.
+    def test_totals(self):
+        results = make_results()
+        assert results.totals() == {'steps': 3, 'parts': 0, 'tools': 2}
+        assert results.total() == 5
+        assert results.page_count(2) == 3
+
+    #  Should cut the pages across the resource types in their order.
+    def test_pages(self):
+        results = make_results()
+        assert results.page(0, 2) == [('steps', 'S1'), ('steps', 'S2')]
+        assert results.page(1, 2) == [('steps', 'S3'), ('tools', 'T1')]
+        assert results.page(2, 2) == [('tools', 'T2')]
+        assert results.page(3, 2) == []
+
+    #  Should not wait for the types after a full first page.
+    def test_first_page_does_not_wait(self):
+        release = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            slow = executor.submit(lambda: release.wait(5) and ['T1'])
+            results = SearchResults('q', ['steps', 'tools'], {'steps': SearchResults.done(['S1', 'S2']),
+                                                             'tools': slow})
+            assert results.page(0, 2) == [('steps', 'S1'), ('steps', 'S2')]
+            assert not slow.done()
+            release.set()
+            assert results.totals() == {'steps': 2, 'tools': 1}
+
+    #  Should count as complete only while not cancelled and every type is searched.
+    def test_cancel(self):
+        release = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            running = executor.submit(lambda: release.wait(5) and ['T1'])
+            waiting = executor.submit(lambda: ['M1'])
+            results = SearchResults('q', ['tools', 'machines'], {'tools': running, 'machines': waiting})
+            assert not results.complete()
+            results.cancel()
+            assert results.cancelled.is_set()
+            assert waiting.cancelled()
+            release.set()
+        assert not results.complete()
+        assert make_results().complete()
+
+    #  Should stop a search through the event registered before it was started.
+    def test_cancel_before_results(self, workdir):
+        storage = Storage()
+        assert storage.search_all('frame', ['steps']).totals() == {'steps': 2}
+        cancelled = threading.Event()
+        cancelled.set()
+        results = storage.search_all('frame', ['steps'], cancelled=cancelled)
+        assert results.cancelled is cancelled
+        assert not results.complete()
+        assert results.page(0, 10) == []
@@ -0,0 +1,60 @@
+import gc
+import json
+
+from config import Config
+from storage import Storage
+from testdata import STEPS
+
+
+def make_storage():
+    Config.backend = 'sqlite'
+    return Storage.create()
+
+
+class TestSqliteStorage:
+
+    #  Should import the datafiles into the database and serve the cache lookups from it.
+    def test_import(self, workdir):
+        storage = make_storage()
+        assert storage.snapshot('steps') == {pk: Storage.entity_dict(storage.cache_steps.get(pk)) for pk in STEPS}
+        assert storage.cache_steps.find_pks('category', 'welding') == ['S2']
+        assert storage.cache_steps.find_pks('tools', 'DS-TOL-1') == ['S2']
+        assert storage.where_used(['DS-TOL-1'])['DS-TOL-1'] == {('S2', 'tools')}
+        assert storage.step_graph.neighbors('S2', ['start_after']) == ['S1']
+        assert storage.step_table.total('unit_time_hours') == 1.5
+        storage.connection.close()
+
+    #  Should keep an edit saved to the database and the datafile, even after the entity is dropped from memory.
+    def test_save_round_trip(self, workdir):
+        storage = make_storage()
+        assert storage.apply_edit('steps', 'S1', {'name': 'Saw frame'})
+        gc.collect()
+        storage.save_resources()
+        assert storage.flush(5)
+        assert json.loads((workdir / 'data' / 'steps.json').read_text(encoding='utf-8'))['S1']['name'] == 'Saw frame'
+        storage.connection.close()
+        reopened = make_storage()
+        assert reopened.cache_steps.get('S1').name == 'Saw frame'
+        assert reopened.load_stats == {}
+        reopened.connection.close()
+
+    #  Should keep an entity edited in place and marked dirty, even after it is dropped from memory.
+    def test_edit_in_place(self, workdir):
+        storage = make_storage()
+        storage.cache_steps.get('S1').name = 'Saw frame'
+        storage.mark_dirty('steps', 'S1')
+        gc.collect()
+        assert storage.save_resources() == {'/data/steps.json': 1}
+        assert storage.flush(5)
+        assert storage.cache_steps.get('S1').name == 'Saw frame'
+        assert json.loads((workdir / 'data' / 'steps.json').read_text(encoding='utf-8'))['S1']['name'] == 'Saw frame'
+        storage.connection.close()
+
+    #  Should import a datafile again when it changed on disk.
+    def test_reimport_changed(self, workdir):
+        make_storage().connection.close()
+        (workdir / 'data' / 'tools.json').write_text(json.dumps({'T1': {'pk': 'T1', 'key': 'T1', 'name': 'Drill'}}))
+        storage = make_storage()
+        assert list(storage.load_stats) == ['/data/tools.json']
+        assert storage.cache_tools.get_by_unique_key('key', 'T1').name == 'Drill'
+        storage.connection.close()
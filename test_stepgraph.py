@@ -0,0 +1,56 @@
+from stepgraph import StepGraph
+from testdata import make_step
+
+
+def make_graph():
+    steps = {
+        'S1': make_step('S1'),
+        'S2': make_step('S2', start_after={'S1': 0}),
+        'S3': make_step('S3', inputparts={'P1(S2)': 1, 'P2': 1}),
+        'S4': make_step('S4', start_after_start={'S2': 0}),
+    }
+    return StepGraph.from_steps(steps), steps
+
+
+class TestStepGraph:
+
+    #  Should follow the edges towards the dependencies, or towards the dependents when reversed.
+    def test_neighbors(self):
+        graph, _ = make_graph()
+        assert graph.neighbors('S2') == ['S1']
+        assert graph.neighbors('S3') == ['S2']
+        assert graph.neighbors('S2', reverse=True) == ['S4', 'S3']
+        assert graph.neighbors('S2', ('start_after', 'inputparts'), reverse=True) == ['S3']
+        assert graph.neighbors('S2', ('start_after_start',), reverse=True) == ['S4']
+
+    #  Should return the indirect dependencies and dependents nearest first, without the step itself.
+    def test_ancestors_and_descendants(self):
+        graph, _ = make_graph()
+        assert graph.ancestors('S3') == ['S2', 'S1']
+        assert graph.descendants('S1') == ['S2', 'S4', 'S3']
+        assert graph.descendants('S3') == []
+
+    #  Should replace the edges of an edited step, in both directions.
+    def test_set_step_after_edit(self):
+        graph, steps = make_graph()
+        step = steps['S3']
+        step.remove_inputpart('P1(S2)')
+        step.add_start_after('S1', 0)
+        graph.set_step('S3', step)
+        assert graph.neighbors('S3') == ['S1']
+        assert graph.neighbors('S2', reverse=True) == ['S4']
+        assert graph.neighbors('S1', reverse=True) == ['S2', 'S3']
+
+    #  Should not loop forever on cyclic dependencies.
+    def test_cycle(self):
+        graph = StepGraph.from_steps({'S1': make_step('S1', start_after={'S2': 0}),
+                                      'S2': make_step('S2', start_after={'S1': 0})})
+        assert graph.ancestors('S1') == ['S2']
+        assert graph.descendants('S1') == ['S2']
+
+    #  Should drop the reverse entries of a removed step.
+    def test_remove_step(self):
+        graph, _ = make_graph()
+        graph.remove_step('S2')
+        assert graph.neighbors('S2') == []
+        assert graph.symbols.lookup('S1') not in graph.reverse
@@ -0,0 +1,79 @@
+import math
+
+import pytest
+
+from model import Step
+from steptable import StepTable
+from testdata import make_step
+
+
+def make_table():
+    return StepTable.from_steps({
+        'S1': make_step('S1', unit_time_hours=1, prepare_hours=2, inputparts={'P1': 2, 'P2': 1}),
+        'S2': make_step('S2', unit_time_hours='0.5', prepare_hours='', cooldown_hours=1, inputparts={'P1': 3}),
+        'S3': make_step('S3', unit_time_hours='x', prepare_hours=1),
+    })
+
+
+class TestStepTable:
+
+    #  Should count numeric text as its number, and skip and list the values that are not numbers.
+    def test_totals_skip_invalid(self):
+        table = make_table()
+        assert table.total('unit_time_hours') == 1.5
+        assert table.total('prepare_hours') == 3
+        lead_hours = table.lead_hours(2)
+        assert lead_hours['S1'] == 4.0
+        assert math.isnan(lead_hours['S2']) and math.isnan(lead_hours['S3'])
+        assert table.lead_hours(2, pks=['S1', 'S9']) == {'S1': 4.0}
+        assert table.invalid == {'S2': ['prepare_hours'], 'S3': ['unit_time_hours']}
+        table.set_step('S3', make_step('S3', unit_time_hours=1, prepare_hours=1))
+        assert 'S3' not in table.invalid
+
+    #  Should sum the amounts of a relation by target, scaling the steps given.
+    def test_amount_totals(self):
+        table = make_table()
+        assert table.amount_totals('inputparts') == {'P1': 5.0, 'P2': 1.0}
+        assert table.amount_totals('inputparts', {'S2': 10}) == {'P1': 32.0, 'P2': 1.0}
+        assert table.amount_totals('tools') == {}
+
+    #  Should replace the row of an edited step and fill the row of a removed one.
+    def test_incremental_edits(self):
+        table = make_table()
+        step = make_step('S2', unit_time_hours=4, inputparts={'P3': 1})
+        table.set_step('S2', step)
+        assert table.amount_totals('inputparts') == {'P1': 2.0, 'P2': 1.0, 'P3': 1.0}
+        table.remove_step('S1')
+        assert len(table) == 2
+        lead_hours = table.lead_hours()
+        assert list(lead_hours) == ['S3', 'S2']
+        assert lead_hours['S2'] == 4.0
+        assert table.invalid == {'S3': ['unit_time_hours']}
+        assert table.amount_totals('inputparts') == {'P3': 1.0}
+
+    #  Should give the same totals after the dropped entries are compacted.
+    def test_compaction(self):
+        table = make_table()
+        step = make_step('S1', unit_time_hours=1, inputparts={'P1': 1})
+        for _ in range(2000):
+            table.set_step('S1', step)
+        assert len(table.entry_rows) < 2000
+        assert table.amount_totals('inputparts') == {'P1': 4.0}
+
+    #  Should store the hours typed into the editor as numbers, and refuse text that is not a number.
+    def test_editor_hours(self):
+        step = Step()
+        step.set_unit_time_hours('1.5')
+        step.set_prepare_hours(' 2 ')
+        step.set_cooldown_hours(3)
+        with pytest.raises(ValueError):
+            step.set_cooldown_hours('soon')
+        with pytest.raises(ValueError):
+            step.set_prepare_hours('nan')
+        assert (step.unit_time_hours, step.prepare_hours, step.cooldown_hours) == (1.5, 2, 3)
+
+    #  Should keep the stored hours as they are, even if they are not numbers.
+    def test_load_keeps_hours(self):
+        step = make_step('S1', unit_time_hours='1,5', prepare_hours='2', cooldown_hours=1)
+        d = step.to_dict()
+        assert (d['unit_time_hours'], d['prepare_hours'], d['cooldown_hours']) == ('1,5', '2', 1)
@@ -0,0 +1,359 @@
+import hashlib
+import json
+import threading
+import time
+import weakref
+
+from config import Config
+from filewatcher import FileWatcher
+from storage import Storage
+
+
+def read_datafile(workdir, resource_type='steps') -> dict:
+    return json.loads((workdir / 'data' / f'{resource_type}.json').read_text(encoding='utf-8'))
+
+
+class TestWriteDatafile:
+
+    #  Should serialize and sync a datafile without holding the lock, the watcher skipping it meanwhile.
+    def test_write_outside_lock(self, workdir):
+        storage = Storage()
+        write_bytes = storage.writer.write_bytes
+        seen = {}
+
+        def probe():
+            seen['free'] = storage.lock.acquire(timeout=1)
+            if seen['free']:
+                seen['changed'] = storage.changed_resource_types()
+                storage.lock.release()
+
+        def checked_write_bytes(filename, content):
+            write_bytes(filename, content)
+            thread = threading.Thread(target=probe)
+            thread.start()
+            thread.join()
+
+        storage.writer.write_bytes = checked_write_bytes
+        storage.cache_steps.get('S1').name = 'Saw frame'
+        storage.mark_dirty('steps', 'S1')
+        storage.save_resources()
+        assert storage.flush(5)
+        assert seen == {'free': True, 'changed': []}
+        assert read_datafile(workdir)['S1']['name'] == 'Saw frame'
+        assert storage.changed_resource_types() == []
+
+    #  Should snapshot copies of the relations, so later edits do not leak into a write in progress.
+    def test_snapshot_copies_relations(self, workdir):
+        storage = Storage()
+        data = storage.snapshot('steps')
+        storage.cache_steps.get('S2').writable('tools')['DS-TOL-2'] = 1
+        assert data['S2']['tools'] == {'DS-TOL-1': 1}
+
+
+class TestSnapshot:
+
+    #  Should load the unchanged datafiles from the snapshot, and only the changed ones from their files.
+    def test_round_trip(self, workdir):
+        Config.snapshot_file = str(workdir / 'tempfiles' / 'snapshot.pickle')
+        (workdir / 'tempfiles').mkdir()
+        first = Storage()
+        assert first.snapshot_stats == {'hits': 0, 'misses': 9}
+        assert first.flush(5)
+        second = Storage()
+        assert second.snapshot_stats == {'hits': 9, 'misses': 0}
+        assert second.snapshot('steps') == first.snapshot('steps')
+        assert second.cache_steps.find_pks('inputpart_keys', 'DS-001-0002') == ['S2']
+        (workdir / 'data' / 'tools.json').write_text(json.dumps({'T1': {'pk': 'T1', 'name': 'Drill'}}))
+        assert second.flush(5)
+        third = Storage()
+        assert third.snapshot_stats == {'hits': 8, 'misses': 1}
+        assert third.cache_tools.get('T1').name == 'Drill'
+
+    #  Should hash a datafile larger than a chunk like the whole content.
+    def test_fingerprint_chunks(self, workdir):
+        content = json.dumps({f'T{i}': {'pk': f'T{i}', 'name': 'x' * 100} for i in range(20000)}).encode()
+        (workdir / 'data' / 'tools.json').write_bytes(content)
+        size, _, digest = Storage.file_fingerprint('/data/tools.json')
+        assert size == len(content) > 1 << 20
+        assert digest == hashlib.sha1(content).hexdigest()
+        assert Storage.file_fingerprint('/data/missing.json') is None
+
+
+class TestSaveResources:
+
+    #  Should write every edit made by concurrent sessions, none lost between marking and saving.
+    def test_concurrent_saves(self, workdir):
+        storage = Storage()
+
+        def edit(session):
+            for n in range(50):
+                pk = 'S1' if session % 2 == 0 else 'S2'
+                with storage.lock:
+                    storage.cache_steps.get(pk).description = f'{session}-{n}'
+                    storage.mark_dirty('steps', pk)
+                storage.save_resources()
+
+        threads = [threading.Thread(target=edit, args=(session,)) for session in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert storage.flush(5)
+        assert not storage.cache_steps.is_dirty()
+        assert read_datafile(workdir) == storage.snapshot('steps')
+
+    #  Should write only the datafiles of the changed caches.
+    def test_dirty_only(self, workdir):
+        storage = Storage()
+        assert storage.save_resources() == {}
+        storage.cache_steps.get('S2').name = 'Braze frame'
+        storage.mark_dirty('steps', 'S2')
+        assert storage.save_resources() == {'/data/steps.json': 1}
+        assert storage.flush(5)
+        assert (workdir / 'data' / 'tools.json').read_text(encoding='utf-8') == '{}'
+        assert read_datafile(workdir)['S2']['name'] == 'Braze frame'
+
+    #  Should refuse to reload a resource type whose save is still queued, so the write keeps the edit.
+    def test_reload_refused_while_writing(self, workdir):
+        storage = Storage()
+        release = threading.Event()
+        storage.writer.submit('block', release.wait)
+        storage.apply_edit('steps', 'S1', {'name': 'Saw frame'})
+        storage.save_resources()
+        try:
+            assert storage.load_resources() == {'steps'}
+            assert not storage.reload_resource('steps')
+        finally:
+            release.set()
+        assert storage.flush(5)
+        assert read_datafile(workdir)['S1']['name'] == 'Saw frame'
+        assert storage.busy_resource_types() == set()
+        assert storage.load_resources() == set()
+        assert storage.cache_steps.get('S1').name == 'Saw frame'
+
+    #  Should not swap in a datafile read before a save that ran while it was loading.
+    def test_reload_refused_after_save(self, workdir):
+        storage = Storage()
+        read_json = storage.read_json
+
+        def save_while_reading(filename, classname, progress=None):
+            items = read_json(filename, classname, progress)
+            storage.apply_edit('steps', 'S1', {'name': 'Saw frame'})
+            storage.save_resources()
+            assert storage.flush(5)
+            return items
+
+        storage.read_json = save_while_reading
+        assert not storage.reload_resource('steps')
+        assert storage.cache_steps.get('S1').name == 'Saw frame'
+
+
+class TestWhereUsed:
+
+    #  Should find the steps referring to a key by any relation, parts by their key in composite inputs too.
+    def test_relations(self, workdir):
+        storage = Storage()
+        storage.apply_edit('steps', 'S1', {'location': 'DS-LOC-1', 'company': 'DS-COM-1',
+                                           'start_after_start': {'S2': 0}})
+        used = storage.where_used(['DS-001-0002', 'DS-TOL-1', 'DS-LOC-1', 'DS-COM-1', 'S1', 'S2', 'DS-NONE'])
+        assert used['DS-001-0002'] == {('S1', 'outputparts'), ('S2', 'inputparts')}
+        assert used['DS-TOL-1'] == {('S2', 'tools')}
+        assert used['DS-LOC-1'] == {('S1', 'location')}
+        assert used['DS-COM-1'] == {('S1', 'company')}
+        assert used['S1'] == {('S2', 'start_after')}
+        assert used['S2'] == {('S1', 'start_after_start')}
+        assert used['DS-NONE'] == set()
+
+
+class TestReindex:
+
+    #  Should drop the graph edges and the table row of a step removed from the cache.
+    def test_removed_step(self, workdir):
+        storage = Storage()
+        assert storage.step_graph.neighbors('S1', reverse=True) == ['S2']
+        storage.cache_steps.remove('S2')
+        storage.reindex('steps', 'S2')
+        assert storage.step_graph.neighbors('S2') == []
+        assert storage.step_graph.neighbors('S1', reverse=True) == []
+        assert 'S2' not in storage.step_table.rows
+
+
+class TestLazyText:
+
+    #  Should read the offloaded texts back, and save them as they were.
+    def test_round_trip(self, workdir):
+        Config.lazy_text = True
+        Config.lazy_text_min_length = 8
+        text = 'Weld the frame with the MIG welder'
+        (workdir / 'data' / 'tools.json').write_text(json.dumps({'T1': {'pk': 'T1', 'description': text}}))
+        storage = Storage()
+        assert storage.cache_tools.get('T1')._description.length == len(text)
+        assert storage.cache_tools.get('T1').description == text
+        storage.save_resources(force=True)
+        assert storage.flush(5)
+        assert read_datafile(workdir, 'tools')['T1']['description'] == text
+
+    #  Should offload every load into a new store, freeing the previous one with the entities using it.
+    def test_new_store_per_load(self, workdir):
+        Config.lazy_text = True
+        Config.lazy_text_min_length = 8
+        (workdir / 'data' / 'tools.json').write_text(json.dumps({'T1': {'pk': 'T1', 'description': 'x' * 100}}))
+        storage = Storage()
+        previous = weakref.ref(storage.textstore)
+        size = storage.textstore.size
+        storage.load_resources()
+        assert previous() is None
+        assert storage.textstore.size == size
+        assert storage.cache_tools.get('T1').description == 'x' * 100
+
+
+class Session:
+    """Stands in for an MFGDocsApp, recording the notifications of the storage."""
+
+    def __init__(self):
+        self.changed = []
+        self.postponed = []
+
+    def data_changed(self, resource_types):
+        self.changed.append(resource_types)
+
+    def reload_postponed(self, resource_types):
+        self.postponed.append(resource_types)
+
+
+class TestSharedStorage:
+
+    #  Should load once for every session attaching concurrently, and forget the detached ones.
+    def test_attach_detach(self, workdir, monkeypatch):
+        monkeypatch.setattr(Storage, 'shared', None)
+        sessions = [Session() for _ in range(8)]
+        attached = []
+        threads = [threading.Thread(target=lambda s=session: attached.append(Storage.attach(s)))
+                   for session in sessions]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(attached) == 8 and all(storage is attached[0] for storage in attached)
+        storage = attached[0]
+        assert len(storage.sessions) == 8
+        storage.begin_edit(sessions[0], 'steps', 'S1')
+        storage.detach(sessions[0])
+        assert len(storage.sessions) == 7
+        assert storage.busy_resource_types() == set()
+
+    #  Should keep the edits of a session out of the shared entity until they are applied.
+    def test_apply_edit(self, workdir):
+        storage = Storage()
+        session = Session()
+        storage.begin_edit(session, 'steps', 'S2')
+        assert storage.busy_resource_types() == {'steps'}
+        assert storage.apply_edit('steps', 'S2', {'tools': {'DS-TOL-2': 1}, 'name': 'Braze frame'})
+        storage.end_edit(session, 'steps', 'S2')
+        step = storage.cache_steps.get('S2')
+        assert (step.name, step.tools, step.category) == ('Braze frame', {'DS-TOL-2': 1}, 'welding')
+        assert storage.cache_steps.find_pks('tools', 'DS-TOL-2') == ['S2']
+        assert not storage.apply_edit('steps', 'S9', {'name': 'Gone'})
+
+    #  Should refuse a reload while an editor is open, and reload once it is closed.
+    def test_reload_refused_while_editing(self, workdir):
+        storage = Storage()
+        session = Session()
+        storage.sessions.add(session)
+        storage.begin_edit(session, 'steps', 'S1')
+        assert storage.load_resources() == {'steps'}
+        changed = dict(read_datafile(workdir), S3={'pk': 'S3', 'key': 'S3'})
+        (workdir / 'data' / 'steps.json').write_text(json.dumps(changed), encoding='utf-8')
+        watcher = FileWatcher(storage, 3600)
+        assert watcher.check() == []
+        assert watcher.check() == []
+        assert session.postponed == [['steps']]
+        assert 'S3' not in storage.cache_steps.data
+        storage.end_edit(session, 'steps', 'S1')
+        assert watcher.check() == ['steps']
+        watcher.stop()
+        assert session.changed == [['steps']]
+        assert 'S3' in storage.cache_steps.data
+        assert storage.load_resources() == set()
+
+
+class TestParallelLoad:
+
+    #  Should load every datafile, reporting a growing loaded fraction up to 1.
+    def test_progress(self, workdir):
+        (workdir / 'data' / 'tools.json').write_text(json.dumps({f'T{i}': {'pk': f'T{i}', 'name': 'Drill' * 40}
+                                                                for i in range(2000)}), encoding='utf-8')
+        storage = Storage()
+        fractions = []
+        assert storage.load_resources(progress=fractions.append) == set()
+        assert fractions == sorted(fractions) and fractions[-1] == 1.0 and len(fractions) > 2
+        assert len(storage.cache_tools.data) == 2000
+        assert storage.load_stats['/data/tools.json']['entities'] == 2000
+        assert storage.load_stats['/data/steps.json']['entities'] == 2
+
+    #  Should keep serving the previous, complete data to the sessions reading while it loads.
+    def test_read_while_loading(self, workdir):
+        storage = Storage()
+        stop = threading.Event()
+        seen = set()
+
+        def read():
+            while not stop.is_set():
+                seen.add(tuple(sorted(storage.cache_steps.data)))
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        for _ in range(5):
+            storage.load_resources()
+        stop.set()
+        reader.join()
+        assert seen == {('S1', 'S2')}
+
+
+class TestFileWatcher:
+
+    #  Should reload only the datafile changed on disk, and tell the sessions.
+    def test_reload_changed(self, workdir):
+        storage = Storage()
+        session = Session()
+        storage.sessions.add(session)
+        steps = storage.cache_steps
+        (workdir / 'data' / 'tools.json').write_text(json.dumps({'T1': {'pk': 'T1', 'name': 'Drill'}}))
+        watcher = FileWatcher(storage, 3600)
+        assert watcher.check() == ['tools']
+        assert watcher.check() == []
+        watcher.stop()
+        assert session.changed == [['tools']]
+        assert storage.cache_tools.get('T1').name == 'Drill'
+        assert storage.cache_steps is steps
+
+    #  Should leave a changed datafile alone while its resource type is being edited, without trying to reload it.
+    def test_busy_not_reloaded(self, workdir):
+        storage = Storage()
+        session = Session()
+        storage.sessions.add(session)
+        logged = []
+        storage.log = logged.append
+        storage.begin_edit(session, 'tools', 'T1')
+        (workdir / 'data' / 'tools.json').write_text(json.dumps({'T1': {'pk': 'T1', 'name': 'Drill'}}))
+        watcher = FileWatcher(storage, 3600)
+        assert watcher.check() == []
+        assert watcher.check() == []
+        assert logged == []
+        assert session.postponed == [['tools']]
+        storage.end_edit(session, 'tools', 'T1')
+        assert watcher.check() == ['tools']
+        watcher.stop()
+
+    #  Should poll on its own thread.
+    def test_polling(self, workdir):
+        storage = Storage()
+        session = Session()
+        storage.sessions.add(session)
+        storage.start_watcher(0.01)
+        (workdir / 'data' / 'tools.json').write_text(json.dumps({'T1': {'pk': 'T1', 'name': 'Drill'}}))
+        deadline = time.monotonic() + 5
+        while len(session.changed) == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        storage.watcher.stop()
+        assert session.changed == [['tools']]
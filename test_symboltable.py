@@ -0,0 +1,33 @@
+from stepgraph import StepGraph
+from symboltable import SymbolTable
+from testdata import make_step
+
+
+class TestSymbolTable:
+
+    #  Should hand out dense ids in order, the same one for the same key.
+    def test_intern(self):
+        symbols = SymbolTable()
+        assert symbols.intern('S1') == 0
+        assert symbols.intern('S2') == 1
+        assert symbols.intern('S1') == 0
+        assert symbols.key(1) == 'S2'
+        assert len(symbols) == 2
+
+    #  Should not give an id to a key only looked up.
+    def test_lookup(self):
+        symbols = SymbolTable()
+        assert symbols.lookup('S1') is None
+        assert 'S1' not in symbols
+        assert len(symbols) == 0
+
+    #  Should keep the ids of a shared table when the graph is rebuilt.
+    def test_shared_by_graphs(self):
+        symbols = SymbolTable()
+        steps = {'S1': make_step('S1'), 'S2': make_step('S2', start_after={'S1': 0})}
+        first = StepGraph.from_steps(steps, symbols)
+        second = StepGraph.from_steps(steps, symbols)
+        assert len(symbols) == 2
+        assert first.forward == second.forward
+        assert second.walk_ids(symbols.lookup('S2'), None, False) == [symbols.lookup('S1')]
+        assert second.neighbors('S3') == []
@@ -0,0 +1,57 @@
+from model import Tool
+from testdata import make_step
+from textindex import TextIndex
+
+
+def make_index():
+    index = TextIndex()
+    index.add('steps', 'S1', make_step('S1', name='Weld frame', description='Weld the frame with the MIG welder',
+                                          tools={'DS-TOL-1': 1}))
+    index.add('steps', 'S2', make_step('S2', name='Paint frame', description='Spray the frame'))
+    index.add('steps', 'S3', make_step('S3', name='Pack', description='Put the welded frame in a box'))
+    tool = Tool()
+    tool.key = 'DS-TOL-1'
+    tool.name = 'MIG welder'
+    index.add('tools', 'DS-TOL-1', tool)
+    return index
+
+
+def keys(results):
+    return [(r[0], r[1]) for r in results]
+
+
+class TestTextIndex:
+
+    #  Should split compound keys into their parts besides keeping them whole.
+    def test_tokenize(self):
+        assert TextIndex.tokenize('Use DS-TOL-1, then weld.') == ['use', 'ds-tol-1', 'then', 'weld', 'ds', 'tol', '1']
+
+    #  Should require every term, and rank the entity matching in its name over the one matching in its text.
+    def test_and_terms_ranked(self):
+        index = make_index()
+        assert keys(index.search('frame')) == [('steps', 'S1'), ('steps', 'S2'), ('steps', 'S3')]
+        assert keys(index.search('weld frame')) == [('steps', 'S1')]
+        assert keys(index.search('welder')) == [('tools', 'DS-TOL-1'), ('steps', 'S1')]
+
+    #  Should match either term joined by OR.
+    def test_or_terms(self):
+        index = make_index()
+        assert sorted(keys(index.search('spray OR box'))) == [('steps', 'S2'), ('steps', 'S3')]
+        assert keys(index.search('frame spray OR nothing')) == [('steps', 'S2')]
+
+    #  Should expand a term ending with * to every token starting with it.
+    def test_prefix(self):
+        index = make_index()
+        assert sorted(keys(index.search('weld*', resource_types=['steps']))) == [('steps', 'S1'), ('steps', 'S3')]
+        assert keys(index.search('ds-tol*')) == [('tools', 'DS-TOL-1'), ('steps', 'S1')]
+
+    #  Should forget the old tokens of a changed or removed entity.
+    def test_update_and_remove(self):
+        index = make_index()
+        index.add('steps', 'S2', make_step('S2', name='Polish frame'))
+        assert keys(index.search('spray')) == []
+        assert keys(index.search('polish')) == [('steps', 'S2')]
+        index.remove_type('tools')
+        index.remove('steps', 'S1')
+        assert keys(index.search('welder')) == []
+        assert 'mig' not in index.postings
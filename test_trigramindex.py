@@ -0,0 +1,58 @@
+import random
+
+from model import Part, Step
+from trigramindex import TrigramIndex
+
+
+def make_steps(count):
+    random.seed(7)
+    words = ['Weld', 'frame', 'paint', 'bolt', 'drill', 'cut', 'Press', 'mold', 'inspect', 'pack']
+    steps = {}
+    for i in range(count):
+        step = Step()
+        step.key = f'STEP-{i:04d}'
+        step.name = ' '.join(random.choices(words, k=2))
+        step.description = ' '.join(random.choices(words, k=6))
+        step.location = random.choice([None, 'DS-LOC-1', 'Hall B'])
+        step.inputparts = {f'DS-001-{random.randint(0, 30):04d}(STEP-{i:04d})': 1}
+        step.tools = {f'DS-TOL-{random.randint(0, 5)}': 1}
+        steps[step.key] = step
+    return steps
+
+
+class TestTrigramIndex:
+
+    #  Should return exactly what contains() returns, in insertion order, including matches across key separators.
+    def test_same_as_contains(self):
+        steps = make_steps(200)
+        index = TrigramIndex()
+        for k, v in steps.items():
+            index.add(k, v)
+        for txt in ['0-1', 'DS-001-0012', 'weld', 'ELD FR', 'tol-3', 'hall', 'loc', 'step-01', 'x', '', 'zzz']:
+            expected = [k for k, v in steps.items() if v.contains(txt)]
+            assert [k for k in index.candidates(txt) if steps[k].contains(txt)] == expected
+
+    #  Should narrow the candidates to the entities having every trigram of the text.
+    def test_narrows_candidates(self):
+        index = TrigramIndex()
+        for key, name in [('P1', 'bolt'), ('P2', 'nut'), ('P3', 'bolted frame')]:
+            part = Part()
+            part.key = key
+            part.name = name
+            index.add(key, part)
+        assert index.candidates('BOLT') == ['P1', 'P3']
+        assert index.candidates('nut') == ['P2']
+        assert index.candidates('no') == ['P1', 'P2', 'P3']
+
+    #  Should keep the position of a changed entity and forget its old trigrams.
+    def test_update_keeps_order(self):
+        steps = make_steps(3)
+        index = TrigramIndex()
+        for k, v in steps.items():
+            index.add(k, v)
+        steps['STEP-0000'].name = 'unique name'
+        index.add('STEP-0000', steps['STEP-0000'])
+        assert index.candidates('unique') == ['STEP-0000']
+        assert index.candidates('step') == ['STEP-0000', 'STEP-0001', 'STEP-0002']
+        index.remove('STEP-0001')
+        assert index.candidates('step') == ['STEP-0000', 'STEP-0002']
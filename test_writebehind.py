@@ -0,0 +1,45 @@
+import json
+import threading
+
+from writebehind import WriteBehind
+
+
+class TestWriteBehind:
+
+    #  Should run only the last of the requests queued for a key while the writer was busy, telling which replaced one.
+    def test_coalesce(self):
+        writer = WriteBehind()
+        release = threading.Event()
+        ran = []
+        replaced = []
+        writer.submit('block', lambda: release.wait(5))
+        threads = [threading.Thread(target=lambda n=n: replaced.append(writer.submit('steps', lambda: ran.append(n))))
+                   for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        release.set()
+        assert writer.flush(5)
+        assert len(ran) == 1
+        assert sorted(replaced) == [False] + [True] * 7
+
+    #  Should write the JSON atomically, leaving no temporary file behind.
+    def test_write_json(self, tmp_path):
+        writer = WriteBehind()
+        filename = str(tmp_path / 'steps.json')
+        writer.submit(filename, lambda: writer.write_json(filename, lambda: {'S1': {'name': 'Cut'}}))
+        assert writer.flush(5)
+        assert json.loads((tmp_path / 'steps.json').read_text(encoding='utf-8')) == {'S1': {'name': 'Cut'}}
+        assert [path.name for path in tmp_path.iterdir()] == ['steps.json']
+
+    #  Should log a failed write and keep running the following ones.
+    def test_error_logged(self):
+        logged = []
+        writer = WriteBehind(logged.append)
+        ran = []
+        writer.submit('bad', lambda: 1 / 0)
+        writer.submit('good', lambda: ran.append(True))
+        assert writer.flush(5)
+        assert ran == [True]
+        assert len(logged) == 1 and 'bad' in logged[0]
@@ -0,0 +1,20 @@
+"""
+Test data shared by the test modules and the fixtures of conftest.py.
+
+"""
+from model import Step
+
+
+STEPS = {
+    'S1': {'pk': 'S1', 'key': 'S1', 'name': 'Cut frame', 'category': 'cutting', 'unit_time_hours': 1,
+           'inputparts': {'DS-001-0001': 2}, 'outputparts': {'DS-001-0002': 1}},
+    'S2': {'pk': 'S2', 'key': 'S2', 'name': 'Weld frame', 'category': 'welding', 'unit_time_hours': '0.5',
+           'inputparts': {'DS-001-0002(S1)': 1}, 'tools': {'DS-TOL-1': 1}, 'start_after': {'S1': 0}},
+}
+
+
+def make_step(key: str, **fields) -> Step:
+    """A step named by its key, the fields are given in the form of to_dict()."""
+    step = Step()
+    step.from_dict({'pk': key, 'key': key, 'name': key} | fields)
+    return step
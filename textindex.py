@@ -0,0 +1,134 @@
+"""
+Inverted full-text index over the entities of every resource type.
+
+"""
+import bisect
+import math
+import re
+
+TOKEN_PATTERN = re.compile(r'\w+(?:[-./]\w+)*')
+SEPARATOR_PATTERN = re.compile(r'[-./]')
+
+
+class TextIndex:
+    """Maps the tokens of the searchable fields to the entities containing them.
+
+    Entities are identified by (resource type, pk) pairs, and provide their fields with search_fields().
+    A query is a list of terms that must all match, terms joined by OR match if either of them does.
+    A term ending with * matches every token starting with it.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}
+        self.sorted_tokens = None
+
+    @staticmethod
+    def tokenize(text: str) -> list[str]:
+        """Returns the lowercase tokens of a text, compound keys like DS-001-0003 also as their parts."""
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        for token in tokens:
+            if not token.isalnum() and SEPARATOR_PATTERN.search(token):
+                tokens = tokens + SEPARATOR_PATTERN.split(token)
+        return tokens
+
+    def add(self, resource_type: str, pk: str, entity):
+        """Indexes an entity, replacing its previous tokens."""
+        doc = (resource_type, pk)
+        self.remove(resource_type, pk)
+        weights = {}
+        for text, weight in entity.search_fields():
+            if text is None:
+                continue
+            for token in self.tokenize(str(text)):
+                weights[token] = weights.get(token, 0) + weight
+        for token, weight in weights.items():
+            if token not in self.postings:
+                self.postings[token] = {}
+                self.sorted_tokens = None
+            self.postings[token][doc] = weight
+        self.documents[doc] = tuple(weights)
+
+    def remove(self, resource_type: str, pk: str):
+        doc = (resource_type, pk)
+        for token in self.documents.pop(doc, ()):
+            docs = self.postings[token]
+            docs.pop(doc, None)
+            if len(docs) == 0:
+                del self.postings[token]
+                self.sorted_tokens = None
+
+    def remove_type(self, resource_type: str):
+        for doc in [doc for doc in self.documents if doc[0] == resource_type]:
+            self.remove(*doc)
+
+    def expand(self, term: str) -> list[str]:
+        """Returns the indexed tokens matching a query term."""
+        if not term.endswith('*'):
+            return [term] if term in self.postings else []
+        prefix = term[:-1]
+        if self.sorted_tokens is None:
+            self.sorted_tokens = sorted(self.postings)
+        start = bisect.bisect_left(self.sorted_tokens, prefix)
+        tokens = []
+        for token in self.sorted_tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            tokens.append(token)
+        return tokens
+
+    def match(self, term: str) -> dict:
+        """Returns the score of every entity matching a term, rare tokens scoring higher."""
+        scores = {}
+        for token in self.expand(term):
+            docs = self.postings[token]
+            idf = math.log(1 + len(self.documents) / len(docs))
+            for doc, weight in docs.items():
+                scores[doc] = scores.get(doc, 0) + weight * idf
+        return scores
+
+    @staticmethod
+    def parse(query: str) -> list[list[str]]:
+        """Returns the terms of a query, grouped by OR, every group must match."""
+        groups = []
+        join = False
+        for word in query.split():
+            if word == 'OR':
+                join = len(groups) > 0
+                continue
+            prefix = word.endswith('*')
+            terms = TOKEN_PATTERN.findall(word.lower())
+            if len(terms) == 0:
+                continue
+            if prefix:
+                terms[-1] += '*'
+            for term in terms:
+                if join:
+                    groups[-1].append(term)
+                    join = False
+                else:
+                    groups.append([term])
+        return groups
+
+    def search(self, query: str, resource_types=None) -> list[tuple[str, str, float]]:
+        """Returns the matching (resource type, pk, score) triples, best first.
+
+        :param resource_types: Limits the results to these resource types, if given.
+        """
+        result = None
+        for group in self.parse(query):
+            scores = {}
+            for term in group:
+                for doc, score in self.match(term).items():
+                    scores[doc] = scores.get(doc, 0) + score
+            if result is None:
+                result = scores
+            else:
+                result = {doc: score + scores[doc] for doc, score in result.items() if doc in scores}
+            if len(result) == 0:
+                break
+        if result is None:
+            return []
+        return sorted(((doc[0], doc[1], score) for doc, score in result.items()
+                       if resource_types is None or doc[0] in resource_types),
+                      key=lambda r: (-r[2], r[0], r[1]))
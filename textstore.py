@@ -0,0 +1,45 @@
+"""
+Side store for long texts, keeping them out of the resident memory until they are read.
+"""
+import tempfile
+import threading
+
+
+class TextStore:
+    """Appends texts to an anonymous temporary file and reads them back by offset.
+    """
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def put(self, text: str) -> 'TextRef':
+        data = text.encode('utf-8')
+        with self.lock:
+            self.file.seek(self.size)
+            self.file.write(data)
+            offset = self.size
+            self.size += len(data)
+        return TextRef(self, offset, len(data))
+
+    def read(self, offset: int, length: int) -> str:
+        with self.lock:
+            self.file.seek(offset)
+            return self.file.read(length).decode('utf-8')
+
+
+class TextRef:
+    """Reference to a text in a TextStore, pickled and copied as the text itself."""
+    __slots__ = ('store', 'offset', 'length')
+
+    def __init__(self, store: TextStore, offset: int, length: int):
+        self.store = store
+        self.offset = offset
+        self.length = length
+
+    def read(self) -> str:
+        return self.store.read(self.offset, self.length)
+
+    def __reduce__(self):
+        return str, (self.read(),)
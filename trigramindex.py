@@ -0,0 +1,63 @@
+"""
+Trigram index narrowing the candidates of substring searches.
+
+"""
+
+
+class TrigramIndex:
+    """Maps the three character substrings of the searched texts to the entities of one cache.
+
+    Entities provide their texts with contains_texts(), the texts their contains() looks into.
+    An entity containing a text has every trigram of it, so intersecting the postings of those trigrams
+    gives a small superset of the matches, to be checked with contains() itself.
+    Texts shorter than three characters do not narrow the candidates.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}
+        self.order = {}
+        self.next_order = 0
+
+    @staticmethod
+    def trigrams(text: str) -> set[str]:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def add(self, pk: str, entity):
+        """Indexes an entity, replacing its previous trigrams but keeping its position."""
+        self.remove(pk, keep_order=True)
+        grams = set()
+        for text in entity.contains_texts():
+            if text:
+                grams |= self.trigrams(text.lower())
+        for gram in grams:
+            if gram not in self.postings:
+                self.postings[gram] = set()
+            self.postings[gram].add(pk)
+        self.documents[pk] = grams
+        if pk not in self.order:
+            self.order[pk] = self.next_order
+            self.next_order += 1
+
+    def remove(self, pk: str, keep_order: bool = False):
+        for gram in self.documents.pop(pk, ()):
+            pks = self.postings[gram]
+            pks.discard(pk)
+            if len(pks) == 0:
+                del self.postings[gram]
+        if not keep_order:
+            self.order.pop(pk, None)
+
+    def candidates(self, text: str) -> list[str]:
+        """Returns the pks of the entities which may contain the text, in the order they were added."""
+        grams = self.trigrams(text.lower())
+        if len(grams) == 0:
+            return list(self.documents)
+        postings = []
+        for gram in grams:
+            if gram not in self.postings:
+                return []
+            postings.append(self.postings[gram])
+        postings.sort(key=len)
+        pks = postings[0].intersection(*postings[1:])
+        return sorted(pks, key=self.order.__getitem__)
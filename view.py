@@ -1,10 +1,21 @@
 """Classes supporting the display of steps and other resources from the model."""
-from model import Step, Part
+from model import Step
 from storage import Storage
 
 
 class ViewStep:
-    """Methods related to viewing steps."""
+    """Methods related to viewing steps, answered by the dependency graph of the storage."""
+
+    @staticmethod
+    def steps_by_keys(keys: list[str], storage: Storage) -> dict[str, Step]:
+        """Returns the steps of the keys found in the cache."""
+        steps = {}
+        for k in keys:
+            step = storage.cache_steps.get_with_default(k)
+            if step is not None:
+                steps[k] = step
+        return steps
+
     @staticmethod
     def find_steps_this_depends_on(step: Step, storage: Storage) -> dict[str, Step]:
         """Finds all steps that this step depends on.
@@ -13,16 +24,8 @@ class ViewStep:
         :param storage: The storage to use.
         :return: A dict of steps that this step depends on.
         """
-        steps = {}
-        for p in step.inputparts.keys():
-            partkey, stepkey = Part.extract_stepkey(p)
-            if stepkey is not None and stepkey != '':
-                if stepkey in storage.cache_steps.data:
-                    steps[stepkey] = storage.cache_steps.data[stepkey]
-        for skey in step.start_after.keys():
-            if skey in storage.cache_steps.data:
-                steps[skey] = storage.cache_steps.data[skey]
-        return steps
+        return ViewStep.steps_by_keys(
+            storage.step_graph.neighbors(step.key, ('inputparts', 'start_after')), storage)
 
     @staticmethod
     def find_steps_after_start_with_this(step: Step, storage: Storage) -> dict[Step]:
@@ -32,12 +35,7 @@ class ViewStep:
         :param storage: The storage to use.
         :return: A dict of steps that may run in parallel with this step
         """
-        steps = {}
-        for skey in step.start_after_start.keys():
-            if skey in storage.cache_steps.data:
-                steps[skey] = storage.cache_steps.data[skey]
-
-        return steps
+        return ViewStep.steps_by_keys(storage.step_graph.neighbors(step.key, ('start_after_start',)), storage)
 
     @staticmethod
     def find_steps_which_start_after_this_starts(step: Step, storage: Storage) -> dict[Step]:
@@ -47,12 +45,8 @@ class ViewStep:
         :param storage: The storage to use.
         :return: A dict of steps that may run in parallel with this step
         """
-        steps = {}
-        for k,v in storage.cache_steps.data.items():
-            if v.start_after_start is not None:
-                if step.key in v.start_after_start:
-                    steps[k] = v
-        return steps
+        return ViewStep.steps_by_keys(
+            storage.step_graph.neighbors(step.key, ('start_after_start',), reverse=True), storage)
 
     @staticmethod
     def find_steps_depending_on_this(step: Step, storage: Storage) -> dict[Step]:
@@ -62,15 +56,5 @@ class ViewStep:
         :param storage: The storage to use.
         :return: A dict of steps that this step depends on.
         """
-        steps = {}
-        for s in storage.cache_steps.data.values():
-            if step.key in s.start_after:
-                steps[s.key] = s
-            else:
-                for p in s.inputparts.keys():
-                    partkey: str
-                    partkey, stepkey = Part.extract_stepkey(p)
-                    if stepkey is not None and stepkey != '':
-                        if stepkey == step.key:
-                            steps[s.key] = s
-        return steps
+        return ViewStep.steps_by_keys(
+            storage.step_graph.neighbors(step.key, ('start_after', 'inputparts'), reverse=True), storage)
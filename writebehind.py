@@ -0,0 +1,83 @@
+"""
+Background writer for the datafiles.
+
+Save requests are queued by filename, so a burst of saves from many sessions results in one write per file.
+"""
+import json
+import os
+import tempfile
+import threading
+
+
+class WriteBehind:
+    """Runs queued file writes on a background thread.
+
+    Submitting the same key again before it is written replaces the previous request.
+    """
+
+    def __init__(self, log=print):
+        self.log = log
+        self.pending = {}
+        self.busy = False
+        self.writes = 0
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name='writebehind', daemon=True)
+        self.thread.start()
+
+    def submit(self, key: str, action) -> bool:
+        """Queues a callable to be run on the writer thread, coalesced by key.
+
+        :return: True if it replaced a queued callable, which is not run then.
+        """
+        with self.condition:
+            replaced = key in self.pending
+            self.pending[key] = action
+            self.condition.notify_all()
+        return replaced
+
+    def flush(self, timeout: float = None) -> bool:
+        """Blocks until the queue is empty and no write is running.
+
+        :param timeout: Seconds to wait at most, None waits forever.
+        :return: False if the timeout expired.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.pending) == 0 and not self.busy, timeout)
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: len(self.pending) > 0)
+                key = next(iter(self.pending))
+                action = self.pending.pop(key)
+                self.busy = True
+            try:
+                action()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self.log(f'writebehind {key} error: {e}')
+            with self.condition:
+                self.busy = False
+                self.writes += 1
+                self.condition.notify_all()
+
+    def write_json(self, filename: str, producer):
+        """Writes the data atomically, readers never see a partially written file."""
+        content = json.dumps(producer(), indent=4, sort_keys=True)
+        self.write_bytes(filename, content.encode('utf-8'))
+
+    def write_bytes(self, filename: str, content: bytes):
+        """Writes to a temporary file next to the target and renames it over the target."""
+        dirname = os.path.dirname(filename) or '.'
+        fd, tempname = tempfile.mkstemp(prefix='.' + os.path.basename(filename) + '.', suffix='.tmp', dir=dirname)
+        try:
+            with os.fdopen(fd, mode='wb') as target_file:
+                target_file.write(content)
+                target_file.flush()
+                os.fsync(target_file.fileno())
+            os.replace(tempname, filename)
+        except OSError:
+            try:
+                os.remove(tempname)
+            except OSError:
+                pass
+            raise